@@ -0,0 +1,316 @@
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+from PyQt5 import sip
+from PyQt5.QtCore import QBuffer, QCoreApplication, QFile, QIODevice, QStandardPaths, QUrl
+from PyQt5.QtNetwork import QNetworkAccessManager, QNetworkReply, QNetworkRequest
+from PyQt5.QtWebEngineCore import (QWebEngineUrlRequestInfo, QWebEngineUrlRequestInterceptor,
+                                   QWebEngineUrlRequestJob, QWebEngineUrlScheme,
+                                   QWebEngineUrlSchemeHandler)
+
+from flyff_browser.config import (ASSET_CACHE_EXTENSIONS, ASSET_CACHE_HOSTS, ASSET_CACHE_MAX_AGE_S,
+                                  BLOCKED_HOSTS)
+
+# Cached assets are requested as ftasset://host[:port]/<original scheme>/<original path>
+ASSET_SCHEME = b'ftasset'
+
+
+def register_asset_scheme():
+    """Register the asset cache's URL scheme; must run before the QApplication is created."""
+    scheme = QWebEngineUrlScheme(ASSET_SCHEME)
+    scheme.setSyntax(QWebEngineUrlScheme.Syntax.HostAndPort)
+    scheme.setDefaultPort(QWebEngineUrlScheme.PortUnspecified)
+    # Let https pages load from it like from their own server
+    scheme.setFlags(QWebEngineUrlScheme.SecureScheme | QWebEngineUrlScheme.CorsEnabled
+                    | QWebEngineUrlScheme.ContentSecurityPolicyIgnored)
+    QWebEngineUrlScheme.registerScheme(scheme)
+
+
+def _host_matches(host: str, hosts: Tuple[str, ...]) -> bool:
+    return any(host == name or host.endswith('.' + name) for name in hosts)
+
+
+def _raw_header(reply: QNetworkReply, name: bytes) -> Optional[str]:
+    value = bytes(reply.rawHeader(name))
+    return value.decode('latin-1') if value else None
+
+
+def _write_atomic(path: str, data: bytes):
+    # Other processes may read the same store; they must never see half a file
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except OSError:
+        # The original error is the one worth reporting
+        with contextlib.suppress(OSError):
+            os.unlink(tmp_path)
+        raise
+
+
+class AssetCache(QWebEngineUrlSchemeHandler):
+    """Content-addressed store of static game assets, shared by every tab and profile.
+
+    RequestFilter redirects cacheable asset URLs to ASSET_SCHEME, which this
+    handler serves: from disk when the URL was fetched within ``max_age_s``,
+    otherwise over the network, once for all tabs asking at the same time.
+    An entry past ``max_age_s`` is revalidated with the ETag and
+    Last-Modified it was stored with; if the server answers 304 Not
+    Modified, the stored body is served for another ``max_age_s``.
+    Bodies are stored under their SHA-256, so the same file behind several
+    URLs (or fetched again after max_age_s) is kept once; a small index file
+    per URL points at its body. Every file is written under a temporary name
+    and renamed, so worker processes can share the directory.
+    """
+
+    def __init__(self, path: Optional[str] = None, hosts: Tuple[str, ...] = ASSET_CACHE_HOSTS,
+                 extensions: Tuple[str, ...] = ASSET_CACHE_EXTENSIONS,
+                 max_age_s: float = ASSET_CACHE_MAX_AGE_S, parent=None):
+        super().__init__(parent)
+        if path is None:
+            cache_root = QStandardPaths.writableLocation(QStandardPaths.CacheLocation)
+            path = os.path.join(cache_root, 'assets')
+        self.path = path
+        self.hosts = tuple(hosts)
+        self.extensions = tuple(extension.lower() for extension in extensions)
+        self.max_age_s = max_age_s
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0  # Requests that joined a fetch already under way
+        self.revalidations = 0  # Stale entries checked with a conditional request
+        self.not_modified = 0  # Of those, the ones the server said were unchanged
+        self.deduplicated = 0  # Fetched bodies that were already stored under another URL
+        self.failures = 0
+        self.bytes_saved = 0
+        self.bytes_fetched = 0
+        self._network = QNetworkAccessManager(self)
+        self._pending: Dict[str, List[QWebEngineUrlRequestJob]] = {}
+
+    def is_cacheable(self, url: QUrl) -> bool:
+        return (url.scheme() in ('http', 'https') and _host_matches(url.host(), self.hosts)
+                and url.path().lower().endswith(self.extensions))
+
+    @staticmethod
+    def cache_url(url: QUrl) -> QUrl:
+        """The ASSET_SCHEME URL standing in for an http(s) URL."""
+        cached = QUrl(url)
+        cached.setScheme(ASSET_SCHEME.decode())
+        cached.setPath(f'/{url.scheme()}{url.path(QUrl.FullyEncoded)}', QUrl.TolerantMode)
+        return cached
+
+    @staticmethod
+    def original_url(url: QUrl) -> QUrl:
+        """The http(s) URL an ASSET_SCHEME URL stands in for."""
+        scheme, _, path = url.path(QUrl.FullyEncoded)[1:].partition('/')
+        original = QUrl(url)
+        original.setScheme(scheme)
+        original.setPath('/' + path, QUrl.TolerantMode)
+        return original
+
+    def summary(self) -> dict:
+        requests = self.hits + self.misses + self.coalesced + self.revalidations
+        served = self.hits + self.coalesced + self.not_modified
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'revalidations': self.revalidations,
+            'not_modified': self.not_modified,
+            'deduplicated': self.deduplicated,
+            'failures': self.failures,
+            'hit_rate': round(served / requests, 3) if requests else None,
+            'bytes_saved': self.bytes_saved,
+            'bytes_fetched': self.bytes_fetched,
+        }
+
+    def requestStarted(self, job: QWebEngineUrlRequestJob):
+        url = self.original_url(job.requestUrl())
+        key = url.toString(QUrl.FullyEncoded)
+
+        entry = self._lookup(key)
+        if entry is not None and time.time() - entry['fetched'] <= self.max_age_s:
+            if self._reply_from_disk(job, entry):
+                self.hits += 1
+                self.bytes_saved += entry['size']
+                return
+            # The body is gone or cut short; fetch it again
+            self._forget(key)
+            entry = None
+
+        jobs = self._pending.get(key)
+        if jobs is not None:
+            self.coalesced += 1
+            jobs.append(job)
+            return
+
+        if entry is not None:
+            self.revalidations += 1
+        else:
+            self.misses += 1
+        self._pending[key] = [job]
+        self._fetch(url, key, entry)
+
+    def _fetch(self, url: QUrl, key: str, entry: Optional[dict]):
+        request = QNetworkRequest(url)
+        request.setAttribute(QNetworkRequest.RedirectPolicyAttribute,
+                             QNetworkRequest.NoLessSafeRedirectPolicy)
+        # A stale entry is only downloaded again if the server says it changed
+        if entry is not None and entry.get('etag'):
+            request.setRawHeader(b'If-None-Match', entry['etag'].encode('latin-1'))
+        if entry is not None and entry.get('last_modified'):
+            request.setRawHeader(b'If-Modified-Since', entry['last_modified'].encode('latin-1'))
+        reply = self._network.get(request)
+        reply.setProperty('cache_key', key)
+        reply.finished.connect(self._fetched)
+
+    def _fetched(self):
+        reply = self.sender()
+        key = reply.property('cache_key')
+        reply.deleteLater()
+        # Tabs closed while the fetch ran have taken their jobs with them
+        jobs = [job for job in self._pending.pop(key, []) if not sip.isdeleted(job)]
+        status = reply.attribute(QNetworkRequest.HttpStatusCodeAttribute)
+        if status == 304 and reply.error() == QNetworkReply.NoError:
+            self._not_modified(reply, key, jobs)
+            return
+        if reply.error() != QNetworkReply.NoError or status != 200:
+            self.failures += 1
+            error = (QWebEngineUrlRequestJob.UrlNotFound if status == 404
+                     else QWebEngineUrlRequestJob.RequestFailed)
+            for job in jobs:
+                job.fail(error)
+            return
+
+        data = bytes(reply.readAll())
+        mime = (reply.header(QNetworkRequest.ContentTypeHeader) or 'application/octet-stream')
+        mime = mime.split(';')[0].strip()
+        self.bytes_fetched += len(data)
+        self.bytes_saved += len(data) * (len(jobs) - 1)
+        try:
+            self._store(key, data, mime, _raw_header(reply, b'ETag'),
+                        _raw_header(reply, b'Last-Modified'))
+        except OSError:
+            pass  # Still answer the page; the next request fetches again
+
+        for job in jobs:
+            body = QBuffer(job)
+            body.setData(data)
+            body.open(QIODevice.ReadOnly)
+            job.reply(mime.encode(), body)
+
+    def _not_modified(self, reply: QNetworkReply, key: str, jobs: List[QWebEngineUrlRequestJob]):
+        entry = self._lookup(key)
+        remaining = jobs
+        if entry is not None:
+            remaining = [job for job in jobs if not self._reply_from_disk(job, entry)]
+            if len(remaining) < len(jobs):
+                self.not_modified += 1
+                self.bytes_saved += entry['size'] * (len(jobs) - len(remaining))
+                entry['fetched'] = time.time()
+                entry['etag'] = _raw_header(reply, b'ETag') or entry.get('etag')
+                entry['last_modified'] = (_raw_header(reply, b'Last-Modified')
+                                          or entry.get('last_modified'))
+                try:
+                    _write_atomic(self._index_path(key), json.dumps(entry).encode())
+                except OSError:
+                    pass  # Revalidated again next time
+        if remaining:
+            # The stored body went missing in the meantime; download it in full
+            self._forget(key)
+            self.misses += 1
+            self._pending[key] = remaining
+            self._fetch(reply.request().url(), key, None)
+
+    def _reply_from_disk(self, job: QWebEngineUrlRequestJob, entry: dict) -> bool:
+        """Answer a job with a stored body; False if it cannot be read in full."""
+        body = QFile(self._blob_path(entry['sha256']), job)
+        if not body.open(QIODevice.ReadOnly) or body.size() != entry['size']:
+            body.deleteLater()
+            return False
+        job.reply(entry['mime'].encode(), body)
+        return True
+
+    def _lookup(self, key: str) -> Optional[dict]:
+        try:
+            with open(self._index_path(key)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _forget(self, key: str):
+        try:
+            os.remove(self._index_path(key))
+        except OSError:
+            pass
+
+    def _store(self, key: str, data: bytes, mime: str, etag: Optional[str] = None,
+               last_modified: Optional[str] = None):
+        digest = hashlib.sha256(data).hexdigest()
+        blob_path = self._blob_path(digest)
+        if os.path.exists(blob_path):
+            self.deduplicated += 1
+        else:
+            _write_atomic(blob_path, data)
+        entry = {'url': key, 'sha256': digest, 'mime': mime, 'size': len(data),
+                 'fetched': time.time(), 'etag': etag, 'last_modified': last_modified}
+        _write_atomic(self._index_path(key), json.dumps(entry).encode())
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.path, 'blobs', digest[:2], digest)
+
+    def _index_path(self, key: str) -> str:
+        name = hashlib.sha256(key.encode()).hexdigest()
+        return os.path.join(self.path, 'index', name[:2], name + '.json')
+
+
+class RequestFilter(QWebEngineUrlRequestInterceptor):
+    """Blocks requests to non-essential hosts and hands cacheable assets to an AssetCache.
+
+    One filter is installed on every profile and sees each request a page
+    makes, on the UI thread.
+    """
+
+    def __init__(self, cache: Optional[AssetCache] = None,
+                 blocked_hosts: Tuple[str, ...] = BLOCKED_HOSTS, parent=None):
+        super().__init__(parent)
+        self.cache = cache
+        self.blocked_hosts = tuple(blocked_hosts)
+        self.blocked: Dict[str, int] = {}  # Host -> blocked requests
+
+    def install(self, profile):
+        """Filter the requests of a profile's pages and serve its cached assets."""
+        profile.setUrlRequestInterceptor(self)
+        if self.cache is not None and profile.urlSchemeHandler(ASSET_SCHEME) is None:
+            profile.installUrlSchemeHandler(ASSET_SCHEME, self.cache)
+
+    def interceptRequest(self, info: QWebEngineUrlRequestInfo):
+        url = info.requestUrl()
+        host = url.host()
+        if _host_matches(host, self.blocked_hosts):
+            info.block(True)
+            self.blocked[host] = self.blocked.get(host, 0) + 1
+        elif (self.cache is not None and bytes(info.requestMethod()) == b'GET'
+              and info.resourceType() != QWebEngineUrlRequestInfo.ResourceTypeMainFrame
+              and self.cache.is_cacheable(url)):
+            info.redirect(self.cache.cache_url(url))
+
+    def summary(self) -> dict:
+        return {
+            'blocked': sum(self.blocked.values()),
+            'blocked_hosts': dict(self.blocked),
+            'asset_cache': self.cache.summary() if self.cache is not None else None,
+        }
+
+
+def default_request_filter() -> RequestFilter:
+    """The filter and asset cache configured in config.py, kept alive with the application."""
+    app = QCoreApplication.instance()
+    cache = AssetCache(parent=app) if ASSET_CACHE_HOSTS else None
+    return RequestFilter(cache, parent=app)
@@ -0,0 +1,78 @@
+from typing import Callable, Dict, List, Optional, Tuple
+
+from PyQt5.QtCore import QObject, QTimer
+
+from flyff_browser.config import PRESS_BATCH_GAP_MS, PRESS_BATCH_ORDER, PRESS_HOLD_MS
+from flyff_browser.dispatcher import batch_script
+
+ResultCallback = Callable[[object], None]
+
+
+class PressBatcher(QObject):
+    """Collects presses per web view and sends each view's presses as one call.
+
+    Presses submitted while the scheduler drains a tick are queued and flushed
+    together once control returns to the event loop, so every tab costs one
+    runJavaScript round trip per tick no matter how many of its keys fired.
+    """
+
+    def __init__(self, parent=None, order: str = PRESS_BATCH_ORDER,
+                 gap_ms: int = PRESS_BATCH_GAP_MS, hold_ms: int = PRESS_HOLD_MS):
+        super().__init__(parent)
+        self.order = order
+        self.gap_ms = gap_ms
+        self.hold_ms = hold_ms
+        # Per view: (key index, callback, hold ms or None for hold_ms)
+        self._queues: Dict[object, List[Tuple[int, Optional[ResultCallback], Optional[int]]]] = {}
+
+        self._flush_timer = QTimer(self)
+        self._flush_timer.setSingleShot(True)
+        self._flush_timer.setInterval(0)
+        self._flush_timer.timeout.connect(self.flush)
+
+    def submit(self, web_view, key_index: int, callback: Optional[ResultCallback] = None,
+               hold_ms: Optional[int] = None):
+        """Queue a press of the key at key_index on the given view, held for hold_ms
+        instead of the batcher's hold if given."""
+        self._queues.setdefault(web_view, []).append((key_index, callback, hold_ms))
+        if not self._flush_timer.isActive():
+            self._flush_timer.start()
+
+    def flush(self):
+        """Send every queued press, one call per view."""
+        queues, self._queues = self._queues, {}
+        for web_view, presses in queues.items():
+            if self.order == 'key':
+                presses.sort(key=lambda press: press[0])
+            indices = [index for index, _, _ in presses]
+            callbacks = [callback for _, callback, _ in presses if callback]
+            hold_ms = self.hold_ms
+            if any(hold is not None for _, _, hold in presses):
+                hold_ms = [self.hold_ms if hold is None else hold for _, _, hold in presses]
+
+            try:
+                page = web_view.page()
+            except RuntimeError:
+                # The tab was closed after its presses were queued
+                continue
+            page.runJavaScript(
+                batch_script(indices, self.gap_ms, hold_ms),
+                self._result_handler(callbacks))
+
+    @staticmethod
+    def _result_handler(callbacks: List[ResultCallback]) -> ResultCallback:
+        def handle(result):
+            for callback in callbacks:
+                callback(result)
+        return handle
+
+
+_shared_batcher: Optional[PressBatcher] = None
+
+
+def shared_batcher() -> PressBatcher:
+    """Return the process-wide batcher, creating it on first use."""
+    global _shared_batcher
+    if _shared_batcher is None:
+        _shared_batcher = PressBatcher()
+    return _shared_batcher
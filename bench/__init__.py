@@ -0,0 +1,3 @@
+"""
+Headless benchmarks for the auto-press pipeline.
+"""
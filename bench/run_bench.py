@@ -0,0 +1,806 @@
+"""
+Sweep tabs x keys x interval through the real press pipeline against a local
+stand-in game page and save the results as JSON.
+
+    python -m flyff_browser.bench.run_bench --tabs 1 4 8 --keys 1 5 --intervals 0.5 1
+    python -m flyff_browser.bench.run_bench --baseline bench_results/bench-1.0.0-....json
+    python -m flyff_browser.bench.run_bench --tabs 8 12 --broadcast 50
+    python -m flyff_browser.bench.run_bench --spread 0.5 --distribution normal --seed 1 \
+        --record-intervals intervals.json
+    python -m flyff_browser.bench.run_bench --spread 0.5 --replay-intervals intervals.json
+    python -m flyff_browser.bench.run_bench --tabs 8 --watch 30 --watch-fps 10
+    python -m flyff_browser.bench.run_bench --tabs 8 --assets 40
+    python -m flyff_browser.bench.run_bench --tabs 8 --control 200
+    python -m flyff_browser.bench.run_bench --tabs 4 8 --render 20 --render-fps 10
+    python -m flyff_browser.bench.run_bench --tabs 1 8 --macro 2000
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtCore import (PYQT_VERSION_STR, QT_VERSION_STR, QBuffer, QEventLoop, QIODevice,
+                          QTimer, QUrl)
+from PyQt5.QtGui import QColor, QImage
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtWebEngineWidgets import QWebEngineProfile, QWebEngineView
+
+from flyff_browser import __version__
+from flyff_browser.assets import AssetCache, RequestFilter, register_asset_scheme
+from flyff_browser.broadcast import Broadcaster
+from flyff_browser.config import (AVAILABLE_KEYS, BASE_KEYS, KEY_TABLE, MACRO_START_DELAY_MS,
+                                  PRESS_HOLD_MS, WATCH_FPS, get_key_config)
+from flyff_browser.control import ControlServer
+from flyff_browser.dispatcher import install_dispatcher
+from flyff_browser.intervals import (DISTRIBUTIONS, IntervalGenerator, ReplayIntervals,
+                                     load_intervals, save_intervals)
+from flyff_browser.key_simulator import KeyPressSimulator
+from flyff_browser.macros import Macro
+from flyff_browser.main import CustomWebPage
+from flyff_browser.procinfo import tree_usage
+from flyff_browser.render import RenderThrottle, install_render_throttle
+from flyff_browser.scheduler import now_ms
+from flyff_browser.session import TabSession
+from flyff_browser.watcher import RegionWatcher
+
+STAND_IN_PAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stand_in.html')
+BARS_PAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bars.html')
+
+# The bars drawn by bars.html: region, colour and the key that refills it
+WATCHED_BARS = (
+    ((0.02, 0.03, 0.3, 0.03), 'red', '1'),
+    ((0.02, 0.08, 0.3, 0.03), 'blue', '2'),
+)
+
+
+def _spin(ms: int):
+    """Run the Qt event loop for ms milliseconds."""
+    loop = QEventLoop()
+    QTimer.singleShot(ms, loop.quit)
+    loop.exec_()
+
+
+def _spin_until(predicate, timeout_ms: int) -> bool:
+    deadline = time.monotonic() + timeout_ms / 1000
+    while not predicate():
+        if time.monotonic() >= deadline:
+            return False
+        _spin(10)
+    return True
+
+
+def _distribution(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {'mean': None, 'p50': None, 'p95': None, 'max': None}
+    values = sorted(values)
+    return {
+        'mean': sum(values) / len(values),
+        'p50': values[len(values) // 2],
+        'p95': values[min(len(values) - 1, int(0.95 * len(values)))],
+        'max': values[-1],
+    }
+
+
+def _open_views(tabs: int, page: str = STAND_IN_PAGE) -> List[QWebEngineView]:
+    """Open page (a file or an http URL) in tabs views at once and wait until all have loaded."""
+    views = []
+    loaded = []
+    for _ in range(tabs):
+        view = QWebEngineView()
+        web_page = CustomWebPage(view)
+        view.setPage(web_page)
+        install_dispatcher(web_page)
+        install_render_throttle(web_page)
+        view.loadFinished.connect(loaded.append)
+        view.resize(640, 480)
+        view.show()
+        view.setUrl(QUrl(page) if '://' in page else QUrl.fromLocalFile(page))
+        views.append(view)
+
+    if not _spin_until(lambda: len(loaded) == tabs, 30000) or not all(loaded):
+        raise RuntimeError(f'{os.path.basename(page)} failed to load in {tabs} tab(s)')
+    return views
+
+
+def _drain_events(views: List[QWebEngineView]) -> Dict[int, list]:
+    drained: Dict[int, list] = {}
+    for i, view in enumerate(views):
+        view.page().runJavaScript(
+            'window.__bench.drain()',
+            lambda events, i=i: drained.__setitem__(i, events or []))
+    _spin_until(lambda: len(drained) == len(views), 10000)
+    return drained
+
+
+def run_case(tabs: int, keys: int, interval_s: float, duration_s: float,
+             spread: float = 0.0, distribution: str = 'uniform', seed: Optional[int] = None,
+             replay: Optional[List[List[int]]] = None, recorded: Optional[list] = None) -> dict:
+    """Run one tabs x keys x interval case and return its measurements.
+
+    Intervals range over interval_s * (1 +- spread) and are drawn from
+    distribution; each key gets seed plus its position as its seed. With
+    replay, key n replays stream n instead (wrapping around). Generated
+    streams are appended to recorded, if given.
+    """
+    views = _open_views(tabs)
+    simulators = []
+    try:
+        usage_before = tree_usage()
+        started = time.monotonic()
+        for view in views:
+            for key_def in AVAILABLE_KEYS[:keys]:
+                n = len(simulators)
+                config = get_key_config(key_def.label)
+                config.min_interval = interval_s * (1 - spread)
+                config.max_interval = interval_s * (1 + spread)
+                if replay:
+                    intervals = ReplayIntervals(replay[n % len(replay)])
+                else:
+                    intervals = IntervalGenerator(
+                        distribution, int(config.min_interval * 1000), int(config.max_interval * 1000),
+                        seed=None if seed is None else seed + n, record=recorded is not None)
+                    if recorded is not None:
+                        recorded.append(intervals.history)
+                simulator = KeyPressSimulator(view)
+                simulator.start(config, intervals=intervals)
+                simulators.append((view, simulator))
+
+        _spin(int(duration_s * 1000))
+        for _, simulator in simulators:
+            simulator.stop()
+        elapsed = time.monotonic() - started
+        usage_after = tree_usage()
+
+        # Let the last keyups and runJavaScript results land before reading the pages
+        _spin(PRESS_HOLD_MS + 250)
+        drained = _drain_events(views)
+    finally:
+        for view in views:
+            view.close()
+            view.deleteLater()
+        _spin(100)
+
+    sent = delivered = missed = duplicates = 0
+    lags: List[float] = []
+    rtts: List[float] = []
+    drift: List[float] = []
+    for i, view in enumerate(views):
+        arrivals = defaultdict(list)
+        for code, is_keydown, timestamp in drained.get(i, []):
+            if is_keydown:
+                arrivals[code].append(timestamp)
+
+        for sim_view, simulator in simulators:
+            if sim_view is not view:
+                continue
+            times = arrivals.get(simulator.config.key_name, [])
+            count = simulator.stats.count
+            sent += count
+            delivered += len(times)
+            missed += max(0, count - len(times))
+            duplicates += max(0, len(times) - count)
+            # Arrival gaps against the gaps the scheduler planned. The stats only keep the
+            # latest presses, so arrivals are matched from the end; a key that lost or
+            # doubled an event cannot be paired up and gives no drift
+            planned = [scheduled for _, scheduled, _, _ in simulator.stats.samples()]
+            if len(times) == count and planned:
+                times = times[-len(planned):]
+                drift.extend((b - a) - (pb - pa) for a, b, pa, pb
+                             in zip(times, times[1:], planned, planned[1:]))
+            for _, scheduled, fired, result in simulator.stats.samples():
+                lags.append(fired - scheduled)
+                if not math.isnan(result):
+                    rtts.append(result - fired)
+
+    cpu_s = usage_after['cpu_s'] - usage_before['cpu_s']
+    return {
+        'tabs': tabs,
+        'keys': keys,
+        'interval_s': interval_s,
+        'spread': spread,
+        'distribution': 'replay' if replay else distribution,
+        'duration_s': round(elapsed, 3),
+        'presses_sent': sent,
+        'events_delivered': delivered,
+        'events_per_s': delivered / elapsed if elapsed else 0.0,
+        'missed': missed,
+        'duplicates': duplicates,
+        'lag_ms': _distribution(lags),
+        'rtt_ms': _distribution(rtts),
+        'interval_drift_ms': _distribution(drift),
+        'cpu_s': cpu_s,
+        'cpu_percent': 100.0 * cpu_s / elapsed if elapsed else 0.0,
+        'rss_mb': usage_after['rss_bytes'] / (1024 * 1024),
+    }
+
+
+def run_broadcast_case(tabs: int, rounds: int, gap_ms: int = 200) -> dict:
+    """Broadcast one key to every tab rounds times and measure the receive spread."""
+    views = _open_views(tabs)
+    sessions = [TabSession(view) for view in views]
+    broadcaster = Broadcaster()
+    try:
+        for _ in range(rounds):
+            result = broadcaster.broadcast(sessions, AVAILABLE_KEYS[0].label)
+            _spin_until(lambda: result['done'], broadcaster.timeout_ms + 100)
+            _spin(gap_ms)
+    finally:
+        for view in views:
+            view.close()
+            view.deleteLater()
+        _spin(100)
+
+    history = list(broadcaster.history)
+    return {
+        'tabs': tabs,
+        'rounds': rounds,
+        'incomplete': sum(1 for result in history if result['received'] < tabs),
+        'receive_spread_ms': _distribution(
+            [r['receive_spread_ms'] for r in history if r['receive_spread_ms'] is not None]),
+        'send_spread_ms': _distribution([r['send_spread_ms'] for r in history]),
+    }
+
+
+def run_watch_case(tabs: int, duration_s: float, fps: float, threshold: float = 0.5,
+                   interval_s: float = 1.0) -> dict:
+    """Watch the HP and MP bars of bars.html in every tab while a timed key presses alongside.
+
+    Reports the watcher's own cost, how low the bars fell and how long they
+    stayed below the threshold before their refill key arrived, and the
+    timed key's lag to compare with a run without watches.
+    """
+    views = _open_views(tabs, BARS_PAGE)
+    sessions = [TabSession(view) for view in views]
+    watcher = RegionWatcher(lambda: sessions, fps=fps)
+    pages: Dict[int, dict] = {}
+    try:
+        for view, session in zip(views, sessions):
+            view.page().runJavaScript(f'window.__bars.setThreshold({threshold}); window.__bars.reset()')
+            for region, channel, key in WATCHED_BARS:
+                session.set_watch_active(session.add_watch(region, channel, threshold, key), True)
+            session.set_key_active(session.add_key('3', interval_s, interval_s), True)
+
+        _spin(int(duration_s * 1000))
+        watcher.stop()
+        for session in sessions:
+            session.close()
+        for i, view in enumerate(views):
+            view.page().runJavaScript(
+                'window.__bars.stats()', lambda stats, i=i: pages.__setitem__(i, stats or {}))
+        _spin_until(lambda: len(pages) == len(views), 10000)
+    finally:
+        watcher.stop()
+        for view in views:
+            view.close()
+            view.deleteLater()
+        _spin(100)
+
+    bars = {}
+    for name in ('hp', 'mp'):
+        stats = [page[name] for page in pages.values() if name in page]
+        bars[name] = {
+            'refills': sum(bar['refills'] for bar in stats),
+            'min_level': min((bar['min'] for bar in stats), default=None),
+            'below_threshold_ms': _distribution([late for bar in stats for late in bar['late']]),
+        }
+    lags = [fired - scheduled for session in sessions for simulator in session.simulators.values()
+            for _, scheduled, fired, _ in simulator.stats.samples()]
+    return {
+        'tabs': tabs,
+        'fps': fps,
+        'duration_s': duration_s,
+        'watcher': watcher.summary(),
+        'bars': bars,
+        'timed_key_lag_ms': _distribution(lags),
+    }
+
+
+def run_control_case(tabs: int, rounds: int, gap_ms: int = 20) -> dict:
+    """Press a key on every tab through the control API rounds times, from a client thread.
+
+    Measures the HTTP round trip of each press command and the time from
+    sending it to the last tab's keydown, on one keep-alive connection.
+    """
+    views = _open_views(tabs)
+    sessions = [TabSession(view) for view in views]
+    server = ControlServer(lambda: sessions, open_tab=None, close_tab=None,
+                           activate=lambda session: None, on_change=lambda: None, port=0)
+    server.start()
+    round_trips, keydowns, errors = [], [], []
+
+    def client():
+        connection = http.client.HTTPConnection('127.0.0.1', server.port)
+        body = json.dumps({'cmd': 'press', 'tab': 'all', 'key': AVAILABLE_KEYS[0].label})
+        try:
+            for _ in range(rounds):
+                sent = time.time() * 1000
+                connection.request('POST', '/commands', body, {'Content-Type': 'application/json'})
+                result = json.loads(connection.getresponse().read())
+                round_trips.append(time.time() * 1000 - sent)
+                times = [at for at in result.get('keydown_ms', {}).values() if at]
+                if len(times) < tabs:
+                    errors.append(result)
+                if times:
+                    keydowns.append(max(times) - sent)
+                time.sleep(gap_ms / 1000)
+        except OSError as error:
+            errors.append(str(error))
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=client)
+    try:
+        thread.start()
+        _spin_until(lambda: not thread.is_alive(), rounds * (gap_ms + 2000))
+    finally:
+        thread.join()
+        server.stop()
+        for view in views:
+            view.close()
+            view.deleteLater()
+        _spin(100)
+
+    return {
+        'tabs': tabs,
+        'rounds': rounds,
+        'incomplete': len(errors),
+        'round_trip_ms': _distribution(round_trips),
+        'command_to_keydown_ms': _distribution(keydowns),
+        'server': server.summary(),
+    }
+
+
+def run_render_case(tabs: int, duration_s: float, fps: float, pixel_ratio: Optional[float] = None,
+                    interval_s: float = 1.0) -> dict:
+    """Run bars.html in every tab first at full rate, then throttled as a non-current tab.
+
+    A timed key refills the HP bar in both rounds, to show presses keep
+    arriving. Reports frames drawn, refills, key lag and renderer CPU per
+    tab and for the whole process tree in each round.
+    """
+    views = _open_views(tabs, BARS_PAGE)
+    sessions = [TabSession(view) for view in views]
+    # Every view is a window on screen, as worker clients are, so all of them draw; none is
+    # current, so the budget applies to every one of them once set
+    throttle = RenderThrottle(lambda: sessions, lambda: None, fps=0, pixel_ratio=None, mute=False,
+                              sample_s=3600)
+    rounds = {}
+    try:
+        for session in sessions:
+            session.set_key_active(session.add_key('1', interval_s, interval_s), True)
+        for name in ('full', 'throttled'):
+            if name == 'throttled':
+                throttle.fps, throttle.pixel_ratio, throttle.mute = fps, pixel_ratio, True
+            throttle.update()
+            for view in views:
+                view.page().runJavaScript('window.__bars.reset()')
+            for session in sessions:
+                for simulator in session.simulators.values():
+                    simulator.stats.clear()
+            _spin(500)  # Let the new budget take hold before measuring
+            throttle.sample()
+            usage_before = tree_usage()
+            started = time.monotonic()
+            _spin(int(duration_s * 1000))
+            elapsed = time.monotonic() - started
+            usage_after = tree_usage()
+            throttle.sample()
+
+            pages: Dict[int, dict] = {}
+            for i, view in enumerate(views):
+                view.page().runJavaScript(
+                    'window.__bars.stats()', lambda stats, i=i: pages.__setitem__(i, stats or {}))
+            _spin_until(lambda: len(pages) == len(views), 10000)
+            lags = [fired - scheduled for session in sessions
+                    for simulator in session.simulators.values()
+                    for _, scheduled, fired, _ in simulator.stats.samples()]
+            cpu_s = usage_after['cpu_s'] - usage_before['cpu_s']
+            rounds[name] = {
+                'fps': _distribution([page.get('frames', 0) / elapsed for page in pages.values()]),
+                'refills': sum(page.get('hp', {}).get('refills', 0) for page in pages.values()),
+                'key_lag_ms': _distribution(lags),
+                'cpu_percent': 100.0 * cpu_s / elapsed if elapsed else 0.0,
+            }
+        for session in sessions:
+            session.close()
+    finally:
+        for view in views:
+            view.close()
+            view.deleteLater()
+        _spin(100)
+
+    return {
+        'tabs': tabs,
+        'fps_cap': fps,
+        'pixel_ratio': pixel_ratio,
+        'duration_s': duration_s,
+        'rounds': rounds,
+        'per_tab_cpu_percent': [
+            {'full': row['cpu_percent_full'], 'throttled': row['cpu_percent_throttled']}
+            for row in throttle.report()
+        ],
+    }
+
+
+def run_macro_case(tabs: int, presses: int, gap_ms: int = 25) -> dict:
+    """Save, load and play a macro of presses keys gap_ms apart on every tab at once.
+
+    Reports the file size and save and load times, how far each keydown
+    landed from its place in the macro (relative to the tab's first
+    keydown), and the spread of the first keydown across tabs.
+    """
+    indices = [KEY_TABLE[label].index for label, *_ in BASE_KEYS]
+    events = []
+    for i in range(presses):
+        events += [indices[i % len(indices)], i * gap_ms, PRESS_HOLD_MS // 2]
+    macro = Macro.from_events(events)
+
+    directory = tempfile.mkdtemp(prefix='ftool-bench-macro-')
+    try:
+        path = os.path.join(directory, 'bench.ftm')
+        started = time.perf_counter()
+        macro.save(path)
+        save_ms = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        macro = Macro.load(path)
+        load_ms = (time.perf_counter() - started) * 1000
+        file_bytes = os.path.getsize(path)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    views = _open_views(tabs)
+    sessions = [TabSession(view) for view in views]
+    try:
+        _drain_events(views)
+        start_at = now_ms() + MACRO_START_DELAY_MS
+        for session in sessions:
+            session.play_macro(macro, start_at=start_at)
+        _spin_until(lambda: not any(session.is_playing for session in sessions),
+                    macro.duration_ms + 10000)
+        _spin(PRESS_HOLD_MS + 200)  # Last keyups
+        drained = _drain_events(views)
+        players = [session.macro_summary() for session in sessions]
+        for session in sessions:
+            session.close()
+    finally:
+        for view in views:
+            view.close()
+            view.deleteLater()
+        _spin(100)
+
+    errors, firsts, received = [], [], 0
+    for events in drained.values():
+        keydowns = [at for _, kind, at in events if kind == 1]
+        received += len(keydowns)
+        if keydowns:
+            firsts.append(keydowns[0])
+            errors.extend(abs(at - keydowns[0] - offset)
+                          for at, offset in zip(keydowns, macro.offsets))
+    return {
+        'tabs': tabs,
+        'presses': presses,
+        'gap_ms': gap_ms,
+        'file_bytes': file_bytes,
+        'save_ms': save_ms,
+        'load_ms': load_ms,
+        'expected': presses * tabs,
+        'received': received,
+        'dropped': sum(player['dropped'] for player in players),
+        'offset_error_ms': _distribution(errors),
+        'first_keydown_spread_ms': max(firsts) - min(firsts) if firsts else None,
+        'lag_ms_p95': max((player.get('lag_p95') or 0) for player in players),
+    }
+
+
+class _AssetServer(ThreadingHTTPServer):
+    """Stand-in game server on 127.0.0.1: a page loading ``count`` PNG assets plus a tracker.
+
+    Every other asset is a byte-identical copy under another name, as
+    happens with game files shared between maps. The tracker script is
+    referenced through 'localhost' so a filter can block it by host. No
+    response may be cached by the browser, so every load reaches the server
+    unless the asset cache answers it; bytes_served counts what it sent.
+    """
+
+    def __init__(self, count: int, size_kb: int):
+        super().__init__(('127.0.0.1', 0), _AssetRequestHandler)
+        self.bytes_served = 0
+        self.files = {}
+        for i in range(count):
+            self.files[f'/assets/{i}.png'] = ('image/png', _noise_png(i // 2, size_kb))
+        self.files['/analytics.js'] = ('text/javascript', b'window.__tracked = true;')
+        images = ''.join(f'<img src="/assets/{i}.png" onload="__assets.loaded++" '
+                         f'onerror="__assets.failed++">' for i in range(count))
+        tracker = f'http://localhost:{self.server_port}/analytics.js'
+        self.files['/page.html'] = ('text/html', (
+            f'<!DOCTYPE html><html><head><script>window.__assets = {{loaded: 0, failed: 0}};'
+            f'</script><script src="{tracker}"></script></head><body>{images}</body></html>'
+        ).encode())
+
+    def url(self, path: str) -> str:
+        return f'http://127.0.0.1:{self.server_port}{path}'
+
+
+class _AssetRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        content_type, body = self.server.files.get(self.path, (None, None))
+        if body is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.bytes_served += len(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _noise_png(seed: int, size_kb: int) -> bytes:
+    # Noise barely compresses, so the PNG comes out close to size_kb
+    side = max(8, int((size_kb * 1024 / 3) ** 0.5))
+    image = QImage(side, side, QImage.Format_RGB888)
+    state = seed * 2654435761 + 1
+    for y in range(side):
+        for x in range(side):
+            state = (state * 1103515245 + 12345) & 0x7fffffff
+            image.setPixelColor(x, y, QColor(state & 0xff, (state >> 8) & 0xff, (state >> 16) & 0xff))
+    buffer = QBuffer()
+    buffer.open(QIODevice.WriteOnly)
+    image.save(buffer, 'PNG')
+    return bytes(buffer.data())
+
+
+def run_asset_case(tabs: int, assets: int, size_kb: int = 64) -> List[dict]:
+    """Load an asset-heavy page in every tab at once: unfiltered, then with a cold and a warm cache.
+
+    Returns one result per round with the time until every tab had loaded,
+    the bytes the server sent, and the filter's counters.
+    """
+    server = _AssetServer(assets, size_kb)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    cache_dir = tempfile.mkdtemp(prefix='ftool-assets-')
+    profile = QWebEngineProfile.defaultProfile()
+    results = []
+    try:
+        for round_name in ('off', 'cold', 'warm'):
+            request_filter = None
+            if round_name != 'off':
+                cache = AssetCache(cache_dir, hosts=('127.0.0.1',), extensions=('.png',))
+                request_filter = RequestFilter(cache, blocked_hosts=('localhost',))
+                request_filter.install(profile)
+
+            server.bytes_served = 0
+            started = time.monotonic()
+            views = _open_views(tabs, server.url('/page.html'))
+            elapsed = time.monotonic() - started
+            loaded = {}
+            for i, view in enumerate(views):
+                view.page().runJavaScript(
+                    'window.__assets', lambda counts, i=i: loaded.__setitem__(i, counts or {}))
+            _spin_until(lambda: len(loaded) == len(views), 10000)
+            for view in views:
+                view.close()
+                view.deleteLater()
+            _spin(100)
+
+            if request_filter is not None:
+                profile.setUrlRequestInterceptor(None)
+                profile.removeUrlSchemeHandler(request_filter.cache)
+            results.append({
+                'tabs': tabs,
+                'assets': assets,
+                'round': round_name,
+                'load_s': round(elapsed, 3),
+                'images_loaded': sum(counts.get('loaded', 0) for counts in loaded.values()),
+                'images_failed': sum(counts.get('failed', 0) for counts in loaded.values()),
+                'server_bytes': server.bytes_served,
+                'requests': request_filter.summary() if request_filter else None,
+            })
+    finally:
+        server.shutdown()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    return results
+
+
+def _case_key(result: dict):
+    return result['tabs'], result['keys'], result['interval_s']
+
+
+def compare(results: List[dict], baseline_path: str):
+    """Print the change of the headline numbers against an earlier results file."""
+    with open(baseline_path) as f:
+        baseline = {_case_key(r): r for r in json.load(f)['results']}
+
+    print(f'\nCompared with {baseline_path}:')
+    for result in results:
+        old = baseline.get(_case_key(result))
+        if not old:
+            continue
+        old_p95 = old['lag_ms']['p95'] or 0.0
+        new_p95 = result['lag_ms']['p95'] or 0.0
+        print(f"  tabs={result['tabs']} keys={result['keys']} interval={result['interval_s']}s: "
+              f"events/s {old['events_per_s']:.1f} -> {result['events_per_s']:.1f}, "
+              f"lag p95 {old_p95:.1f} -> {new_p95:.1f} ms, "
+              f"cpu {old['cpu_percent']:.0f}% -> {result['cpu_percent']:.0f}%")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the auto-press pipeline headlessly.')
+    parser.add_argument('--tabs', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--keys', type=int, nargs='+', default=[1, 5])
+    parser.add_argument('--intervals', type=float, nargs='+', default=[1.0],
+                        help='press interval(s) in seconds')
+    parser.add_argument('--duration', type=float, default=10.0,
+                        help='seconds to run each case')
+    parser.add_argument('--output', help='results file (default: bench_results/bench-<version>-<time>.json)')
+    parser.add_argument('--baseline', help='earlier results file to compare against')
+    parser.add_argument('--broadcast', type=int, metavar='ROUNDS', default=0,
+                        help='also broadcast a key to all tabs this many times per tab count')
+    parser.add_argument('--spread', type=float, default=0.0,
+                        help='intervals range over interval * (1 +- spread)')
+    parser.add_argument('--distribution', choices=DISTRIBUTIONS, default='uniform')
+    parser.add_argument('--seed', type=int, help='seed the interval streams for a reproducible run')
+    parser.add_argument('--record-intervals', metavar='PATH',
+                        help='save the generated interval streams for --replay-intervals')
+    parser.add_argument('--replay-intervals', metavar='PATH',
+                        help='press at the intervals saved by an earlier --record-intervals run')
+    parser.add_argument('--watch', type=float, metavar='SECONDS', default=0,
+                        help='also watch draining HP/MP bars in every tab for this long per tab count')
+    parser.add_argument('--watch-fps', type=float, default=WATCH_FPS)
+    parser.add_argument('--assets', type=int, metavar='COUNT', default=0,
+                        help='also load a page with this many assets in all tabs, with and '
+                             'without the asset cache, per tab count')
+    parser.add_argument('--render', type=float, metavar='SECONDS', default=0,
+                        help='also run animated pages at full rate and then throttled, this long '
+                             'each per tab count')
+    parser.add_argument('--render-fps', type=float, default=10,
+                        help='frame rate cap for the throttled --render round')
+    parser.add_argument('--render-pixel-ratio', type=float,
+                        help='device pixel ratio for the throttled --render round')
+    parser.add_argument('--control', type=int, metavar='ROUNDS', default=0,
+                        help='also press a key on all tabs through the control API this many '
+                             'times per tab count')
+    parser.add_argument('--macro', type=int, metavar='PRESSES', default=0,
+                        help='also save, load and play a macro of this many presses on all tabs '
+                             'per tab count')
+    args = parser.parse_args(argv)
+    if not 0 <= args.spread < 1:
+        parser.error('--spread must be at least 0 and below 1')
+    replay = load_intervals(args.replay_intervals) if args.replay_intervals else None
+    recorded = [] if args.record_intervals else None
+
+    # Modifier combinations share their event code with the base key, so
+    # only the base keys can be told apart on the stand-in page
+    if max(args.keys) > len(BASE_KEYS):
+        parser.error(f'--keys cannot exceed {len(BASE_KEYS)}')
+
+    register_asset_scheme()
+    app = QApplication(sys.argv[:1])
+
+    results = []
+    for tabs in args.tabs:
+        for keys in args.keys:
+            for interval_s in args.intervals:
+                result = run_case(tabs, keys, interval_s, args.duration, args.spread,
+                                  args.distribution, args.seed, replay, recorded)
+                results.append(result)
+                print(f"tabs={tabs} keys={keys} interval={interval_s}s: "
+                      f"{result['events_per_s']:.1f} events/s, "
+                      f"missed={result['missed']} dup={result['duplicates']}, "
+                      f"lag p95={result['lag_ms']['p95'] or 0:.1f} ms, "
+                      f"cpu={result['cpu_percent']:.0f}%, rss={result['rss_mb']:.0f} MB")
+
+    broadcasts = []
+    for tabs in args.tabs if args.broadcast else []:
+        result = run_broadcast_case(tabs, args.broadcast)
+        broadcasts.append(result)
+        spread = result['receive_spread_ms']
+        print(f"broadcast tabs={tabs}: spread p50={spread['p50'] or 0:.1f} "
+              f"p95={spread['p95'] or 0:.1f} max={spread['max'] or 0:.1f} ms, "
+              f"incomplete={result['incomplete']}/{args.broadcast}")
+
+    watches = []
+    for tabs in args.tabs if args.watch else []:
+        result = run_watch_case(tabs, args.watch, args.watch_fps)
+        watches.append(result)
+        watcher, hp = result['watcher'], result['bars']['hp']
+        print(f"watch tabs={tabs} fps={args.watch_fps}: frames={watcher['frames']} "
+              f"skipped={watcher['skipped']}, grab p95={watcher['grab_ms_p95'] or 0:.1f} ms, "
+              f"analyze p95={watcher['analyze_ms_p95'] or 0:.1f} ms, "
+              f"hp min={hp['min_level'] or 0:.0%}, "
+              f"timed key lag p95={result['timed_key_lag_ms']['p95'] or 0:.1f} ms")
+
+    asset_rounds = []
+    for tabs in args.tabs if args.assets else []:
+        for result in run_asset_case(tabs, args.assets):
+            asset_rounds.append(result)
+            cache = (result['requests'] or {}).get('asset_cache') or {}
+            print(f"assets tabs={tabs} {result['round']}: load {result['load_s']:.2f} s, "
+                  f"server sent {result['server_bytes'] / (1024 * 1024):.1f} MB, "
+                  f"hits={cache.get('hits', 0) + cache.get('coalesced', 0)} "
+                  f"misses={cache.get('misses', 0)}, "
+                  f"failed images={result['images_failed']}")
+
+    renders = []
+    for tabs in args.tabs if args.render else []:
+        result = run_render_case(tabs, args.render, args.render_fps, args.render_pixel_ratio)
+        renders.append(result)
+        full, throttled = result['rounds']['full'], result['rounds']['throttled']
+        print(f"render tabs={tabs}: fps {full['fps']['p50'] or 0:.0f} -> "
+              f"{throttled['fps']['p50'] or 0:.0f}, "
+              f"cpu {full['cpu_percent']:.0f}% -> {throttled['cpu_percent']:.0f}%, "
+              f"refills {full['refills']} -> {throttled['refills']}, "
+              f"key lag p95 {full['key_lag_ms']['p95'] or 0:.1f} -> "
+              f"{throttled['key_lag_ms']['p95'] or 0:.1f} ms")
+
+    controls = []
+    for tabs in args.tabs if args.control else []:
+        result = run_control_case(tabs, args.control)
+        controls.append(result)
+        keydown = result['command_to_keydown_ms']
+        print(f"control tabs={tabs}: round trip p50={result['round_trip_ms']['p50'] or 0:.1f} ms, "
+              f"command to keydown p50={keydown['p50'] or 0:.1f} p95={keydown['p95'] or 0:.1f} ms, "
+              f"incomplete={result['incomplete']}/{args.control}")
+
+    macros = []
+    for tabs in args.tabs if args.macro else []:
+        result = run_macro_case(tabs, args.macro)
+        macros.append(result)
+        error = result['offset_error_ms']
+        print(f"macro tabs={tabs} presses={args.macro}: {result['file_bytes']} bytes, "
+              f"save {result['save_ms']:.1f} ms, load {result['load_ms']:.1f} ms, "
+              f"received {result['received']}/{result['expected']}, "
+              f"offset error p50={error['p50'] or 0:.1f} p95={error['p95'] or 0:.1f} ms, "
+              f"first keydown spread {result['first_keydown_spread_ms'] or 0:.1f} ms")
+
+    output = args.output or os.path.join(
+        'bench_results', f"bench-{__version__}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({
+            'meta': {
+                'version': __version__,
+                'python': platform.python_version(),
+                'qt': QT_VERSION_STR,
+                'pyqt': PYQT_VERSION_STR,
+                'platform': platform.platform(),
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'args': vars(args),
+            },
+            'results': results,
+            'broadcast': broadcasts,
+            'watch': watches,
+            'assets': asset_rounds,
+            'render': renders,
+            'control': controls,
+            'macro': macros,
+        }, f, indent=2)
+    print(f'Results written to {output}')
+    if recorded is not None:
+        save_intervals(args.record_intervals, recorded)
+        print(f'Interval streams written to {args.record_intervals}')
+
+    if args.baseline:
+        compare(results, args.baseline)
+
+    app.quit()
+
+
+if __name__ == '__main__':
+    main()
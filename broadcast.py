@@ -0,0 +1,72 @@
+import time
+from collections import deque
+from typing import Callable, List, Optional
+
+from PyQt5.QtCore import QObject, QTimer
+
+from flyff_browser.config import BROADCAST_TIMEOUT_MS, KEY_TABLE
+from flyff_browser.scheduler import now_ms
+
+# Number of past broadcasts kept for the stats export
+BROADCAST_HISTORY = 200
+
+
+class Broadcaster(QObject):
+    """Presses one key on several clients in a single pass and measures the skew.
+
+    Every call goes out back to back before control returns to the event
+    loop. Each page answers with the epoch time at which it dispatched the
+    keydown (performance.timeOrigin + now(), which agrees across renderer
+    processes), and the receive spread is the gap between the first and
+    last answer. The send spread is how long the Python loop itself took.
+    """
+
+    def __init__(self, on_result: Optional[Callable[[dict], None]] = None,
+                 timeout_ms: int = BROADCAST_TIMEOUT_MS, parent=None):
+        super().__init__(parent)
+        self.on_result = on_result
+        self.timeout_ms = timeout_ms
+        self.history = deque(maxlen=BROADCAST_HISTORY)
+
+    def broadcast(self, sessions: List, key: str) -> dict:
+        """Press key once on every session; the result is completed asynchronously."""
+        key_index = KEY_TABLE[key].index
+        result = {
+            'key': key,
+            'at': time.time(),
+            'clients': len(sessions),
+            'received': 0,
+            'send_spread_ms': None,
+            'receive_spread_ms': None,
+            'done': False,
+        }
+        stamps = []
+
+        def finish():
+            if result['done']:
+                return
+            result['done'] = True
+            result['received'] = len(stamps)
+            if stamps:
+                result['receive_spread_ms'] = round(max(stamps) - min(stamps), 2)
+            self.history.append(result)
+            if self.on_result:
+                self.on_result(result)
+
+        def received(at):
+            if result['done'] or at is None:
+                return
+            stamps.append(at)
+            if len(stamps) == len(sessions) and result['send_spread_ms'] is not None:
+                finish()
+
+        start = now_ms()
+        for session in sessions:
+            session.press_once(key_index, received)
+        result['send_spread_ms'] = round(now_ms() - start, 2)
+
+        if len(stamps) == len(sessions):
+            finish()
+        else:
+            QTimer.singleShot(self.timeout_ms, finish)
+        return result
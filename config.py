@@ -1,55 +1,246 @@
-from dataclasses import dataclass
-from typing import Dict, List, Tuple
+from types import MappingProxyType
+from typing import List, Mapping, NamedTuple, Optional, Tuple
+
+
+class KeyDef(NamedTuple):
+    """Immutable description of one pressable key, with its event payload precomputed."""
+    label: str      # Name shown in the UI, e.g. 'Shift+F1'
+    key: str        # KeyboardEvent.key
+    code: str       # KeyboardEvent.code
+    key_code: int   # KeyboardEvent.keyCode / which
+    shift: bool
+    ctrl: bool
+    alt: bool
+    index: int      # Position in AVAILABLE_KEYS, used by the page dispatcher
+    press_js: str   # Call that presses this key through the page dispatcher
+
 
-@dataclass
 class KeyPressConfig:
-    min_interval: int
-    max_interval: int
-    key: str
-    key_code: int
-    key_name: str
-
-# Define available keys and their codes
-DIGIT_KEYS: List[Tuple[str, int, str]] = [
-    ('0', 48, 'Digit0'),
-    ('1', 49, 'Digit1'),
-    ('2', 50, 'Digit2'),
-    ('3', 51, 'Digit3'),
-    ('4', 52, 'Digit4'),
-    ('5', 53, 'Digit5'),
-    ('6', 54, 'Digit6'),
-    ('7', 55, 'Digit7'),
-    ('8', 56, 'Digit8'),
-    ('9', 57, 'Digit9'),
+    __slots__ = ('min_interval', 'max_interval', 'key_def', 'distribution', 'seed')
+
+    def __init__(self, min_interval: float, max_interval: float, key_def: KeyDef,
+                 distribution: str = 'uniform', seed: Optional[int] = None):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.key_def = key_def
+        self.distribution = distribution  # One of intervals.DISTRIBUTIONS
+        self.seed = seed  # Makes the interval stream reproducible
+
+    @property
+    def key(self) -> str:
+        return self.key_def.label
+
+    @property
+    def key_code(self) -> int:
+        return self.key_def.key_code
+
+    @property
+    def key_name(self) -> str:
+        return self.key_def.code
+
+    def __repr__(self):
+        return (f'KeyPressConfig(min_interval={self.min_interval!r}, '
+                f'max_interval={self.max_interval!r}, key={self.key!r}, '
+                f'distribution={self.distribution!r})')
+
+# Define available keys and their codes: (label, key, keyCode, code)
+DIGIT_KEYS: List[Tuple[str, str, int, str]] = [
+    (str(n), str(n), 48 + n, f'Digit{n}') for n in range(10)
+]
+
+FUNCTION_KEYS: List[Tuple[str, str, int, str]] = [
+    (f'F{n}', f'F{n}', 111 + n, f'F{n}') for n in range(1, 13)
+]
+
+LETTER_KEYS: List[Tuple[str, str, int, str]] = [
+    (c, c.lower(), ord(c), f'Key{c}') for c in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+]
+
+NUMPAD_KEYS: List[Tuple[str, str, int, str]] = [
+    (f'Num{n}', str(n), 96 + n, f'Numpad{n}') for n in range(10)
+] + [
+    ('Num*', '*', 106, 'NumpadMultiply'),
+    ('Num+', '+', 107, 'NumpadAdd'),
+    ('Num-', '-', 109, 'NumpadSubtract'),
+    ('Num.', '.', 110, 'NumpadDecimal'),
+    ('Num/', '/', 111, 'NumpadDivide'),
+    ('NumEnter', 'Enter', 13, 'NumpadEnter'),
 ]
 
-FUNCTION_KEYS: List[Tuple[str, int, str]] = [
-    ('F1', 112, 'F1'),
-    ('F2', 113, 'F2'),
-    ('F3', 114, 'F3'),
-    ('F4', 115, 'F4'),
-    ('F5', 116, 'F5'),
-    ('F6', 117, 'F6'),
-    ('F7', 118, 'F7'),
-    ('F8', 119, 'F8'),
-    ('F9', 120, 'F9'),
-    ('F10', 121, 'F10'),
-    ('F11', 122, 'F11'),
-    ('F12', 123, 'F12'),
+SPECIAL_KEYS: List[Tuple[str, str, int, str]] = [
+    ('Space', ' ', 32, 'Space'),
+    ('Enter', 'Enter', 13, 'Enter'),
+    ('Tab', 'Tab', 9, 'Tab'),
+    ('Escape', 'Escape', 27, 'Escape'),
+    ('Backspace', 'Backspace', 8, 'Backspace'),
 ]
 
-# Combine all available keys
-AVAILABLE_KEYS = DIGIT_KEYS + FUNCTION_KEYS
+# Modifier combinations offered for every base key: (label prefix, shift, ctrl, alt)
+MODIFIERS: List[Tuple[str, bool, bool, bool]] = [
+    ('', False, False, False),
+    ('Shift+', True, False, False),
+    ('Ctrl+', False, True, False),
+    ('Alt+', False, False, True),
+]
+
+BASE_KEYS = DIGIT_KEYS + FUNCTION_KEYS + LETTER_KEYS + NUMPAD_KEYS + SPECIAL_KEYS
+
+
+def _build_keys() -> Tuple[KeyDef, ...]:
+    keys = []
+    for prefix, shift, ctrl, alt in MODIFIERS:
+        for label, key, key_code, code in BASE_KEYS:
+            if shift and len(key) == 1 and key.isalpha():
+                key = key.upper()
+            index = len(keys)
+            keys.append(KeyDef(prefix + label, key, code, key_code, shift, ctrl, alt,
+                               index, f'window.__ft&&__ft.press({index})'))
+    return tuple(keys)
+
+
+# Combine all available keys; built once at import and never modified
+AVAILABLE_KEYS: Tuple[KeyDef, ...] = _build_keys()
+
+KEY_TABLE: Mapping[str, KeyDef] = MappingProxyType({k.label: k for k in AVAILABLE_KEYS})
+
 
 def get_key_config(key_name: str) -> KeyPressConfig:
     """Get the key configuration for a given key name."""
-    for key, code, name in AVAILABLE_KEYS:
-        if key == key_name:
-            return KeyPressConfig(
-                min_interval=3,  # Default values
-                max_interval=6,
-                key=key,
-                key_code=code,
-                key_name=name
-            )
-    raise ValueError(f"Invalid key name: {key_name}") 
\ No newline at end of file
+    key_def = KEY_TABLE.get(key_name)
+    if key_def is None:
+        raise ValueError(f"Invalid key name: {key_name}")
+    return KeyPressConfig(
+        min_interval=3,  # Default values
+        max_interval=6,
+        key_def=key_def
+    )
+
+
+# Presses due within this many milliseconds of each other are sent to a tab as one batch
+PRESS_COALESCE_MS = 8
+
+# Order of keys inside a batch: 'due' keeps the order they came due in, 'key' sorts by key
+PRESS_BATCH_ORDER = 'due'
+
+# Milliseconds between consecutive keydowns inside a batch (0 sends them together)
+PRESS_BATCH_GAP_MS = 0
+
+# Milliseconds between each keydown and its keyup
+PRESS_HOLD_MS = 100
+
+# Background tabs with no active keys are frozen after this many idle seconds (0 disables)
+PAGE_FREEZE_AFTER_S = 300
+
+# ... and discarded (unloaded, needs a reload and new login) after this many (0 disables)
+PAGE_DISCARD_AFTER_S = 0
+
+# How often the idle policy is applied, in seconds
+PAGE_LIFECYCLE_CHECK_S = 10
+
+# How tabs get their browser profile: 'default', 'isolated' (per account) or 'shared_cache'
+PROFILE_MODE = 'default'
+
+# HTTP disk cache limit per profile in MB (0 lets Chromium decide)
+PROFILE_CACHE_LIMIT_MB = 512
+
+# Account used for the first tab when profiles are per account
+DEFAULT_ACCOUNT = 'main'
+
+# Page every new client tab opens
+GAME_URL = 'https://universe.flyff.com/play'
+
+# Changes to tabs and keys are written to the session file after this many quiet milliseconds
+SESSION_SAVE_DELAY_MS = 1000
+
+# Application-wide shortcut that broadcasts the selected key to every selected tab ('' disables)
+BROADCAST_HOTKEY = 'Ctrl+Shift+B'
+
+# How long a broadcast waits for every client to confirm its keydown, in milliseconds
+BROADCAST_TIMEOUT_MS = 1000
+
+# What happens to presses whose deadline passed while the app was stalled:
+# 'skip' drops them and keeps the original rhythm, 'catch_up' fires them at once,
+# 'restart' plans the next interval from the late press
+PRESS_LATE_POLICY = 'skip'
+
+# Period of the event loop watchdog's heartbeat timer, in milliseconds
+WATCHDOG_INTERVAL_MS = 10
+
+# A heartbeat this many milliseconds late is logged as a stall
+WATCHDOG_STALL_MS = 50
+
+# Press intervals are generated this many at a time
+INTERVAL_BATCH_SIZE = 256
+
+# Region watcher samples per second, and the cap on what can be configured
+WATCH_FPS = 5
+WATCH_MAX_FPS = 10
+
+# Watched regions are downscaled to this many pixels (width, height) before the checks
+WATCH_SAMPLE_SIZE = (64, 8)
+
+# A pixel counts as bar colour when its channel exceeds both others by this much (0-255)
+WATCH_MIN_DOMINANCE = 60
+
+# A watch presses its key at most once per this many milliseconds while its bar stays low
+WATCH_COOLDOWN_MS = 1500
+
+# Requests to these hosts (and their subdomains) are blocked: analytics and telemetry
+BLOCKED_HOSTS = (
+    'google-analytics.com',
+    'googletagmanager.com',
+    'doubleclick.net',
+    'connect.facebook.net',
+    'hotjar.com',
+)
+
+# Static assets from these hosts with these extensions are served from the local asset
+# cache; an empty host list turns the cache off. Scripts are left out so they keep the
+# game's origin
+ASSET_CACHE_HOSTS = ('universe.flyff.com',)
+ASSET_CACHE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.ogg', '.mp3', '.wav', '.wasm',
+                          '.bin', '.glb', '.ktx2', '.dds')
+
+# Cached assets older than this many seconds are checked with the server (a conditional
+# request); unchanged ones are served from disk for another period
+ASSET_CACHE_MAX_AGE_S = 3600
+
+# Port of the local control API on 127.0.0.1 (None turns it off; --control-port overrides)
+CONTROL_PORT = None
+
+# How often new presses are sent to control API subscribers, and their timing stats, in ms
+CONTROL_EVENT_INTERVAL_MS = 100
+CONTROL_STATS_INTERVAL_MS = 1000
+
+# Largest request body the control API accepts, in bytes
+CONTROL_MAX_BODY_BYTES = 1 << 20
+
+# Event subscribers that fall this many unsent bytes behind are disconnected
+CONTROL_MAX_BACKLOG_BYTES = 1 << 20
+
+# Longest wait for the control API thread to finish when it is stopped, in ms
+CONTROL_STOP_TIMEOUT_MS = 2000
+
+# Frame rate cap for tabs that are not shown (0 disables); keep it at or above WATCH_FPS so
+# watched bars still update between samples
+RENDER_THROTTLE_FPS = 10
+
+# Device pixel ratio reported to the game in tabs that are not shown, so it renders fewer
+# pixels (None keeps the screen's)
+RENDER_THROTTLE_PIXEL_RATIO = None
+
+# Mute the audio of tabs that are not shown
+RENDER_THROTTLE_MUTE = True
+
+# How often each tab's renderer CPU is sampled for the throttling report, in seconds
+RENDER_CPU_SAMPLE_S = 5
+
+# Macro presses overdue by more than this many milliseconds after a stall are dropped
+MACRO_MAX_LATE_MS = 250
+
+# Macros played on several tabs start this many milliseconds after the click, so every
+# tab gets the same start time
+MACRO_START_DELAY_MS = 50
+
+# How often the key table picks up new key stats, in milliseconds
+KEY_TABLE_REFRESH_MS = 250
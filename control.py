@@ -0,0 +1,543 @@
+import asyncio
+import json
+import threading
+import time
+from array import array
+from http import HTTPStatus
+from typing import Callable, Dict, List, Optional
+
+from PyQt5.QtCore import QCoreApplication, QObject, QTimer, pyqtSignal
+
+from flyff_browser.config import (BROADCAST_TIMEOUT_MS, CONTROL_EVENT_INTERVAL_MS,
+                                  CONTROL_MAX_BACKLOG_BYTES, CONTROL_MAX_BODY_BYTES, CONTROL_PORT,
+                                  CONTROL_STATS_INTERVAL_MS, CONTROL_STOP_TIMEOUT_MS, DEFAULT_ACCOUNT,
+                                  KEY_TABLE)
+from flyff_browser.intervals import DISTRIBUTIONS
+from flyff_browser.scheduler import now_ms
+from flyff_browser.session_store import apply_session_state, parse_session_state, session_state
+from flyff_browser.stats import percentile
+
+# Commands kept for the queueing percentiles
+TIMING_WINDOW = 256
+
+# Commands that only read, so a batch of them leaves the panel and session file alone
+_READ_ONLY = frozenset(('list_tabs', 'press'))
+
+
+class ControlServer(QObject):
+    """Local HTTP API for scripting every client, on 127.0.0.1 only.
+
+    An asyncio server on its own thread speaks HTTP/1.1 with keep-alive:
+
+    - ``GET /tabs`` lists every tab with its keys, sequences, watches and stats.
+    - ``POST /commands`` runs one JSON command or a list of them, e.g.
+      ``{"cmd": "start", "tab": "all"}``, and answers with one result each.
+    - ``GET /events`` streams new presses every CONTROL_EVENT_INTERVAL_MS
+      and timing stats every CONTROL_STATS_INTERVAL_MS as server-sent events.
+
+    The server thread only parses and writes; each request's commands are
+    handed to the Qt thread in one queued signal and run there back to back,
+    so a batch reconfiguring every client costs one event loop turn. Requests
+    carrying an Origin header (pages in a browser, including the game's) are
+    refused, and commands must be sent as application/json, so web pages
+    cannot drive the API.
+
+    ``sessions`` returns the sessions in tab order; ``open_tab`` and
+    ``close_tab`` add and close tabs; ``activate`` wakes a frozen page before
+    it gets presses; ``on_change`` is called once after each batch that
+    changed anything.
+    """
+
+    _received = pyqtSignal(object)
+
+    def __init__(self, sessions: Callable[[], List['TabSession']],
+                 open_tab: Callable[[str], 'TabSession'], close_tab: Callable[['TabSession'], None],
+                 activate: Callable[['TabSession'], None], on_change: Callable[[], None],
+                 port: Optional[int] = CONTROL_PORT, host: str = '127.0.0.1', parent=None):
+        super().__init__(parent)
+        self.sessions = sessions
+        self.open_tab = open_tab
+        self.close_tab = close_tab
+        self.activate = activate
+        self.on_change = on_change
+        self.host = host
+        self.port = port
+        self.commands = 0
+        self.batches = 0
+        self.events_sent = 0
+        self.dropped_subscribers = 0
+        self._queue_ms = array('d', [0.0]) * TIMING_WINDOW
+        self._seen: Dict[tuple, int] = {}  # (tab id, key id) -> presses already streamed
+        self._ticks = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self._clients: dict = {}  # StreamWriter -> handler task of every open connection, server thread
+        self._subscribers: set = set()  # The ones streaming /events
+        self._pending: set = set()  # Futures of requests waiting for the Qt thread
+        self._received.connect(self._execute)
+
+        self._event_timer = QTimer(self)
+        self._event_timer.timeout.connect(self._send_events)
+
+    def start(self):
+        """Start listening, raising OSError if the port cannot be bound."""
+        ready = threading.Event()
+        errors = []
+        self._thread = threading.Thread(target=self._run, args=(ready, errors),
+                                        name='control-server', daemon=True)
+        self._thread.start()
+        ready.wait()
+        if errors:
+            self._thread.join()
+            self._thread = None
+            raise errors[0]
+        self._event_timer.start(CONTROL_EVENT_INTERVAL_MS)
+        app = QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.stop)
+
+    def stop(self):
+        """Close the server and every connection, and wait for its thread to finish."""
+        self._event_timer.stop()
+        if self._thread is None:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._stopping.set)
+        except RuntimeError:
+            pass  # Loop already closed
+        # Daemon thread: if it does not finish in time the app still exits
+        self._thread.join(CONTROL_STOP_TIMEOUT_MS / 1000)
+        self._thread = None
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def summary(self) -> dict:
+        """Command counts and how long commands waited for the Qt thread."""
+        queued = sorted(self._queue_ms[:min(self.commands, TIMING_WINDOW)])
+        return {
+            'port': self.port,
+            'commands': self.commands,
+            'batches': self.batches,
+            'subscribers': self.subscribers,
+            'events_sent': self.events_sent,
+            'dropped_subscribers': self.dropped_subscribers,
+            'queue_ms_p50': percentile(queued, 0.50, 2),
+            'queue_ms_p95': percentile(queued, 0.95, 2),
+        }
+
+    # Server thread
+
+    def _run(self, ready: threading.Event, errors: list):
+        try:
+            asyncio.run(self._serve(ready))
+        except OSError as error:
+            errors.append(error)
+            ready.set()
+
+    async def _serve(self, ready: threading.Event):
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        server = await asyncio.start_server(self._handle_client, self.host, self.port or 0)
+        self.port = server.sockets[0].getsockname()[1]
+        ready.set()
+        async with server:
+            await self._stopping.wait()
+            # Leaving the block waits for every connection to close (Python 3.12.1+), so
+            # keep-alive clients and event subscribers are cut off first
+            server.close()
+            if hasattr(server, 'close_clients'):
+                server.close_clients()
+            handlers = list(self._clients.values())
+            # The Qt thread may no longer answer requests still waiting for it
+            for future in self._pending:
+                if not future.done():
+                    future.set_exception(ConnectionError("Control server stopped"))
+            for writer in list(self._clients):
+                writer.transport.abort()
+            await asyncio.gather(*handlers, return_exceptions=True)
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._clients[writer] = asyncio.current_task()
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path, version = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                if length > CONTROL_MAX_BODY_BYTES:
+                    await _respond(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                                   {'error': 'Request body too large'}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length)
+                keep_alive = (version == 'HTTP/1.1'
+                              and headers.get('connection', '').lower() != 'close')
+
+                if 'origin' in headers:
+                    status, response = HTTPStatus.FORBIDDEN, {'error': 'Cross-origin requests are refused'}
+                elif method == 'GET' and path == '/events':
+                    await self._stream_events(reader, writer)
+                    break
+                elif method == 'GET' and path == '/tabs':
+                    results = await self._call([{'cmd': 'list_tabs', 'tab': 'all'}])
+                    status, response = HTTPStatus.OK, results[0]
+                elif method == 'POST' and path == '/commands':
+                    status, response = await self._handle_commands(headers, body)
+                else:
+                    status, response = HTTPStatus.NOT_FOUND, {'error': f'No route for {method} {path}'}
+                await _respond(writer, status, response, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass  # Client went away or sent something that is not HTTP
+        finally:
+            self._clients.pop(writer, None)
+            writer.close()
+
+    async def _handle_commands(self, headers: dict, body: bytes):
+        if headers.get('content-type', '').split(';')[0].strip() != 'application/json':
+            return HTTPStatus.UNSUPPORTED_MEDIA_TYPE, {'error': 'Commands must be application/json'}
+        try:
+            commands = json.loads(body)
+        except ValueError as error:
+            return HTTPStatus.BAD_REQUEST, {'error': f'Invalid JSON: {error}'}
+        single = isinstance(commands, dict)
+        if single:
+            commands = [commands]
+        if not isinstance(commands, list) or not all(isinstance(c, dict) for c in commands):
+            return HTTPStatus.BAD_REQUEST, {'error': 'Expected a command object or a list of them'}
+        results = await self._call(commands)
+        return HTTPStatus.OK, results[0] if single else {'results': results}
+
+    async def _call(self, commands: List[dict]) -> List[dict]:
+        future = self._loop.create_future()
+        self._pending.add(future)
+        self._received.emit((commands, future, now_ms()))
+        try:
+            return await future
+        finally:
+            self._pending.discard(future)
+
+    async def _stream_events(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n'
+                     b'Cache-Control: no-store\r\nConnection: close\r\n\r\n')
+        self._subscribers.add(writer)
+        try:
+            # Subscribers only listen; reading returns when they disconnect
+            while await reader.read(1024):
+                pass
+        finally:
+            self._subscribers.discard(writer)
+
+    def _publish(self, payload: bytes):
+        for writer in list(self._subscribers):
+            if writer.transport.get_write_buffer_size() > CONTROL_MAX_BACKLOG_BYTES:
+                self._subscribers.discard(writer)
+                self.dropped_subscribers += 1
+                writer.close()
+            else:
+                writer.write(payload)
+
+    # Qt thread
+
+    def _execute(self, request):
+        commands, future, received_at = request
+        started = now_ms()
+        self.batches += 1
+        results: List[dict] = []
+        changed = False
+        for command in commands:
+            self._queue_ms[self.commands % TIMING_WINDOW] = started - received_at
+            self.commands += 1
+            name = command.get('cmd')
+            handler = getattr(self, f'_cmd_{name}', None) if isinstance(name, str) else None
+            if handler is None:
+                results.append({'ok': False, 'error': f"Unknown command: {name}"})
+                continue
+            # A command failing on its second tab may have changed the first
+            changed = changed or name not in _READ_ONLY
+            try:
+                results.append(handler(command))
+            except (KeyError, TypeError, ValueError) as error:
+                results.append({'ok': False, 'error': str(error)})
+            except Exception as error:
+                # Any other failure answers this command too; the rest of the batch still runs
+                results.append({'ok': False, 'error': f'{type(error).__name__}: {error}'})
+        try:
+            if changed:
+                self.on_change()
+        finally:
+            self._answer(future, results)
+
+    def _answer(self, future: asyncio.Future, results: List[dict]):
+        # Presses answer once every page confirmed its keydown, or after the broadcast timeout
+        waiting = [result['_waiting'] for result in results if '_waiting' in result]
+        if not any(waiting):
+            self._resolve(future, results)
+            return
+
+        def confirmed():
+            if not any(waiting):
+                self._resolve(future, results)
+
+        for result in results:
+            if '_waiting' in result:
+                result['_confirmed'] = confirmed
+        QTimer.singleShot(BROADCAST_TIMEOUT_MS, lambda: self._resolve(future, results))
+
+    def _resolve(self, future: asyncio.Future, results: List[dict]):
+        # The server thread serializes a copy; late keydowns may still change the originals
+        answer = [{name: dict(value) if isinstance(value, dict) else value
+                   for name, value in result.items() if not name.startswith('_')}
+                  for result in results]
+
+        def set_result():
+            if not future.done():  # Already answered, or the client went away
+                future.set_result(answer)
+
+        try:
+            self._loop.call_soon_threadsafe(set_result)
+        except RuntimeError:
+            pass  # Server stopped in the meantime
+
+    def _send_events(self):
+        if not self._subscribers:
+            self._seen.clear()
+            return
+        self._ticks += 1
+        presses = self._new_presses()
+        if presses:
+            self._emit('presses', {'at': time.time(), 'presses': presses})
+        if self._ticks % max(1, CONTROL_STATS_INTERVAL_MS // CONTROL_EVENT_INTERVAL_MS) == 0:
+            self._emit('stats', {'at': time.time(),
+                                 'tabs': [_tab_stats(session) for session in self.sessions()]})
+
+    def _emit(self, event: str, data: dict):
+        payload = f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+        self.events_sent += 1
+        try:
+            self._loop.call_soon_threadsafe(self._publish, payload)
+        except RuntimeError:
+            pass
+
+    def _new_presses(self) -> list:
+        """[tab id, key id, key, lag ms] for every press since the last call.
+
+        Clients in worker processes only report counts, so their presses
+        come without a lag.
+        """
+        presses = []
+        seen = {}
+        for session in self.sessions():
+            for key_id, config in session.key_configs.items():
+                if session.is_remote:
+                    count = (session.key_summary(key_id) or {}).get('count', 0)
+                    stats = None
+                else:
+                    stats = session.simulators[key_id].stats
+                    count = stats.count
+                first = self._seen.get((session.id, key_id), count)
+                seen[(session.id, key_id)] = count
+                if stats is None:
+                    presses.extend([session.id, key_id, config['key'], None]
+                                   for _ in range(max(0, count - first)))
+                    continue
+                for seq in range(max(first, count - stats.capacity), count):
+                    slot = seq % stats.capacity
+                    presses.append([session.id, key_id, config['key'],
+                                    round(stats.fired[slot] - stats.scheduled[slot], 1)])
+        self._seen = seen
+        return presses
+
+    def _targets(self, command: dict) -> list:
+        tab = command.get('tab')
+        sessions = self.sessions()
+        if tab == 'all':
+            return sessions
+        if tab is None:
+            raise ValueError("Missing 'tab': a tab id, a list of them or 'all'")
+        by_id = {session.id: session for session in sessions}
+        targets = []
+        for tab_id in tab if isinstance(tab, list) else [tab]:
+            if tab_id not in by_id:
+                raise ValueError(f"Unknown tab: {tab_id}")
+            targets.append(by_id[tab_id])
+        return targets
+
+    def _cmd_list_tabs(self, command: dict) -> dict:
+        return {'ok': True, 'tabs': [_tab_info(session) for session in self._targets(command)]}
+
+    def _cmd_open_tab(self, command: dict) -> dict:
+        """Open a tab for ``account``, set up with ``state`` if given (see configure)."""
+        state = command.get('state') or {}
+        parse_session_state(state, strict=True)
+        session = self.open_tab(command.get('account') or DEFAULT_ACCOUNT)
+        apply_session_state(session, state)
+        return {'ok': True, 'tab': session.id}
+
+    def _cmd_close_tab(self, command: dict) -> dict:
+        targets = self._targets(command)
+        if len(targets) >= len(self.sessions()):
+            raise ValueError("Cannot close every tab")
+        for session in targets:
+            self.close_tab(session)
+        return {'ok': True}
+
+    def _cmd_add_key(self, command: dict) -> dict:
+        """Add a key to every target tab; ``active`` starts it right away."""
+        key, min_interval, max_interval, distribution = _key_settings(command)
+        key_ids = {}
+        for session in self._targets(command):
+            key_id = session.add_key(key, min_interval, max_interval, distribution)
+            if command.get('active'):
+                self.activate(session)
+                session.set_key_active(key_id, True)
+            key_ids[session.id] = key_id
+        return {'ok': True, 'key_ids': key_ids}
+
+    def _cmd_update_key(self, command: dict) -> dict:
+        """Change a key's settings; a running key restarts with them."""
+        for session in self._targets(command):
+            key_id = _key_id(session, command)
+            settings = _key_settings(dict(session.key_configs[key_id], **command))
+            session.update_key(key_id, *settings)
+            if session.key_configs[key_id]['active']:
+                session.set_key_active(key_id, True)
+        return {'ok': True}
+
+    def _cmd_remove_key(self, command: dict) -> dict:
+        for session in self._targets(command):
+            session.remove_key(_key_id(session, command))
+        return {'ok': True}
+
+    def _cmd_start(self, command: dict) -> dict:
+        """Start the keys listed in ``key_ids``, or every key of the target tabs."""
+        return self._set_keys_active(command, True)
+
+    def _cmd_stop(self, command: dict) -> dict:
+        return self._set_keys_active(command, False)
+
+    def _set_keys_active(self, command: dict, active: bool) -> dict:
+        for session in self._targets(command):
+            key_ids = command.get('key_ids') or list(session.key_configs)
+            for key_id in key_ids:
+                if key_id not in session.key_configs:
+                    raise ValueError(f"Unknown key {key_id} on tab {session.id}")
+            if active and key_ids:
+                self.activate(session)
+            for key_id in key_ids:
+                session.set_key_active(key_id, active)
+        return {'ok': True}
+
+    def _cmd_configure(self, command: dict) -> dict:
+        """Replace the keys, sequences and watches of the target tabs with ``state``,
+        in the form list_tabs returns (and the session file stores)."""
+        state = command.get('state')
+        if not isinstance(state, dict):
+            raise ValueError("Missing 'state'")
+        keys, _, _ = parse_session_state(state, strict=True)
+        for session in self._targets(command):
+            for key_id in list(session.key_configs):
+                session.remove_key(key_id)
+            for sequence_id in list(session.sequence_configs):
+                session.remove_sequence(sequence_id)
+            for watch_id in list(session.watch_configs):
+                session.remove_watch(watch_id)
+            if any(active for *_, active in keys):
+                self.activate(session)
+            apply_session_state(session, state)
+        return {'ok': True}
+
+    def _cmd_press(self, command: dict) -> dict:
+        """Press a key once on every loaded target tab; answers with each keydown's epoch ms
+        (null where the page had no dispatcher or did not answer in time)."""
+        key = command.get('key')
+        if key not in KEY_TABLE:
+            raise ValueError(f"Invalid key: {key}")
+        targets = [session for session in self._targets(command) if session.is_loaded]
+        result = {'ok': True, 'keydown_ms': {session.id: None for session in targets},
+                  '_waiting': {session.id for session in targets}}
+
+        def pressed(at: Optional[float], session_id: int):
+            result['keydown_ms'][session_id] = at
+            result['_waiting'].discard(session_id)
+            if '_confirmed' in result:  # Set by _execute once the whole batch has run
+                result['_confirmed']()
+
+        for session in targets:
+            self.activate(session)
+            session.press_once(KEY_TABLE[key].index,
+                               lambda at, session_id=session.id: pressed(at, session_id))
+        return result
+
+
+async def _respond(writer: asyncio.StreamWriter, status: HTTPStatus, body: dict,
+                   keep_alive: bool = True):
+    data = json.dumps(body, separators=(',', ':')).encode()
+    connection = '' if keep_alive else 'Connection: close\r\n'
+    head = (f'HTTP/1.1 {status.value} {status.phrase}\r\n'
+            f'Content-Type: application/json\r\nContent-Length: {len(data)}\r\n{connection}\r\n')
+    writer.write(head.encode() + data)
+    await writer.drain()
+
+
+def _key_settings(command: dict) -> tuple:
+    key = command.get('key')
+    if key not in KEY_TABLE:
+        raise ValueError(f"Invalid key: {key}")
+    distribution = command.get('distribution', 'uniform')
+    if distribution not in DISTRIBUTIONS:
+        raise ValueError(f"Invalid distribution: {distribution}")
+    min_interval = float(command['min_interval'])
+    max_interval = float(command['max_interval'])
+    if not 0 < min_interval <= max_interval:
+        raise ValueError(f"Invalid interval: {min_interval} to {max_interval} s")
+    return key, min_interval, max_interval, distribution
+
+
+def _key_id(session, command: dict) -> int:
+    key_id = command.get('key_id')
+    if key_id not in session.key_configs:
+        raise ValueError(f"Unknown key {key_id} on tab {session.id}")
+    return key_id
+
+
+def _tab_info(session) -> dict:
+    """A tab as list_tabs returns it: ids and settings of everything it runs, with stats,
+    plus ``state`` in the form the configure command takes."""
+    return {
+        'tab': session.id,
+        'account': session.account,
+        'loaded': session.is_loaded,
+        'remote': session.is_remote,
+        'broadcast': session.broadcast_target,
+        'keys': [dict(config, key_id=key_id, stats=session.key_summary(key_id))
+                 for key_id, config in session.key_configs.items()],
+        'sequences': [dict(config, sequence_id=sequence_id,
+                           stats=session.sequence_summary(sequence_id))
+                      for sequence_id, config in session.sequence_configs.items()],
+        'watches': [dict(config, watch_id=watch_id, stats=session.watch_summary(watch_id))
+                    for watch_id, config in session.watch_configs.items()],
+        'state': session_state(session),
+    }
+
+
+def _tab_stats(session) -> dict:
+    return {
+        'tab': session.id,
+        'keys': {key_id: session.key_summary(key_id) for key_id in session.key_configs},
+        'sequences': {sequence_id: session.sequence_summary(sequence_id)
+                      for sequence_id in session.sequence_configs},
+        'watches': {watch_id: session.watch_summary(watch_id)
+                    for watch_id in session.watch_configs},
+    }
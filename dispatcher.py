@@ -0,0 +1,206 @@
+import json
+from typing import List, Sequence, Tuple, Union
+
+from PyQt5.QtWebEngineWidgets import QWebEnginePage, QWebEngineScript
+
+from flyff_browser.config import AVAILABLE_KEYS, KEY_TABLE, PRESS_HOLD_MS
+
+DISPATCHER_SCRIPT_NAME = 'flyff-ftool-dispatcher'
+
+# Installed once per document. Keys are addressed by their index in
+# AVAILABLE_KEYS so a press only has to send a short call such as __ft.press(3).
+#
+# Sequences run entirely in the page: each is a list of [key index, delay ms]
+# steps whose due times are fixed offsets from the start of the cycle, so a
+# late timer delays one step without pushing back the ones after it. A cycle
+# that is still over by a whole period after a stall is skipped rather than
+# fired back to back.
+#
+# The recorder listens for real key input only: events the dispatcher sends
+# itself are not trusted, so running keys never end up in a recording. A
+# press is kept once its key comes up, as key index, keydown epoch ms and
+# hold ms, in one flat list.
+_DISPATCHER_JS = """
+(function(){
+if(window.__ft){return;}
+var KEYS=%(keys)s;
+var MODIFIERS=[['Shift','ShiftLeft',16],['Control','ControlLeft',17],['Alt','AltLeft',18]];
+function template(key,code,keyCode,flags){
+return {key:key,code:code,keyCode:keyCode,which:keyCode,shiftKey:!!(flags&1),ctrlKey:!!(flags&2),
+altKey:!!(flags&4),bubbles:true,cancelable:true};
+}
+var modifierTemplates=MODIFIERS.map(function(m,bit){return template(m[0],m[1],m[2],1<<bit);});
+var templates=KEYS.map(function(k){return template(k[0],k[1],k[2],k[3]);});
+var canvas=null;
+function target(){
+if(!canvas||!canvas.isConnected){canvas=document.querySelector('canvas');}
+return canvas;
+}
+function dispatch(type,init){
+var t=target();
+var event=new KeyboardEvent(type,init);
+if(t){if(document.activeElement!==t){t.focus();}t.dispatchEvent(event);}
+else{document.dispatchEvent(event);}
+}
+function send(type,i){
+var flags=KEYS[i][3],bit;
+if(!flags){dispatch(type,templates[i]);return;}
+// Modifiers go down before the key and come up after it
+if(type==='keydown'){
+for(bit=0;bit<3;bit++){if(flags&(1<<bit)){dispatch(type,modifierTemplates[bit]);}}
+dispatch(type,templates[i]);
+}else{
+dispatch(type,templates[i]);
+for(bit=2;bit>=0;bit--){if(flags&(1<<bit)){dispatch(type,modifierTemplates[bit]);}}
+}
+}
+var sequences={};
+var keyIndex={},recording=null;
+KEYS.forEach(function(k,i){keyIndex[k[1]+'/'+k[3]]=i;});
+function recordDown(e){
+if(!recording||!e.isTrusted||e.repeat){return;}
+var i=keyIndex[e.code+'/'+((e.shiftKey?1:0)|(e.ctrlKey?2:0)|(e.altKey?4:0))];
+if(i!==undefined){recording.down[e.code]=[i,performance.timeOrigin+e.timeStamp];}
+}
+function recordUp(e){
+if(!recording||!e.isTrusted){return;}
+var down=recording.down[e.code];
+if(!down){return;}
+delete recording.down[e.code];
+recording.presses.push(down[0],down[1],performance.timeOrigin+e.timeStamp-down[1]);
+}
+window.addEventListener('keydown',recordDown,true);
+window.addEventListener('keyup',recordUp,true);
+function scheduleStep(s){
+var due=s.cycleStart+s.offsets[s.next];
+s.timer=setTimeout(function(){runStep(s);},Math.max(0,due-performance.now()));
+}
+function runStep(s){
+var now=performance.now(),late=Math.max(0,now-(s.cycleStart+s.offsets[s.next]));
+if(late>s.lateMax){s.lateMax=late;}
+s.lateSum+=late;s.done++;
+window.__ft.press(s.steps[s.next][0]);
+if(++s.next<s.steps.length){scheduleStep(s);return;}
+s.next=0;s.runs++;
+if(!s.period){s.timer=null;return;}
+s.cycleStart+=s.period;
+var behind=now-s.cycleStart;
+if(behind>s.period){var n=Math.floor(behind/s.period);s.cycleStart+=n*s.period;s.skipped+=n;}
+scheduleStep(s);
+}
+window.__ft={
+holdMs:%(hold_ms)d,
+press:function(i,holdMs){
+send('keydown',i);
+setTimeout(function(){send('keyup',i);},holdMs===undefined?window.__ft.holdMs:holdMs);
+},
+pressAt:function(i,holdMs){
+window.__ft.press(i,holdMs);
+// Epoch ms of the keydown, comparable across renderer processes
+return performance.timeOrigin+performance.now();
+},
+batch:function(ids,gapMs,holdMs){
+// holdMs is one hold for every key, or one per key
+var ft=window.__ft,holds=Array.isArray(holdMs)?holdMs:null;
+if(!gapMs){for(var n=0;n<ids.length;n++){ft.press(ids[n],holds?holds[n]:holdMs);}return;}
+ids.forEach(function(i,n){setTimeout(function(){ft.press(i,holds?holds[n]:holdMs);},n*gapMs);});
+},
+record:function(on){
+recording=on?{down:{},presses:[]}:null;
+},
+recorded:function(){
+// Presses completed since the last call
+if(!recording){return null;}
+var presses=recording.presses;recording.presses=[];
+return presses;
+},
+sequence:function(id,steps,repeatMs){
+window.__ft.stopSequence(id);
+var at=0,offsets=steps.map(function(step){return at+=step[1];});
+var s={steps:steps,offsets:offsets,period:repeatMs?Math.max(repeatMs,at):0,
+cycleStart:performance.now(),next:0,runs:0,done:0,lateMax:0,lateSum:0,skipped:0,timer:null};
+sequences[id]=s;
+scheduleStep(s);
+},
+stopSequence:function(id){
+var s=sequences[id];
+if(s){clearTimeout(s.timer);delete sequences[id];}
+},
+sequenceStats:function(){
+var out={};
+for(var id in sequences){
+var s=sequences[id];
+out[id]=[s.runs,s.done,s.lateMax,s.done?s.lateSum/s.done:0,s.skipped,s.timer!==null];
+}
+return out;
+}
+};
+})();
+"""
+
+def dispatcher_source() -> str:
+    """Build the dispatcher script with the key table baked in."""
+    keys = [[k.key, k.code, k.key_code, k.shift | k.ctrl << 1 | k.alt << 2]
+            for k in AVAILABLE_KEYS]
+    return _DISPATCHER_JS % {
+        'keys': json.dumps(keys, separators=(',', ':')),
+        'hold_ms': PRESS_HOLD_MS,
+    }
+
+
+def install_dispatcher(page: QWebEnginePage):
+    """Inject the dispatcher into every document the page creates."""
+    scripts = page.scripts()
+    if scripts.findScript(DISPATCHER_SCRIPT_NAME).name():
+        return
+
+    script = QWebEngineScript()
+    script.setName(DISPATCHER_SCRIPT_NAME)
+    script.setSourceCode(dispatcher_source())
+    script.setInjectionPoint(QWebEngineScript.DocumentCreation)
+    script.setWorldId(QWebEngineScript.MainWorld)
+    script.setRunsOnSubFrames(False)
+    scripts.insert(script)
+
+
+def press_script(key: str) -> str:
+    """Return the precomputed call that presses the given key through the dispatcher."""
+    return KEY_TABLE[key].press_js
+
+
+def sequence_script(sequence_id: int, steps: Sequence[Tuple[int, int]], repeat_ms: int) -> str:
+    """Return a call that starts, or replaces, a sequence of (key index, delay ms) steps."""
+    steps_js = ','.join(f'[{index},{delay_ms}]' for index, delay_ms in steps)
+    return f'window.__ft&&__ft.sequence({sequence_id},[{steps_js}],{repeat_ms})'
+
+
+def stop_sequence_script(sequence_id: int) -> str:
+    return f'window.__ft&&__ft.stopSequence({sequence_id})'
+
+
+# Evaluates to {sequence id: [runs, steps, max late ms, mean late ms, skipped cycles, running]}
+SEQUENCE_STATS_SCRIPT = 'window.__ft?__ft.sequenceStats():null'
+
+
+def press_at_script(key_index: int) -> str:
+    """Return a call that presses a key and evaluates to the epoch ms of its keydown."""
+    return f'window.__ft?__ft.pressAt({key_index}):null'
+
+
+def batch_script(indices: List[int], gap_ms: int, hold_ms: Union[int, List[int]]) -> str:
+    """Return a call that presses several keys, keydowns spaced by gap_ms; hold_ms is
+    one hold for all of them or a list with one per key."""
+    ids = ','.join(map(str, indices))
+    if isinstance(hold_ms, list):
+        hold_ms = '[' + ','.join(map(str, hold_ms)) + ']'
+    return f'window.__ft&&__ft.batch([{ids}],{gap_ms},{hold_ms})'
+
+
+def record_script(on: bool) -> str:
+    """Return a call that starts (discarding anything recorded) or stops the key recorder."""
+    return f'window.__ft&&__ft.record({str(on).lower()})'
+
+
+# Evaluates to the flat [key index, keydown epoch ms, hold ms, ...] list of the presses
+# recorded since it last ran, or null when not recording
+RECORDED_SCRIPT = 'window.__ft?__ft.recorded():null'
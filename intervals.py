@@ -0,0 +1,131 @@
+import json
+import math
+import random
+from array import array
+from typing import Iterable, Iterator, List, Optional
+
+from flyff_browser.config import INTERVAL_BATCH_SIZE
+
+# 'uniform'   every interval between min and max equally likely
+# 'normal'    bell curve centred between min and max, cut off at both
+# 'lognormal' most intervals near the short end with a long tail towards max
+# 'poisson'   presses as a Poisson process: exponential gaps after min, cut off at max
+DISTRIBUTIONS = ('uniform', 'normal', 'lognormal', 'poisson')
+
+
+class IntervalGenerator:
+    """Press intervals in whole milliseconds, drawn from a distribution between min and max.
+
+    Intervals are generated batch_size at a time into an array buffer, so a
+    press only costs an index step. With a seed the stream is reproducible;
+    draws outside [min, max] are redrawn, which keeps each distribution's
+    shape inside the bounds. With record=True every interval handed out is
+    also kept in ``history`` for save_intervals().
+    """
+
+    __slots__ = ('distribution', 'min_ms', 'max_ms', 'batch_size', 'history',
+                 '_random', '_batch', '_buffer', '_pos')
+
+    def __init__(self, distribution: str = 'uniform', min_ms: int = 3000, max_ms: int = 6000,
+                 seed: Optional[int] = None, batch_size: int = INTERVAL_BATCH_SIZE,
+                 record: bool = False):
+        if distribution not in DISTRIBUTIONS:
+            raise ValueError(f"Invalid distribution: {distribution}")
+        if min_ms > max_ms:
+            min_ms, max_ms = max_ms, min_ms
+        self.distribution = distribution
+        self.min_ms = max(1, int(min_ms))
+        self.max_ms = max(self.min_ms, int(max_ms))
+        self.batch_size = batch_size
+        self.history = array('l') if record else None
+        self._random = random.Random(seed)
+        self._batch = getattr(self, f'_batch_{distribution}')
+        self._buffer = array('l')
+        self._pos = 0
+
+    def __iter__(self) -> Iterator[int]:
+        return self
+
+    def __next__(self) -> int:
+        if self._pos >= len(self._buffer):
+            self._buffer = array('l', self._batch(self.batch_size))
+            self._pos = 0
+        value = self._buffer[self._pos]
+        self._pos += 1
+        if self.history is not None:
+            self.history.append(value)
+        return value
+
+    def _batch_uniform(self, n: int) -> List[int]:
+        lo, span, rand = self.min_ms, self.max_ms - self.min_ms + 1, self._random.random
+        return [lo + int(rand() * span) for _ in range(n)]
+
+    def _batch_normal(self, n: int) -> List[int]:
+        # Bounds at three standard deviations: about 0.3% of draws are redrawn
+        lo, hi = self.min_ms, self.max_ms
+        mu, sigma = (lo + hi) / 2, (hi - lo) / 6
+        return self._truncated(n, lambda gauss=self._random.gauss: gauss(mu, sigma))
+
+    def _batch_lognormal(self, n: int) -> List[int]:
+        # Median at a third of the range above min
+        lo, span = self.min_ms, self.max_ms - self.min_ms
+        mu, sigma = math.log(max(span, 1) / 3), 0.6
+        return self._truncated(n, lambda lognorm=self._random.lognormvariate: lo + lognorm(mu, sigma))
+
+    def _batch_poisson(self, n: int) -> List[int]:
+        # Mean gap after min is half the range
+        lo, span = self.min_ms, self.max_ms - self.min_ms
+        rate = 2 / max(span, 1)
+        return self._truncated(n, lambda expo=self._random.expovariate: lo + expo(rate))
+
+    def _truncated(self, n: int, draw) -> List[int]:
+        lo, hi = self.min_ms, self.max_ms
+        if lo == hi:
+            return [lo] * n
+        out = []
+        append = out.append
+        while len(out) < n:
+            value = round(draw())
+            if lo <= value <= hi:
+                append(value)
+        return out
+
+
+class ReplayIntervals:
+    """Feeds a recorded interval stream back in order, e.g. for regression benchmarks.
+
+    Loops over the recording by default; otherwise iteration ends with it.
+    """
+
+    __slots__ = ('_buffer', '_pos', 'loop')
+
+    def __init__(self, intervals: Iterable[int], loop: bool = True):
+        self._buffer = array('l', intervals)
+        if not self._buffer:
+            raise ValueError("Cannot replay an empty interval stream")
+        self._pos = 0
+        self.loop = loop
+
+    def __iter__(self) -> Iterator[int]:
+        return self
+
+    def __next__(self) -> int:
+        if self._pos >= len(self._buffer):
+            if not self.loop:
+                raise StopIteration
+            self._pos = 0
+        value = self._buffer[self._pos]
+        self._pos += 1
+        return value
+
+
+def save_intervals(path: str, streams: List[Iterable[int]]):
+    """Write recorded interval streams (one per key) as JSON."""
+    with open(path, 'w') as f:
+        json.dump({'intervals_ms': [list(stream) for stream in streams]}, f)
+
+
+def load_intervals(path: str) -> List[List[int]]:
+    """Read interval streams written by save_intervals()."""
+    with open(path) as f:
+        return json.load(f)['intervals_ms']
@@ -0,0 +1,64 @@
+import json
+import logging
+
+from PyQt5.QtCore import QObject, pyqtSignal
+from PyQt5.QtNetwork import QLocalSocket
+
+log = logging.getLogger(__name__)
+
+
+class JsonChannel(QObject):
+    """Newline-delimited JSON messages over a QLocalSocket.
+
+    Used between the control window and its worker processes. Everything
+    runs on the Qt event loop, so neither side needs extra threads.
+    """
+
+    message_received = pyqtSignal(dict)
+    disconnected = pyqtSignal()
+
+    def __init__(self, socket: QLocalSocket, parent=None):
+        super().__init__(parent)
+        self.socket = socket
+        self._buffer = b''
+        socket.readyRead.connect(self._read)
+        socket.disconnected.connect(self.disconnected)
+
+    @classmethod
+    def connect_to(cls, server_name: str, timeout_ms: int = 5000, parent=None) -> 'JsonChannel':
+        """Connect to a local server, raising ConnectionError if it is not reachable."""
+        socket = QLocalSocket()
+        socket.connectToServer(server_name)
+        if not socket.waitForConnected(timeout_ms):
+            raise ConnectionError(f"Cannot connect to {server_name}: {socket.errorString()}")
+        return cls(socket, parent)
+
+    def send(self, message: dict):
+        if self.socket.state() != QLocalSocket.ConnectedState:
+            return
+        self.socket.write(json.dumps(message, separators=(',', ':')).encode() + b'\n')
+
+    def flush(self, timeout_ms: int = 1000):
+        """Block until pending messages are written, e.g. before the process exits."""
+        if self.socket.bytesToWrite():
+            self.socket.waitForBytesWritten(timeout_ms)
+
+    def close(self):
+        self.socket.disconnectFromServer()
+
+    def _read(self):
+        self._buffer += bytes(self.socket.readAll())
+        *lines, self._buffer = self._buffer.split(b'\n')
+        # Each line stands alone: a bad one must not hold up the messages behind it
+        for line in lines:
+            if not line:
+                continue
+            try:
+                message = json.loads(line)
+            except ValueError:
+                log.warning("Dropped malformed message: %.200r", line)
+                continue
+            if not isinstance(message, dict):
+                log.warning("Dropped non-object message: %.200r", line)
+                continue
+            self.message_received.emit(message)
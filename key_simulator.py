@@ -1,58 +1,94 @@
-import random
-from typing import Optional, Callable
-from PyQt5.QtCore import QTimer
+from typing import Callable, Iterator, Optional
 from PyQt5.QtWebEngineWidgets import QWebEngineView
 
+from flyff_browser.batcher import PressBatcher, shared_batcher
+from flyff_browser.config import PRESS_LATE_POLICY
+from flyff_browser.intervals import IntervalGenerator
+from flyff_browser.scheduler import PressScheduler, now_ms, shared_scheduler
+from flyff_browser.stats import PressStats
+
+LATE_POLICIES = ('skip', 'catch_up', 'restart')
+
 class KeyPressSimulator:
-    def __init__(self, web_view: QWebEngineView):
+    """Presses one key at random intervals through the shared scheduler and batcher.
+
+    Intervals come from an IntervalGenerator built from the key's config, or
+    from any iterator of milliseconds passed to start(), e.g. a
+    ReplayIntervals recording. The simulator stops when the iterator ends.
+
+    Each press is planned from the previous press's deadline rather than
+    from when it actually fired, so event loop lag does not add up over
+    time. Deadlines that passed entirely during a stall are handled by the
+    late policy (see PRESS_LATE_POLICY).
+    """
+
+    def __init__(self, web_view: QWebEngineView, scheduler: Optional[PressScheduler] = None,
+                 batcher: Optional[PressBatcher] = None, late_policy: str = PRESS_LATE_POLICY):
+        if late_policy not in LATE_POLICIES:
+            raise ValueError(f"Invalid late policy: {late_policy}")
         self.web_view = web_view
-        self.timer = QTimer()
+        self.scheduler = scheduler or shared_scheduler()
+        self.batcher = batcher or shared_batcher()
+        self.late_policy = late_policy
+        self.stats = PressStats()
         self.is_active = False
         self.config: Optional['KeyPressConfig'] = None
+        self._callback: Optional[Callable[[], None]] = None
+        self._deadline: Optional[float] = None
+        self.intervals: Optional[Iterator[int]] = None
 
-    def start(self, config: 'KeyPressConfig', callback: Callable[[], None]):
+    def start(self, config: 'KeyPressConfig', callback: Optional[Callable[[], None]] = None,
+              intervals: Optional[Iterator[int]] = None):
         self.config = config
+        self._callback = callback
+        if intervals is None:
+            intervals = IntervalGenerator(config.distribution, int(config.min_interval * 1000),
+                                          int(config.max_interval * 1000), seed=config.seed)
+        self.intervals = intervals
         self.is_active = True
-        self._schedule_next_press(callback)
+        self._deadline = None
+        self._schedule_next_press()
 
     def stop(self):
         self.is_active = False
-        self.timer.stop()
+        self.scheduler.cancel(self)
+
+    def fire(self, deadline: float):
+        """Called by the scheduler when this key's press, planned for deadline, is due."""
+        self._simulate_press(deadline)
+        self._schedule_next_press()
 
-    def _schedule_next_press(self, callback: Callable[[], None]):
+    def _schedule_next_press(self):
         if not self.is_active or not self.config:
             return
 
-        min_ms = self.config.min_interval * 1000
-        max_ms = self.config.max_interval * 1000
-        if min_ms > max_ms:
-            min_ms, max_ms = max_ms, min_ms
+        now = now_ms()
+        try:
+            if self._deadline is None or self.late_policy == 'restart':
+                deadline = now + next(self.intervals)
+            else:
+                deadline = self._deadline + next(self.intervals)
+                if self.late_policy == 'skip':
+                    while deadline < now:
+                        self.stats.dropped += 1
+                        deadline += next(self.intervals)
+                # 'catch_up' keeps an overdue deadline, which fires right away
+        except StopIteration:
+            self.is_active = False  # A non-looping replay ran out
+            return
 
-        new_interval = random.randint(min_ms, max_ms)
-        
-        self.timer.stop()
-        self.timer.start(new_interval)
-        self.timer.timeout.connect(lambda: self._simulate_press(callback))
+        self._deadline = deadline
+        self.scheduler.schedule_at(self, deadline)
 
-    def _simulate_press(self, callback: Callable[[], None]):
+    def _simulate_press(self, deadline: float):
         if not self.is_active or not self.config:
             return
 
-        js_code = (
-            "(function(){"
-            "const canvas=document.querySelector('canvas');"
-            f"function sendKeyEvent(type){{"
-            f"const event=new KeyboardEvent(type,{{key:'{self.config.key}',code:'{self.config.key_name}',"
-            f"keyCode:{self.config.key_code},which:{self.config.key_code},bubbles:true,cancelable:true}});"
-            "if(canvas){canvas.focus();canvas.dispatchEvent(event);console.log('Dispatched '+type+' to canvas');}"
-            "else{document.dispatchEvent(event);console.log('Dispatched '+type+' to document');}"
-            "}"
-            "sendKeyEvent('keydown');"
-            "setTimeout(function(){sendKeyEvent('keyup');},100);"
-            "})();"
-        )
-        self.web_view.page().runJavaScript(js_code, self._handle_js_result)
-        callback()
-
-    def _handle_js_result(self, result):
-        pass 
\ No newline at end of file
+        seq = self.stats.record_fire(deadline, now_ms())
+        self.batcher.submit(self.web_view, self.config.key_def.index,
+                            lambda result: self._handle_js_result(seq, result))
+        if self._callback:
+            self._callback()
+
+    def _handle_js_result(self, seq: int, result):
+        self.stats.record_result(seq, now_ms())
@@ -0,0 +1,152 @@
+import time
+from typing import Callable, Dict, List, Optional
+
+from PyQt5.QtCore import QObject, QTimer
+from PyQt5.QtWebEngineWidgets import QWebEnginePage
+
+from flyff_browser.config import (PAGE_DISCARD_AFTER_S, PAGE_FREEZE_AFTER_S,
+                                  PAGE_LIFECYCLE_CHECK_S)
+from flyff_browser.procinfo import process_usage
+
+Active = QWebEnginePage.LifecycleState.Active
+Frozen = QWebEnginePage.LifecycleState.Frozen
+Discarded = QWebEnginePage.LifecycleState.Discarded
+
+STATE_NAMES = {Active: 'active', Frozen: 'frozen', Discarded: 'discarded'}
+
+# Give Chromium time to release memory before measuring a tab again
+_MEASURE_AFTER_MS = 3000
+
+
+class _TabLifecycle:
+    __slots__ = ('last_used', 'transitions')
+
+    def __init__(self):
+        self.last_used = time.monotonic()
+        self.transitions: List[dict] = []
+
+
+class PageLifecycleManager(QObject):
+    """Freezes, then optionally discards, background tabs that sit idle.
+
+    A tab counts as used while it is the current tab or has any active
+    auto-press key, sequence or region watch; such tabs are always kept
+    Active (a frozen page stops rendering, which would blind its watches).
+    Everything else is frozen after ``freeze_after_s`` seconds and discarded after
+    ``discard_after_s`` (0 disables either step). A discarded page reloads
+    when it is shown again, which means logging back in to the game.
+
+    Memory is the RSS of each page's renderer process. Chromium may host
+    several tabs of the same site in one renderer, in which case they
+    report the same figure.
+    """
+
+    def __init__(self, sessions: Dict[int, 'TabSession'],
+                 current_session: Callable[[], Optional['TabSession']],
+                 on_report: Optional[Callable[[List[dict]], None]] = None,
+                 freeze_after_s: float = PAGE_FREEZE_AFTER_S,
+                 discard_after_s: float = PAGE_DISCARD_AFTER_S,
+                 parent=None):
+        super().__init__(parent)
+        self.sessions = sessions
+        self.current_session = current_session
+        self.on_report = on_report
+        self.freeze_after_s = freeze_after_s
+        self.discard_after_s = discard_after_s
+        self._tabs: Dict[int, _TabLifecycle] = {}
+
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self.check)
+        self._timer.start(int(PAGE_LIFECYCLE_CHECK_S * 1000))
+
+    def activate(self, session: 'TabSession'):
+        """Mark a tab as used and bring its page back to Active."""
+        if not _has_page(session):
+            return
+        self._tab(session).last_used = time.monotonic()
+        self._set_state(session, Active)
+
+    def forget(self, session: 'TabSession'):
+        self._tabs.pop(session.id, None)
+
+    def check(self):
+        """Apply the idle policy to every tab and publish a report."""
+        now = time.monotonic()
+        current = self.current_session()
+        for session in list(self.sessions.values()):
+            if not _has_page(session):
+                continue
+            tab = self._tab(session)
+            if (session is current or session.active_key_count() or session.active_sequence_count()
+                    or session.active_watch_count() or session.is_playing or session.is_recording):
+                tab.last_used = now
+                self._set_state(session, Active)
+                continue
+
+            idle = now - tab.last_used
+            if self.discard_after_s and idle >= self.discard_after_s:
+                self._set_state(session, Discarded)
+            elif self.freeze_after_s and idle >= self.freeze_after_s:
+                self._set_state(session, Frozen)
+
+        if self.on_report:
+            self.on_report(self.report())
+
+    def report(self) -> List[dict]:
+        """Current state, idle time, renderer memory and past transitions of every tab."""
+        now = time.monotonic()
+        rows = []
+        for session in self.sessions.values():
+            if not _has_page(session):
+                continue
+            tab = self._tab(session)
+            page = session.web_view.page()
+            rows.append({
+                'session_id': session.id,
+                'state': STATE_NAMES.get(page.lifecycleState(), 'unknown'),
+                'idle_s': round(now - tab.last_used, 1),
+                'active_keys': session.active_key_count(),
+                'active_sequences': session.active_sequence_count(),
+                'active_watches': session.active_watch_count(),
+                'rss_mb': _renderer_rss_mb(page),
+                'transitions': list(tab.transitions),
+            })
+        return rows
+
+    def _tab(self, session: 'TabSession') -> _TabLifecycle:
+        tab = self._tabs.get(session.id)
+        if tab is None:
+            tab = self._tabs[session.id] = _TabLifecycle()
+        return tab
+
+    def _set_state(self, session: 'TabSession', state):
+        page = session.web_view.page()
+        previous = page.lifecycleState()
+        if previous == state:
+            return
+
+        transition = {
+            'from': STATE_NAMES.get(previous, 'unknown'),
+            'to': STATE_NAMES[state],
+            'at': time.time(),
+            'rss_before_mb': _renderer_rss_mb(page),
+            'rss_after_mb': None,
+        }
+        page.setLifecycleState(state)
+        self._tab(session).transitions.append(transition)
+
+        def measure_after():
+            if session.id in self.sessions:
+                transition['rss_after_mb'] = _renderer_rss_mb(session.web_view.page())
+        QTimer.singleShot(_MEASURE_AFTER_MS, measure_after)
+
+
+def _has_page(session) -> bool:
+    # Remote clients manage their own pages; restored tabs have none until opened
+    return not session.is_remote and session.web_view is not None
+
+
+def _renderer_rss_mb(page: QWebEnginePage) -> Optional[float]:
+    pid = page.renderProcessPid()
+    usage = process_usage(pid) if pid else None
+    return round(usage['rss_bytes'] / (1024 * 1024), 1) if usage else None
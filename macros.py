@@ -0,0 +1,209 @@
+import struct
+import sys
+from array import array
+from typing import Callable, Optional, Sequence
+
+from PyQt5.QtWebEngineWidgets import QWebEngineView
+
+from flyff_browser.batcher import PressBatcher, shared_batcher
+from flyff_browser.config import AVAILABLE_KEYS, KEY_TABLE, MACRO_MAX_LATE_MS
+from flyff_browser.scheduler import PressScheduler, now_ms, shared_scheduler
+from flyff_browser.stats import PressStats
+
+# File header: magic, press count, length of the key label block
+MACRO_MAGIC = b'FTMACRO1'
+_HEADER = struct.Struct('<8sIH')
+
+# Longest hold a macro stores; longer ones are clamped
+MAX_HOLD_MS = 0xFFFF
+
+
+class Macro:
+    """Recorded key presses, kept as three parallel arrays instead of one object per press.
+
+    ``offsets`` holds each keydown in ms from the first one, ``keys`` the
+    key's index in AVAILABLE_KEYS and ``holds`` the ms until its keyup.
+    Presses are ordered by keydown.
+
+    The file format is a small header, the labels of the keys used, and
+    the three arrays as raw little-endian bytes, so tens of thousands of
+    presses load with a few frombytes() calls. Keys are stored by label,
+    so a macro still loads after the key list changes.
+    """
+
+    __slots__ = ('offsets', 'keys', 'holds')
+
+    def __init__(self, offsets: Optional[array] = None, keys: Optional[array] = None,
+                 holds: Optional[array] = None):
+        self.offsets = offsets if offsets is not None else array('I')
+        self.keys = keys if keys is not None else array('H')
+        self.holds = holds if holds is not None else array('H')
+        if not len(self.offsets) == len(self.keys) == len(self.holds):
+            raise ValueError("Macro arrays differ in length")
+
+    @classmethod
+    def from_events(cls, events: Sequence[float]) -> 'Macro':
+        """Build a macro from the page recorder's flat [key index, keydown epoch ms, hold ms, ...] list."""
+        presses = sorted(zip(events[1::3], events[0::3], events[2::3]))
+        macro = cls()
+        if presses:
+            first = presses[0][0]
+            macro.offsets.extend(round(at - first) for at, _, _ in presses)
+            macro.keys.extend(int(index) for _, index, _ in presses)
+            macro.holds.extend(min(MAX_HOLD_MS, max(0, round(hold))) for _, _, hold in presses)
+        return macro
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    @property
+    def duration_ms(self) -> int:
+        """Time from the first keydown to the last keyup."""
+        if not self.offsets:
+            return 0
+        return max(offset + hold for offset, hold in zip(self.offsets, self.holds))
+
+    def summary(self) -> dict:
+        return {
+            'presses': len(self),
+            'keys': len(set(self.keys)),
+            'duration_s': round(self.duration_ms / 1000, 1),
+        }
+
+    def to_bytes(self) -> bytes:
+        used = sorted(set(self.keys))
+        local = {index: n for n, index in enumerate(used)}
+        labels = '\n'.join(AVAILABLE_KEYS[index].label for index in used).encode()
+        offsets, keys, holds = array('I', self.offsets), array('H'), array('H', self.holds)
+        keys.extend(local[index] for index in self.keys)
+        if sys.byteorder == 'big':
+            for values in (offsets, keys, holds):
+                values.byteswap()
+        return b''.join((_HEADER.pack(MACRO_MAGIC, len(self), len(labels)), labels,
+                         offsets.tobytes(), keys.tobytes(), holds.tobytes()))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'Macro':
+        """Parse to_bytes() output; raises ValueError if it is not a macro or uses unknown keys."""
+        if len(data) < _HEADER.size:
+            raise ValueError("Not a macro file")
+        magic, count, labels_size = _HEADER.unpack_from(data)
+        start = _HEADER.size + labels_size
+        if magic != MACRO_MAGIC or len(data) != start + count * 8:
+            raise ValueError("Not a macro file")
+        labels = data[_HEADER.size:start].decode().split('\n') if labels_size else []
+        unknown = [label for label in labels if label not in KEY_TABLE]
+        if unknown:
+            raise ValueError(f"Invalid key: {unknown[0]}")
+
+        offsets, keys, holds = array('I'), array('H'), array('H')
+        offsets.frombytes(data[start:start + count * 4])
+        keys.frombytes(data[start + count * 4:start + count * 6])
+        holds.frombytes(data[start + count * 6:])
+        if sys.byteorder == 'big':
+            for values in (offsets, keys, holds):
+                values.byteswap()
+        if keys and max(keys) >= len(labels):
+            raise ValueError("Not a macro file")
+        table = [KEY_TABLE[label].index for label in labels]
+        return cls(offsets, array('H', [table[key] for key in keys]), holds)
+
+    def save(self, path: str):
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path: str) -> 'Macro':
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
+
+
+class MacroPlayer:
+    """Replays a Macro on one web view through the shared scheduler and batcher.
+
+    Every press is due at a fixed offset from the start, so lag does not
+    add up over a long macro, and players started with the same
+    ``start_at`` press in step across tabs. Presses that are more than
+    ``max_late_ms`` overdue after a stall are dropped rather than sent in
+    a burst. A looping macro starts over once its last key is released.
+    """
+
+    def __init__(self, web_view: QWebEngineView, scheduler: Optional[PressScheduler] = None,
+                 batcher: Optional[PressBatcher] = None, max_late_ms: float = MACRO_MAX_LATE_MS):
+        self.web_view = web_view
+        self.scheduler = scheduler or shared_scheduler()
+        self.batcher = batcher or shared_batcher()
+        self.max_late_ms = max_late_ms
+        self.stats = PressStats()
+        self.is_active = False
+        self.macro: Optional[Macro] = None
+        self.loop = False
+        self.runs = 0  # Completed passes through the macro
+        self._callback: Optional[Callable[[], None]] = None
+        self._start = 0.0
+        self._next = 0
+        self._period = 1
+        self._macro_summary = {}
+
+    def start(self, macro: Macro, loop: bool = False, start_at: Optional[float] = None,
+              callback: Optional[Callable[[], None]] = None):
+        """Play a macro from its first press at start_at (a now_ms() time, default now)."""
+        self.stop()
+        self.macro = macro
+        self.loop = loop
+        self.runs = 0
+        self._callback = callback
+        self._start = now_ms() if start_at is None else start_at
+        self._next = 0
+        # Both scan the whole macro, so they are worked out once
+        self._period = max(1, macro.duration_ms)
+        self._macro_summary = macro.summary()
+        self.is_active = bool(len(macro))
+        if self.is_active:
+            self.scheduler.schedule_at(self, self._start + macro.offsets[0])
+
+    def stop(self):
+        self.is_active = False
+        self.scheduler.cancel(self)
+
+    def summary(self) -> dict:
+        summary = self.stats.summary() if self.stats.count else {}
+        summary.update(self._macro_summary)
+        summary.update(playing=self.is_active, runs=self.runs,
+                       position=self._next, dropped=self.stats.dropped)
+        return summary
+
+    def fire(self, deadline: float):
+        """Called by the scheduler when the next press, planned for deadline, is due."""
+        if not self.is_active:
+            return
+        macro = self.macro
+        offsets, keys, holds = macro.offsets, macro.keys, macro.holds
+        now = now_ms()
+        # Everything due by this tick goes out together
+        horizon = max(deadline, now)
+        while self._next < len(offsets) and self._start + offsets[self._next] <= horizon:
+            press_deadline = self._start + offsets[self._next]
+            if now - press_deadline > self.max_late_ms:
+                self.stats.dropped += 1
+            else:
+                seq = self.stats.record_fire(press_deadline, now)
+                self.batcher.submit(self.web_view, keys[self._next],
+                                    lambda result, seq=seq: self.stats.record_result(seq, now_ms()),
+                                    hold_ms=holds[self._next])
+            self._next += 1
+
+        if self._next == len(offsets):
+            self.runs += 1
+            if not self.loop:
+                self.is_active = False
+                if self._callback:
+                    self._callback()
+                return
+            self._start += self._period
+            # Whole passes missed during a stall are skipped, like sequence cycles
+            behind = now - self._start
+            if behind > self._period:
+                self._start += behind // self._period * self._period
+            self._next = 0
+        self.scheduler.schedule_at(self, self._start + offsets[self._next])
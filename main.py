@@ -1,15 +1,49 @@
+import argparse
 import sys
 import json
 import os
-from PyQt5.QtCore import QUrl, Qt, QObject, pyqtSlot
+import time
+from typing import Dict, Optional
+
+from flyff_browser.startup import HISTORY_STEPS, startup_trace
+startup_trace()  # Start timing before the Qt and web engine imports
+
+from PyQt5.QtCore import QUrl, Qt, QObject, QTimer, QStandardPaths, pyqtSlot
+from PyQt5.QtGui import QKeySequence
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QVBoxLayout, QWidget,
-                            QTabWidget, QPushButton, QHBoxLayout, QStyle, QTabBar)
+                            QTabWidget, QPushButton, QHBoxLayout, QStyle, QTabBar,
+                            QInputDialog, QMessageBox, QShortcut, QLabel)
 from PyQt5.QtWebEngineWidgets import QWebEngineView, QWebEnginePage
-from PyQt5.QtWebEngineCore import QWebEngineUrlRequestInterceptor
+startup_trace().mark('import Qt')
 
-from flyff_browser.config import KeyPressConfig, get_key_config
-from flyff_browser.key_simulator import KeyPressSimulator
-from flyff_browser.ui.auto_press import AutoPressControls, KeyPressControl
+from flyff_browser.assets import default_request_filter, register_asset_scheme
+from flyff_browser.broadcast import Broadcaster
+from flyff_browser.config import (AVAILABLE_KEYS, BROADCAST_HOTKEY, CONTROL_PORT, DEFAULT_ACCOUNT,
+                                  GAME_URL, KEY_TABLE_REFRESH_MS, MACRO_START_DELAY_MS,
+                                  PROFILE_MODE, SESSION_SAVE_DELAY_MS)
+from flyff_browser.control import ControlServer
+from flyff_browser.dispatcher import install_dispatcher
+from flyff_browser.lifecycle import PageLifecycleManager
+from flyff_browser.macros import Macro
+from flyff_browser.profiles import PROFILE_MODES, ProfileManager
+from flyff_browser.render import RenderThrottle, install_render_throttle
+from flyff_browser.scheduler import now_ms
+from flyff_browser.session import TabSession
+from flyff_browser.session_store import SessionStore, apply_session_state
+from flyff_browser.stats import (export_csv, export_json, format_loop_summary,
+                                 format_request_summary)
+from flyff_browser.workers import WorkerPool
+from flyff_browser.watchdog import LoopWatchdog
+from flyff_browser.watcher import RegionWatcher
+from flyff_browser.ui.auto_press import AutoPressControls, SequenceControl, WatchControl
+startup_trace().mark('import modules')
+
+# Epoch time in ms of the page's first (contentful) paint, or null before it
+_FIRST_PAINT_JS = """(function () {
+    var entry = performance.getEntriesByName('first-contentful-paint')[0]
+        || performance.getEntriesByName('first-paint')[0];
+    return entry ? performance.timeOrigin + entry.startTime : null;
+})()"""
 
 class CustomTabWidget(QTabWidget):
     def __init__(self, parent=None):
@@ -31,7 +65,7 @@ class CustomTabWidget(QTabWidget):
                 color: #000;
             }
         """)
-        self.new_tab_button.clicked.connect(self.parent().add_new_tab)
+        self.new_tab_button.clicked.connect(lambda: self.parent().add_new_tab())
         
         # Add the button to the tab bar
         self.tabBar().setDrawBase(False)  # Remove the base line of the tab bar
@@ -53,8 +87,11 @@ class CustomTabWidget(QTabWidget):
         return super().insertTab(index, widget, label)
 
 class CustomWebPage(QWebEnginePage):
-    def __init__(self, parent=None):
-        super().__init__(parent)
+    def __init__(self, parent=None, profile=None):
+        if profile is not None:
+            super().__init__(profile, parent)
+        else:
+            super().__init__(parent)
 
     def javaScriptConsoleMessage(self, level, message, line, source):
         pass
@@ -63,23 +100,61 @@ class CustomWebPage(QWebEnginePage):
         return super().acceptNavigationRequest(url, _type, isMainFrame)
 
 class FlyffBrowser(QMainWindow):
-    def __init__(self):
+    def __init__(self, profile_mode: str = PROFILE_MODE, use_workers: bool = False,
+                 restore: bool = True, startup_report: Optional[str] = None,
+                 control_port: Optional[int] = CONTROL_PORT):
         super().__init__()
         self.setWindowTitle('FlyFF Universe Simple FTool')
         self.setGeometry(100, 100, 1024, 768)
 
+        # Measure event loop lag and log stalls, shown in the status bar
+        self.watchdog = LoopWatchdog(parent=self)
+        self.loop_label = QLabel()
+        self.statusBar().addPermanentWidget(self.loop_label)
+        self.requests_label = QLabel()
+        self.statusBar().addPermanentWidget(self.requests_label)
+
+        # Browser profiles (cookies and caches) for each account, all filtering
+        # requests and sharing one asset cache
+        self.profiles = ProfileManager(profile_mode, request_filter=default_request_filter())
+
+        # In multi-process mode every client runs in its own worker process.
+        # Chromium cannot share one profile or cache directory between
+        # processes, so workers always get a profile of their own per account.
+        self.workers = None
+        if use_workers:
+            if profile_mode == 'shared_cache':
+                raise ValueError("Worker processes cannot share an HTTP cache; "
+                                 "use --profile-mode isolated with --workers")
+            self.workers = WorkerPool('isolated', GAME_URL, parent=self)
+
+        # Set while restore_sessions() rebuilds the saved tabs
+        self._restoring = False
+
         # Create the tab widget
         self.tab_widget = CustomTabWidget(self)
         self.tab_widget.tabCloseRequested.connect(self.close_tab)
         self.tab_widget.currentChanged.connect(self.on_tab_changed)
         
         # Create auto-press controls
-        self.auto_press_controls = AutoPressControls(self, on_add_key=self.add_key_control)
+        self.auto_press_controls = AutoPressControls(
+            self, on_add_key=self.add_key_control, on_export_stats=self.export_press_stats,
+            on_add_sequence=self.add_sequence_control, on_broadcast=self.broadcast_key,
+            on_broadcast_target=self.set_broadcast_target, broadcast_hotkey=BROADCAST_HOTKEY,
+            on_add_watch=self.add_watch_control, on_record_macro=self.record_macro,
+            on_play_macro=self.play_macro, on_save_macro=self.save_macro,
+            on_load_macro=self.load_macro, on_edit_key=self.edit_key,
+            on_remove_key=self.remove_key)
         self.addToolBar(Qt.RightToolBarArea, self.auto_press_controls)
 
-        # Initialize dictionaries for each tab
-        self.tab_key_simulators = {}
-        self.tab_key_configs = {}  # Store key configurations for each tab
+        # The macro last recorded or loaded, and the tab recording one
+        self.macro: Optional[Macro] = None
+        self._macro_summary: Optional[dict] = None
+        self._recording_session = None
+
+        # One session per tab, under a stable id and reachable from its web view
+        self.sessions: Dict[int, TabSession] = {}
+        self._sessions_by_widget: Dict[QWidget, TabSession] = {}
 
         # Set up the main layout
         layout = QVBoxLayout()
@@ -90,174 +165,693 @@ class FlyffBrowser(QMainWindow):
         container.setLayout(layout)
         self.setCentralWidget(container)
 
-        # Add the first tab
-        self.add_new_tab()
+        # Freeze or discard idle background tabs
+        self.lifecycle = PageLifecycleManager(
+            self.sessions, self.current_session, on_report=self.show_lifecycle_report, parent=self)
+
+        # Cap the frame rate of tabs that are not shown
+        self.render = RenderThrottle(self._tab_sessions, self.current_session, parent=self)
+
+        # Press keys when watched bars on screen run low
+        self.watcher = RegionWatcher(self._tab_sessions, parent=self)
+
+        # Refresh the live press stats shown for the current tab
+        self.stats_timer = QTimer(self)
+        self.stats_timer.timeout.connect(self.refresh_press_stats)
+        self.stats_timer.start(1000)
+
+        # The key table refreshes more often; only cells whose values changed are redrawn
+        self.key_table_timer = QTimer(self)
+        self.key_table_timer.timeout.connect(self.auto_press_controls.key_model.refresh)
+        self.key_table_timer.start(KEY_TABLE_REFRESH_MS)
+
+        # One key to every selected tab at once, from the panel or an application-wide hotkey
+        self.broadcaster = Broadcaster(
+            on_result=self.auto_press_controls.broadcast_control.set_result, parent=self)
+        if BROADCAST_HOTKEY:
+            shortcut = QShortcut(QKeySequence(BROADCAST_HOTKEY), self)
+            shortcut.setContext(Qt.ApplicationShortcut)
+            shortcut.activated.connect(self.broadcast_key)
+
+        # Save tabs and keys shortly after they change, batching bursts of edits
+        self.session_store = SessionStore()
+        self.save_timer = QTimer(self)
+        self.save_timer.setSingleShot(True)
+        self.save_timer.setInterval(SESSION_SAVE_DELAY_MS)
+        self.save_timer.timeout.connect(self.save_sessions)
+
+        # Local API for scripts driving every client
+        self.control = None
+        if control_port is not None:
+            self.control = ControlServer(
+                self._tab_sessions, open_tab=self.open_tab, close_tab=self.close_session,
+                activate=self.lifecycle.activate, on_change=self.on_control_change,
+                port=control_port, parent=self)
+            try:
+                self.control.start()
+            except OSError as e:
+                self.control = None
+                self.statusBar().showMessage(f'Could not start the control API: {e}')
+
+        # Tabs are only opened once the window has been painted, see paintEvent
+        self._restore = restore
+        self._startup_report = startup_report
+        self._sessions_started = False
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self._sessions_started:
+            # Show the window and controls first; creating the first web view
+            # starts Chromium, which takes long enough to notice
+            self._sessions_started = True
+            startup_trace().mark('window painted')
+            QTimer.singleShot(0, self.start_sessions)
+
+    def start_sessions(self):
+        """Reopen the previous session, or start with a single tab."""
+        with self.watchdog.activity('open tabs'):
+            if not (self._restore and self.restore_sessions()):
+                self.add_new_tab(DEFAULT_ACCOUNT)
+        startup_trace().mark('tabs created')
+        self._trace_first_page_paint()
+
+    def _trace_first_page_paint(self):
+        """Finish the startup trace once the current tab's page has loaded and painted."""
+        trace = startup_trace()
+        session = self.current_session()
+        web_view = session.web_view if session else None
+        if web_view is None:  # Worker processes show their pages themselves
+            self._finish_startup_trace()
+            return
+
+        def on_first_paint(epoch_ms):
+            trace.mark('first page paint', epoch_ms / 1000 if epoch_ms else None)
+            self._finish_startup_trace()
+
+        def on_load_finished(ok):
+            web_view.loadFinished.disconnect(on_load_finished)
+            trace.mark('page loaded')
+            web_view.page().runJavaScript(_FIRST_PAINT_JS, on_first_paint)
+
+        web_view.loadFinished.connect(on_load_finished)
+
+    def _finish_startup_trace(self):
+        """Write the startup report and add this run to the startup history."""
+        trace = startup_trace()
+        data_root = QStandardPaths.writableLocation(QStandardPaths.AppDataLocation)
+        try:
+            trace.finish(self._startup_report, os.path.join(data_root, 'startup_history.jsonl'))
+        except OSError as e:
+            self.statusBar().showMessage(f'Could not write startup report: {e}')
+            return
+
+        times = [f'{step} after {trace.elapsed_ms(step):.0f} ms'
+                 for step in HISTORY_STEPS if trace.elapsed_ms(step) is not None]
+        if times:
+            self.statusBar().showMessage('Startup: ' + ', '.join(times), 10000)
+
+    def current_session(self) -> Optional[TabSession]:
+        """Return the session of the selected tab."""
+        return self._sessions_by_widget.get(self.tab_widget.currentWidget())
 
     def on_tab_changed(self, index):
         """Handle tab changes."""
-        # Update current tab index
-        self._current_tab_index = index
-        
+        session = self.current_session()
+        if session and not self._restoring:
+            # Restored tabs create their web view when first shown
+            session.load()
+            self.lifecycle.activate(session)
+            self.schedule_save()
+
+        self.render.update()
+
         # Update the auto-press controls to show the current tab's controls
-        self.update_auto_press_controls()
+        with self.watchdog.activity('rebuild controls'):
+            self.update_auto_press_controls()
 
     def update_auto_press_controls(self):
         """Update the auto-press controls to show the current tab's controls."""
-        # Clear existing controls
-        for control in self.auto_press_controls.key_controls:
-            control.deleteLater()
-        self.auto_press_controls.key_controls.clear()
-        
-        # Add controls for current tab
-        current_tab_index = self.tab_widget.currentIndex()
-        if current_tab_index in self.tab_key_configs:
-            for i, config in enumerate(self.tab_key_configs[current_tab_index], 1):
-                # Create the control first
-                control = KeyPressControl(f'Key {i}', on_remove=None)
-                
-                # Now create the remove handler with the existing control
-                def create_remove_handler(ctrl):
-                    return lambda: self.auto_press_controls.remove_key_control(ctrl)
-                control.on_remove = create_remove_handler(control)
-                
-                # Set up the control's state
-                control.key_combo.setCurrentText(config['key'])
-                control.min_spin.setValue(config['min_interval'])
-                control.max_spin.setValue(config['max_interval'])
-                if config['active']:
-                    control.toggle_btn.setChecked(True)
-                    control.toggle_btn.setText('Deactivate')
-                
-                # Add the control to the UI
-                self.auto_press_controls.key_controls.append(control)
-                self.auto_press_controls.layout.addWidget(control)
-                self.connect_key_control(i, control)
-
-    def add_new_tab(self):
-        """Add a new tab with a web view."""
+        self.auto_press_controls.clear_controls()
+
+        session = self.current_session()
+        self.auto_press_controls.key_model.set_session(session)
+        if not session:
+            return
+        for number, (sequence_id, config) in enumerate(session.sequence_configs.items(), 1):
+            control = self._create_sequence_control(number)
+            control.sequence_id = sequence_id
+            control.set_steps(config['steps'])
+            control.repeat_spin.setValue(round(config['repeat_s']))
+            if config['active']:
+                control.toggle_btn.setChecked(True)
+                control.toggle_btn.setText('Deactivate')
+            control.set_stats(session.sequence_summary(sequence_id))
+            control.on_change = lambda control=control: self.update_sequence(control)
+
+        for number, (watch_id, config) in enumerate(session.watch_configs.items(), 1):
+            control = self._create_watch_control(number)
+            control.watch_id = watch_id
+            control.set_watch(config['region'], config['channel'], config['threshold'], config['key'])
+            if config['active']:
+                control.toggle_btn.setChecked(True)
+                control.toggle_btn.setText('Deactivate')
+            control.set_stats(session.watch_summary(watch_id))
+            control.on_change = lambda control=control: self.update_watch(control)
+
+    def _create_sequence_control(self, number: int) -> SequenceControl:
+        """Create a sequence control for the current tab and add it to the panel."""
+        control = SequenceControl(
+            f'Sequence {number}',
+            on_remove=lambda: self.remove_sequence_control(control)
+        )
+        control.toggle_btn.clicked.connect(lambda: self.toggle_sequence(control))
+        self.auto_press_controls.add_control(control)
+        return control
+
+    def _create_watch_control(self, number: int) -> WatchControl:
+        """Create a region watch control for the current tab and add it to the panel."""
+        control = WatchControl(
+            f'Watch {number}',
+            on_remove=lambda: self.remove_watch_control(control)
+        )
+        control.toggle_btn.clicked.connect(lambda: self.toggle_watch(control))
+        self.auto_press_controls.add_control(control)
+        return control
+
+    def ask_account(self) -> Optional[str]:
+        """Ask which account a new tab is for; None if the user cancels."""
+        if self.profiles.mode == 'default' and not self.workers:
+            return DEFAULT_ACCOUNT
+
+        accounts = list(dict.fromkeys(s.account for s in self.sessions.values()))
+        suggestion = f'account{len(accounts) + 1}'
+        account, ok = QInputDialog.getItem(
+            self, 'New Tab', 'Account:', accounts + [suggestion], len(accounts), True)
+        account = account.strip()
+        if ok and account and self.workers and account in accounts:
+            QMessageBox.warning(self, 'New Tab', f'{account} already runs in a worker process.')
+            return None
+        return account if ok and account else None
+
+    def add_new_tab(self, account: Optional[str] = None):
+        """Add a new tab with a web view, on the profile of the given account, and return its
+        session (None if the user cancels)."""
+        if account is None:
+            account = self.ask_account()
+            if account is None:
+                return
+
+        session = self._new_session(account, GAME_URL)
+        self._add_tab(session, account)
+        session.load()
+        return session
+
+    def open_tab(self, account: str):
+        """Open a tab for an account without asking, e.g. for the control API."""
+        if self.workers and any(s.account == account for s in self.sessions.values()):
+            raise ValueError(f'{account} already runs in a worker process')
+        return self.add_new_tab(account)
+
+    def _new_session(self, account: str, url: str):
+        """Create a session whose client is only started by its load()."""
+        if self.workers:
+            return self.workers.create_session(account, url, start=False)
+        return TabSession(account=account, url=url, create_view=self._create_web_view)
+
+    def _create_web_view(self, account: str) -> QWebEngineView:
+        """Create a web view on the profile of the given account; the session sets its URL."""
         web_view = QWebEngineView()
-        web_page = CustomWebPage(web_view)
+        web_page = CustomWebPage(web_view, self.profiles.profile_for(account))
         web_view.setPage(web_page)
-        
+        install_dispatcher(web_page)
+        install_render_throttle(web_page)
+        self.profiles.track_load(account, web_view)
+
         # Connect to URL changed signal
         web_view.urlChanged.connect(self.on_url_changed)
-        
-        # Set initial URL
-        web_view.setUrl(QUrl("https://universe.flyff.com/play"))
-        
+        return web_view
+
+    def _add_tab(self, session, account: str, select: bool = True):
+        """Register a session and show its widget in a new tab."""
+        # Register the session before the tab becomes current so the
+        # controls panel can find it
+        self.sessions[session.id] = session
+        self._sessions_by_widget[session.widget] = session
+
         # Add tab
-        index = self.tab_widget.addTab(web_view, "FlyFF Universe")
-        self.tab_widget.setCurrentIndex(index)
-        
-        # Initialize key simulators and configurations for this tab
-        self.tab_key_simulators[index] = {}
-        self.tab_key_configs[index] = []
+        title = "FlyFF Universe" if self.profiles.mode == 'default' and not self.workers else account
+        index = self.tab_widget.addTab(session.widget, title)
+        if select:
+            self.tab_widget.setCurrentIndex(index)
+        self.update_broadcast_targets()
+        self.schedule_save()
+
+    def _tab_sessions(self):
+        """Every session, in tab order."""
+        sessions = []
+        for index in range(self.tab_widget.count()):
+            session = self._sessions_by_widget.get(self.tab_widget.widget(index))
+            if session:
+                sessions.append(session)
+        return sessions
+
+    def restore_sessions(self) -> bool:
+        """Recreate the tabs and keys saved last time; False if there was nothing to restore.
+
+        Only the selected tab and tabs with active keys, sequences or watches load right away;
+        the others get their web view when first shown.
+        """
+        state = self.session_store.load()
+        if not state or not state.get('tabs'):
+            return False
+
+        self._restoring = True
+        try:
+            for tab in state['tabs']:
+                account = tab.get('account') or DEFAULT_ACCOUNT
+                session = self._new_session(account, tab.get('url') or GAME_URL)
+                apply_session_state(session, tab)
+                self._add_tab(session, account, select=False)
+        finally:
+            self._restoring = False
+
+        self.tab_widget.setCurrentIndex(min(state.get('current', 0), len(self.sessions) - 1))
+        self.on_tab_changed(self.tab_widget.currentIndex())
+        return True
+
+    def schedule_save(self):
+        """Save the session soon; repeated calls within the delay cause one write."""
+        if not self._restoring:
+            self.save_timer.start()
+
+    def save_sessions(self):
+        """Write every tab, in tab order, and its keys to the session file."""
+        self.save_timer.stop()
+        try:
+            with self.watchdog.activity('save session'):
+                self.session_store.save(self._tab_sessions(), max(self.tab_widget.currentIndex(), 0))
+        except OSError as e:
+            self.statusBar().showMessage(f'Could not save session: {e}')
 
     def close_tab(self, index):
         """Close a tab."""
-        if self.tab_widget.count() > 1:  # Keep at least one tab
-            # Stop all key simulators for this tab
-            if index in self.tab_key_simulators:
-                for simulator in self.tab_key_simulators[index].values():
-                    simulator.stop()
-                del self.tab_key_simulators[index]
-            
-            # Remove key configurations for this tab
-            if index in self.tab_key_configs:
-                del self.tab_key_configs[index]
-            
+        if self.tab_widget.count() > 2:  # Keep at least one tab besides the + tab
+            widget = self.tab_widget.widget(index)
+            session = self._sessions_by_widget.pop(widget, None)
+            if session:
+                if session is self._recording_session:
+                    self._recording_session = None
+                    self.auto_press_controls.macro_control.set_recording(False)
+                if session.is_remote:
+                    self.workers.remove_session(session)
+                else:
+                    session.close()
+                self.lifecycle.forget(session)
+                del self.sessions[session.id]
+
             self.tab_widget.removeTab(index)
+            widget.deleteLater()
+            self.update_broadcast_targets()
+            self.schedule_save()
 
-    def add_key_simulator(self, control_id: int):
-        """Add a new key simulator for a control."""
-        current_tab_index = self.tab_widget.currentIndex()
-        if current_tab_index not in self.tab_key_simulators:
-            self.tab_key_simulators[current_tab_index] = {}
-        self.tab_key_simulators[current_tab_index][control_id] = KeyPressSimulator(self.tab_widget.currentWidget())
-
-    def remove_key_simulator(self, control_id: int):
-        """Remove a key simulator."""
-        current_tab_index = self.tab_widget.currentIndex()
-        if current_tab_index in self.tab_key_simulators and control_id in self.tab_key_simulators[current_tab_index]:
-            self.tab_key_simulators[current_tab_index][control_id].stop()
-            del self.tab_key_simulators[current_tab_index][control_id]
-
-    def connect_key_control(self, control_id: int, control):
-        """Connect a key control to its simulator."""
-        control.toggle_btn.clicked.connect(
-            lambda: self.toggle_auto_press(control_id))
-
-    def toggle_auto_press(self, control_id: int):
-        current_tab_index = self.tab_widget.currentIndex()
-        if current_tab_index not in self.tab_key_simulators:
-            self.tab_key_simulators[current_tab_index] = {}
-            
-        control = self.auto_press_controls.key_controls[control_id - 1]
-        
-        # Update the configuration for this tab
-        if current_tab_index not in self.tab_key_configs:
-            self.tab_key_configs[current_tab_index] = []
-        while len(self.tab_key_configs[current_tab_index]) < control_id:
-            self.tab_key_configs[current_tab_index].append({})
-        
-        config = {
-            'key': control.key_combo.currentText(),
-            'min_interval': control.min_spin.value(),
-            'max_interval': control.max_spin.value(),
-            'active': control.toggle_btn.isChecked()
-        }
-        self.tab_key_configs[current_tab_index][control_id - 1] = config
-        
-        if control.toggle_btn.isChecked():
-            key_name = control.key_combo.currentText()
-            key_config = KeyPressConfig(
-                min_interval=control.min_spin.value(),
-                max_interval=control.max_spin.value(),
-                key=key_name,
-                key_code=get_key_config(key_name).key_code,
-                key_name=get_key_config(key_name).key_name
-            )
-            self.tab_key_simulators[current_tab_index][control_id].start(
-                key_config, 
-                lambda: self.tab_key_simulators[current_tab_index][control_id]._schedule_next_press(lambda: None)
-            )
-            control.toggle_btn.setText('Deactivate')
+    def close_session(self, session):
+        """Close the tab of a session."""
+        self.close_tab(self.tab_widget.indexOf(session.widget))
+
+    def on_control_change(self):
+        """Show and save what a control API batch changed."""
+        self.update_auto_press_controls()
+        self.update_broadcast_targets()
+        self.schedule_save()
+
+    def update_broadcast_targets(self):
+        """List every tab in the broadcast panel, checked if it receives broadcasts."""
+        self.auto_press_controls.broadcast_control.set_targets([
+            (session.id,
+             f'Tab {number}: {self.tab_widget.tabText(self.tab_widget.indexOf(session.widget))}',
+             session.broadcast_target)
+            for number, session in enumerate(self._tab_sessions(), 1)
+        ])
+
+    def set_broadcast_target(self, session_id: int, checked: bool):
+        session = self.sessions.get(session_id)
+        if session:
+            session.broadcast_target = checked
+            self.schedule_save()
+
+    def broadcast_key(self):
+        """Press the broadcast key once on every checked tab whose client is running."""
+        key = self.auto_press_controls.broadcast_control.key_combo.currentText()
+        targets = [session for session in self._tab_sessions()
+                   if session.broadcast_target and session.is_loaded]
+        for session in targets:
+            # A frozen page would only see the key once it is thawed
+            self.lifecycle.activate(session)
+        self.broadcaster.broadcast(targets, key)
+
+    def record_macro(self, recording: bool):
+        """Start recording the keys typed in the current tab, or stop and keep what was recorded."""
+        if recording:
+            session = self.current_session()
+            if not session:
+                self.auto_press_controls.macro_control.set_recording(False)
+                return
+            session.start_recording()
+            self._recording_session = session
+            self.statusBar().showMessage('Recording the keys typed in this tab', 5000)
+        elif self._recording_session:
+            session, self._recording_session = self._recording_session, None
+            session.stop_recording(self.set_macro)
+
+    def set_macro(self, macro: Macro):
+        self.macro = macro
+        self._macro_summary = macro.summary()
+        self.auto_press_controls.macro_control.set_stats(self._macro_summary)
+
+    def play_macro(self, playing: bool):
+        """Play the macro on the current tab, or on every checked broadcast tab from the same
+        start time; or stop it on every tab."""
+        control = self.auto_press_controls.macro_control
+        if not playing:
+            for session in self._tab_sessions():
+                session.stop_macro()
+            return
+        if not self.macro:
+            control.set_playing(False)
+            self.statusBar().showMessage('Record or load a macro first', 5000)
+            return
+
+        if control.broadcast_check.isChecked():
+            targets = [session for session in self._tab_sessions()
+                       if session.broadcast_target and session.is_loaded]
         else:
-            if current_tab_index in self.tab_key_simulators and control_id in self.tab_key_simulators[current_tab_index]:
-                self.tab_key_simulators[current_tab_index][control_id].stop()
-            control.toggle_btn.setText('Activate')
+            targets = [self.current_session()] if self.current_session() else []
+        start_at = now_ms() + MACRO_START_DELAY_MS
+        for session in targets:
+            self.lifecycle.activate(session)
+            session.play_macro(self.macro, control.loop_check.isChecked(), start_at)
+
+    def save_macro(self, path: str):
+        if not self.macro:
+            self.statusBar().showMessage('Record or load a macro first', 5000)
+            return
+        try:
+            self.macro.save(path)
+        except OSError as e:
+            QMessageBox.warning(self, 'Save Macro', f'Could not save the macro: {e}')
+
+    def load_macro(self, path: str):
+        try:
+            macro = Macro.load(path)
+        except (OSError, ValueError) as e:
+            QMessageBox.warning(self, 'Load Macro', f'Could not load the macro: {e}')
+            return
+        self.set_macro(macro)
+
+    def edit_key(self, key_id: int, field: str, value):
+        """Apply an edit made in the key table to the current tab's key."""
+        session = self.current_session()
+        if not session or key_id not in session.key_configs:
+            return
+
+        config = session.key_configs[key_id]
+        if field == 'active':
+            if value:
+                self.lifecycle.activate(session)
+            session.set_key_active(key_id, value)
+        else:
+            settings = dict(config, **{field: value})
+            # An interval edited past the other bound takes it along
+            if field == 'min_interval':
+                settings['max_interval'] = max(settings['max_interval'], value)
+            elif field == 'max_interval':
+                settings['min_interval'] = min(settings['min_interval'], value)
+            session.update_key(key_id, settings['key'], settings['min_interval'],
+                               settings['max_interval'], settings['distribution'])
+            if config['active']:
+                session.set_key_active(key_id, True)  # Restart with the new settings
+        self.schedule_save()
+
+    def remove_key(self, key_id: int):
+        """Remove a key from the current tab."""
+        session = self.current_session()
+        if session:
+            session.remove_key(key_id)
+            self.auto_press_controls.key_model.refresh()
+            self.schedule_save()
 
     def add_key_control(self):
-        """Add a new key control."""
-        current_tab_index = self.tab_widget.currentIndex()
-        if current_tab_index not in self.tab_key_configs:
-            self.tab_key_configs[current_tab_index] = []
-            
-        control_id = len(self.tab_key_configs[current_tab_index]) + 1
-        control = KeyPressControl(
-            f'Key {control_id}',
-            on_remove=lambda: self.auto_press_controls.remove_key_control(control)
-        )
-        self.auto_press_controls.key_controls.append(control)
-        self.auto_press_controls.layout.addWidget(control)
-        self.add_key_simulator(control_id)
-        self.connect_key_control(control_id, control)
-        
-        # Initialize the configuration for this control
-        self.tab_key_configs[current_tab_index].append({
-            'key': control.key_combo.currentText(),
-            'min_interval': control.min_spin.value(),
-            'max_interval': control.max_spin.value(),
-            'active': False
-        })
+        """Add a key to the current tab as the last row of the key table."""
+        session = self.current_session()
+        if not session:
+            return
+
+        # The first key, every 3 to 6 seconds, until edited
+        session.add_key(AVAILABLE_KEYS[0].label, 3.0, 6.0)
+        self.auto_press_controls.key_model.refresh()
+        self.schedule_save()
+
+    def add_sequence_control(self):
+        """Add a new sequence, starting with a single step."""
+        session = self.current_session()
+        if not session:
+            return
+
+        control = self._create_sequence_control(len(session.sequence_configs) + 1)
+        control.add_step()
+        control.sequence_id = session.add_sequence(control.steps(), control.repeat_spin.value())
+        control.on_change = lambda: self.update_sequence(control)
+        self.schedule_save()
+
+    def update_sequence(self, control: SequenceControl):
+        """Apply an edited sequence; a running one is swapped in place."""
+        session = self.current_session()
+        if session:
+            session.update_sequence(control.sequence_id, control.steps(), control.repeat_spin.value())
+            self.schedule_save()
+
+    def toggle_sequence(self, control: SequenceControl):
+        session = self.current_session()
+        if not session:
+            return
+
+        active = control.toggle_btn.isChecked()
+        if active:
+            self.lifecycle.activate(session)
+        session.set_sequence_active(control.sequence_id, active)
+        control.toggle_btn.setText('Deactivate' if active else 'Activate')
+        self.schedule_save()
+
+    def remove_sequence_control(self, control: SequenceControl):
+        session = self.current_session()
+        if session:
+            session.remove_sequence(control.sequence_id)
+            self.schedule_save()
+        self.auto_press_controls.remove_control(control)
+
+    def add_watch_control(self):
+        """Add a new region watch with the control's default settings."""
+        session = self.current_session()
+        if not session:
+            return
+
+        control = self._create_watch_control(len(session.watch_configs) + 1)
+        control.watch_id = session.add_watch(control.region(), control.channel_combo.currentText(),
+                                             control.threshold(), control.key_combo.currentText())
+        control.on_change = lambda: self.update_watch(control)
+        self.schedule_save()
+
+    def update_watch(self, control: WatchControl):
+        """Apply an edited watch; the next frame uses the new settings."""
+        session = self.current_session()
+        if not session:
+            return
+        try:
+            session.update_watch(control.watch_id, control.region(),
+                                 control.channel_combo.currentText(), control.threshold(),
+                                 control.key_combo.currentText())
+        except ValueError as error:
+            self.statusBar().showMessage(str(error), 5000)
+            return
+        self.schedule_save()
+
+    def toggle_watch(self, control: WatchControl):
+        session = self.current_session()
+        if not session:
+            return
+
+        active = control.toggle_btn.isChecked()
+        if active:
+            self.lifecycle.activate(session)
+        session.set_watch_active(control.watch_id, active)
+        control.toggle_btn.setText('Deactivate' if active else 'Activate')
+        self.schedule_save()
+
+    def remove_watch_control(self, control: WatchControl):
+        session = self.current_session()
+        if session:
+            session.remove_watch(control.watch_id)
+            self.schedule_save()
+        self.auto_press_controls.remove_control(control)
+
+    def refresh_press_stats(self):
+        """Show the latest summary on each of the current tab's sequence and watch controls;
+        the key table is refreshed by key_table_timer."""
+        self.show_loop_summary()
+        self.requests_label.setText(format_request_summary(self.profiles.request_filter.summary()))
+
+        # Recorded presses arrive asynchronously and are kept by the session
+        if self._recording_session:
+            self._recording_session.poll_recording()
+        macro_control = self.auto_press_controls.macro_control
+        macro_control.set_playing(any(session.is_playing for session in self._tab_sessions()))
+
+        session = self.current_session()
+        if not session:
+            return
+        macro_control.set_stats(self._macro_summary, session.macro_summary())
+
+        # Sequence counters arrive asynchronously and show on the next refresh
+        session.poll_sequences()
+        for control in self.auto_press_controls.sequence_controls:
+            control.set_stats(session.sequence_summary(control.sequence_id))
+        for control in self.auto_press_controls.watch_controls:
+            control.set_stats(session.watch_summary(control.watch_id))
+
+    def export_press_stats(self, path: str):
+        """Export press timing for every key of every tab to CSV or JSON."""
+        if self.workers:
+            self.workers.fetch_samples()
+
+        entries = []
+        sequences = []
+        watches = []
+        macros = []
+        for session in self.sessions.values():
+            tab_number = self.tab_widget.indexOf(session.widget) + 1
+            for number, (key_id, key, stats) in enumerate(session.stats_entries(), 1):
+                entries.append((f'Tab {tab_number} / Key {number} ({key})', stats))
+            for number, (sequence_id, config) in enumerate(session.sequence_configs.items(), 1):
+                sequences.append(dict(config, label=f'Tab {tab_number} / Sequence {number}',
+                                      summary=session.sequence_summary(sequence_id)))
+            for number, (watch_id, config) in enumerate(session.watch_configs.items(), 1):
+                watches.append(dict(config, label=f'Tab {tab_number} / Watch {number}',
+                                    summary=session.watch_summary(watch_id)))
+            if session.macro_summary():
+                macros.append(dict(session.macro_summary(), label=f'Tab {tab_number} / Macro'))
+
+        with self.watchdog.activity('export stats'):
+            if path.lower().endswith('.json'):
+                export_json(path, entries, extra={
+                    'sequences': sequences,
+                    'watches': watches,
+                    'macros': macros,
+                    'watcher': self.watcher.summary(),
+                    'broadcasts': list(self.broadcaster.history),
+                    'event_loop': self.watchdog.report(),
+                    'lifecycle': self.lifecycle.report(),
+                    'render': self.render.report(),
+                    'profiles': self.profiles.report(),
+                    'control': self.control.summary() if self.control else None,
+                })
+            else:
+                export_csv(path, entries)
+
+    def show_loop_summary(self):
+        """Show event loop lag in the status bar, with the latest stalls as its tooltip."""
+        self.loop_label.setText(format_loop_summary(self.watchdog.summary()))
+        lines = []
+        for stall in reversed(list(self.watchdog.stalls)[-5:]):
+            at = time.strftime('%H:%M:%S', time.localtime(stall['at']))
+            line = f"{at}: {stall['duration_ms']:.0f} ms"
+            if stall['during']:
+                line += f" during {', '.join(stall['during'])}"
+            lines.append(line)
+        self.loop_label.setToolTip('\n'.join(lines) or 'No stalls')
+
+    def show_lifecycle_report(self, report):
+        """Show each tab's lifecycle state and memory as its tooltip, with totals in the status bar."""
+        states = {}
+        render = {row['session_id']: row for row in self.render.report()}
+        for row in report:
+            states[row['state']] = states.get(row['state'], 0) + 1
+            session = self.sessions.get(row['session_id'])
+            if not session:
+                continue
+            rss = '?' if row['rss_mb'] is None else f"{row['rss_mb']:.0f} MB"
+            tooltip = f"{row['state'].capitalize()} · renderer {rss}"
+            if row['transitions']:
+                last = row['transitions'][-1]
+                tooltip += (f"\nLast {last['from']} → {last['to']}: "
+                            f"{last['rss_before_mb']} → {last['rss_after_mb']} MB")
+            budget = render.get(row['session_id'])
+            if budget and budget['throttled'] and budget['fps_cap']:
+                tooltip += f"\nRendering capped at {budget['fps_cap']:g} fps"
+            if budget:
+                shown, hidden = ('?' if cpu is None else f'{cpu:.0f}%'
+                                 for cpu in (budget['cpu_percent_full'], budget['cpu_percent_throttled']))
+                tooltip += f"\nRenderer CPU {shown} shown, {hidden} in background"
+            self.tab_widget.setTabToolTip(self.tab_widget.indexOf(session.widget), tooltip)
+
+        self.statusBar().showMessage(
+            ', '.join(f'{count} {state}' for state, count in sorted(states.items())))
 
     def on_url_changed(self, url):
         """Handle URL changes to detect login page."""
         pass
 
+    def closeEvent(self, event):
+        self.save_sessions()
+        self.watcher.stop()
+        if self.control:
+            self.control.stop()
+        if self.workers:
+            self.workers.shutdown()
+        super().closeEvent(event)
+
 def main():
-    app = QApplication(sys.argv)
-    browser = FlyffBrowser()
+    parser = argparse.ArgumentParser(description='FlyFF Universe Simple FTool')
+    parser.add_argument('--profile-mode', choices=PROFILE_MODES, default=PROFILE_MODE,
+                        help='how tabs share browser profiles (cookies and caches)')
+    parser.add_argument('--workers', action='store_true',
+                        help='run every client in its own worker process')
+    parser.add_argument('--no-restore', action='store_true',
+                        help='start with a single tab instead of reopening the last session')
+    parser.add_argument('--startup-trace', metavar='PATH',
+                        help='write the timing of each startup step to a JSON file')
+    parser.add_argument('--control-port', type=int, metavar='PORT', default=CONTROL_PORT,
+                        help='serve the local control API on 127.0.0.1 at this port')
+    # Used by the control window to start worker processes
+    parser.add_argument('--worker-id', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--worker-server', help=argparse.SUPPRESS)
+    parser.add_argument('--account', default=DEFAULT_ACCOUNT, help=argparse.SUPPRESS)
+    parser.add_argument('--url', default=GAME_URL, help=argparse.SUPPRESS)
+    args, qt_args = parser.parse_known_args()
+    if args.workers and args.profile_mode == 'shared_cache':
+        parser.error("--profile-mode shared_cache cannot be used with --workers: "
+                     "worker processes cannot share an HTTP cache")
+    register_asset_scheme()
+
+    # Sequences time their steps with setTimeout in the page, which Chromium
+    # otherwise slows to once a second in tabs that are not shown
+    flags = os.environ.get('QTWEBENGINE_CHROMIUM_FLAGS', '')
+    if '--disable-background-timer-throttling' not in flags:
+        os.environ['QTWEBENGINE_CHROMIUM_FLAGS'] = (
+            flags + ' --disable-background-timer-throttling').strip()
+
+    if args.worker_id is not None:
+        from flyff_browser.worker import run_worker
+        sys.exit(run_worker(args.worker_server, args.worker_id, args.account,
+                            args.profile_mode, args.url, qt_args))
+
+    trace = startup_trace()
+    app = QApplication(sys.argv[:1] + qt_args)
+    app.setApplicationName('FlyFFSimpleFTool')  # Names the profile and cache directories
+    trace.mark('QApplication')
+    browser = FlyffBrowser(profile_mode=args.profile_mode, use_workers=args.workers,
+                           restore=not args.no_restore, startup_report=args.startup_trace,
+                           control_port=args.control_port)
+    trace.mark('FlyffBrowser')
     browser.show()
     sys.exit(app.exec_())
 
@@ -0,0 +1,105 @@
+import os
+import sys
+from typing import Dict, List, Optional
+
+try:
+    import psutil
+except ImportError:  # psutil is optional; fall back to /proc on Linux
+    psutil = None
+
+_CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def process_usage(pid: int) -> Optional[Dict[str, float]]:
+    """Return {'cpu_s', 'rss_bytes'} for one process, or None if unavailable."""
+    if psutil is not None:
+        try:
+            proc = psutil.Process(pid)
+            times = proc.cpu_times()
+            return {'cpu_s': times.user + times.system, 'rss_bytes': proc.memory_info().rss}
+        except psutil.Error:
+            return None
+
+    if sys.platform.startswith('linux'):
+        try:
+            with open(f'/proc/{pid}/stat') as f:
+                # The command name may contain spaces; fields resume after ')'
+                fields = f.read().rsplit(')', 1)[1].split()
+            with open(f'/proc/{pid}/statm') as f:
+                resident_pages = int(f.read().split()[1])
+        except (OSError, IndexError, ValueError):
+            return None
+        return {
+            'cpu_s': (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS,
+            'rss_bytes': resident_pages * _PAGE_SIZE,
+        }
+
+    if pid == os.getpid():
+        times = os.times()
+        return {'cpu_s': times.user + times.system, 'rss_bytes': 0}
+    return None
+
+
+def child_pids(pid: int) -> List[int]:
+    """Return every descendant of pid (e.g. QtWebEngineProcess renderers)."""
+    if psutil is not None:
+        try:
+            return [child.pid for child in psutil.Process(pid).children(recursive=True)]
+        except psutil.Error:
+            return []
+
+    if not sys.platform.startswith('linux'):
+        return []
+
+    parents: Dict[int, List[int]] = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        parents.setdefault(ppid, []).append(int(entry))
+
+    found = []
+    stack = [pid]
+    while stack:
+        for child in parents.get(stack.pop(), []):
+            found.append(child)
+            stack.append(child)
+    return found
+
+
+def tree_usage(pid: Optional[int] = None) -> Dict[str, float]:
+    """Summed CPU seconds and RSS of a process and all of its descendants."""
+    pid = os.getpid() if pid is None else pid
+    total = {'cpu_s': 0.0, 'rss_bytes': 0}
+    for member in [pid] + child_pids(pid):
+        usage = process_usage(member)
+        if usage:
+            total['cpu_s'] += usage['cpu_s']
+            total['rss_bytes'] += usage['rss_bytes']
+    return total
+
+
+def process_start_time(pid: Optional[int] = None) -> Optional[float]:
+    """Wall-clock time (seconds since the epoch) a process was started, or None if unavailable."""
+    pid = os.getpid() if pid is None else pid
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).create_time()
+        except psutil.Error:
+            return None
+
+    if sys.platform.startswith('linux'):
+        try:
+            with open(f'/proc/{pid}/stat') as f:
+                start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+            with open('/proc/stat') as f:
+                boot_time = next(int(line.split()[1]) for line in f if line.startswith('btime'))
+        except (OSError, IndexError, ValueError, StopIteration):
+            return None
+        return boot_time + start_ticks / _CLOCK_TICKS
+    return None
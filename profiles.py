@@ -0,0 +1,160 @@
+import os
+import re
+import time
+from typing import Dict, List, Optional
+
+from PyQt5.QtCore import QStandardPaths
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtWebEngineWidgets import QWebEngineProfile
+
+from flyff_browser.config import PROFILE_CACHE_LIMIT_MB, PROFILE_MODE
+from flyff_browser.procinfo import tree_usage
+
+# 'default'      every tab on the default profile: one cookie jar, one login
+# 'isolated'     one persistent profile per account, each with its own cache
+# 'shared_cache' one profile per account for logins, with a memory-only HTTP cache: static
+#                assets come from the asset cache on disk that every profile shares
+PROFILE_MODES = ('default', 'isolated', 'shared_cache')
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class ProfileManager:
+    """Hands out the QWebEngineProfile each account's tabs should use.
+
+    Profiles are created on first use and kept for the life of the app.
+    Load times are tracked per profile: the first load after the profile's
+    cache directory was found empty counts as cold, every other as warm.
+    A ``request_filter`` (see assets.py) is installed on every profile.
+    """
+
+    def __init__(self, mode: str = PROFILE_MODE, cache_limit_mb: int = PROFILE_CACHE_LIMIT_MB,
+                 request_filter: Optional['RequestFilter'] = None):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Invalid profile mode: {mode}")
+        self.mode = mode
+        self.cache_limit_mb = cache_limit_mb
+        self.request_filter = request_filter
+        self._profiles: Dict[str, QWebEngineProfile] = {}
+        self._cold: Dict[str, bool] = {}
+        self._load_times: Dict[str, List[dict]] = {}
+
+        data_root = QStandardPaths.writableLocation(QStandardPaths.AppDataLocation)
+        cache_root = QStandardPaths.writableLocation(QStandardPaths.CacheLocation)
+        self.storage_root = os.path.join(data_root, 'profiles')
+        self.cache_root = os.path.join(cache_root, 'profiles')
+
+    def profile_for(self, account: str) -> QWebEngineProfile:
+        """Return the profile for an account, creating it on first use."""
+        name = self._profile_name(account)
+        profile = self._profiles.get(name)
+        if profile is not None:
+            return profile
+
+        if self.mode == 'default':
+            profile = QWebEngineProfile.defaultProfile()
+        else:
+            # Parented to the application so it outlives every page using it
+            profile = QWebEngineProfile(name, QApplication.instance())
+            profile.setPersistentStoragePath(os.path.join(self.storage_root, name))
+            profile.setCachePath(os.path.join(self.cache_root, name))
+            # Chromium keeps one disk cache per profile and cannot share its directory,
+            # so shared_cache profiles leave the bulky assets to the shared asset cache
+            if self.mode == 'shared_cache':
+                profile.setHttpCacheType(QWebEngineProfile.MemoryHttpCache)
+            else:
+                profile.setHttpCacheType(QWebEngineProfile.DiskHttpCache)
+            profile.setPersistentCookiesPolicy(QWebEngineProfile.ForcePersistentCookies)
+        if self.cache_limit_mb:
+            profile.setHttpCacheMaximumSize(self.cache_limit_mb * 1024 * 1024)
+        if self.request_filter is not None:
+            self.request_filter.install(profile)
+
+        self._profiles[name] = profile
+        self._cold[name] = _dir_size(self._cold_cache_path(profile)) == 0
+        return profile
+
+    def track_load(self, account: str, web_view):
+        """Time every load of a web view belonging to the given account."""
+        name = self._profile_name(account)
+        started = {}
+
+        def on_started():
+            started['at'] = time.monotonic()
+
+        def on_finished(ok):
+            if 'at' not in started:
+                return
+            cold = self._cold.get(name, False)
+            self._cold[name] = False
+            self._load_times.setdefault(name, []).append({
+                'seconds': round(time.monotonic() - started.pop('at'), 3),
+                'cold': cold,
+                'ok': ok,
+            })
+
+        web_view.loadStarted.connect(on_started)
+        web_view.loadFinished.connect(on_finished)
+
+    def report(self) -> dict:
+        """Load times plus cache and storage disk use of every profile, and total process memory."""
+        profiles = []
+        counted_caches = set()
+        disk_total = 0
+        for name, profile in self._profiles.items():
+            cache_path = profile.cachePath()
+            storage_path = profile.persistentStoragePath()
+            cache_bytes = _dir_size(cache_path)
+            storage_bytes = _dir_size(storage_path) if storage_path != cache_path else 0
+            if cache_path not in counted_caches:
+                counted_caches.add(cache_path)
+                disk_total += cache_bytes
+            disk_total += storage_bytes
+
+            loads = self._load_times.get(name, [])
+            cold = [load['seconds'] for load in loads if load['cold']]
+            warm = [load['seconds'] for load in loads if not load['cold']]
+            profiles.append({
+                'name': name,
+                'cache_path': cache_path,
+                'cache_mb': round(cache_bytes / (1024 * 1024), 1),
+                'storage_mb': round(storage_bytes / (1024 * 1024), 1),
+                'cold_load_s': _mean(cold),
+                'warm_load_s': _mean(warm),
+                'loads': loads,
+            })
+
+        usage = tree_usage()
+        return {
+            'mode': self.mode,
+            'cache_limit_mb': self.cache_limit_mb,
+            'profiles': profiles,
+            'disk_mb': round(disk_total / (1024 * 1024), 1),
+            'memory_mb': round(usage['rss_bytes'] / (1024 * 1024), 1),
+            'requests': self.request_filter.summary() if self.request_filter else None,
+        }
+
+    def _cold_cache_path(self, profile: QWebEngineProfile) -> str:
+        # Where a profile's first load finds its assets
+        cache = self.request_filter.cache if self.request_filter is not None else None
+        if self.mode == 'shared_cache' and cache is not None:
+            return cache.path
+        return profile.cachePath()
+
+    def _profile_name(self, account: str) -> str:
+        if self.mode == 'default':
+            return 'default'
+        return 'account-' + re.sub(r'[^A-Za-z0-9_-]+', '_', account)
+
+
+def _mean(values: List[float]) -> Optional[float]:
+    return round(sum(values) / len(values), 3) if values else None
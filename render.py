@@ -0,0 +1,233 @@
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from PyQt5.QtCore import QObject, QTimer
+from PyQt5.QtWebEngineWidgets import QWebEnginePage, QWebEngineScript
+
+from flyff_browser.config import (RENDER_CPU_SAMPLE_S, RENDER_THROTTLE_FPS, RENDER_THROTTLE_MUTE,
+                                  RENDER_THROTTLE_PIXEL_RATIO)
+from flyff_browser.procinfo import process_usage
+
+RENDER_SCRIPT_NAME = 'flyff-ftool-render'
+
+# Installed once per document, before the game's own scripts, so the game
+# only ever sees the wrapped requestAnimationFrame. While a cap is set,
+# frame callbacks are collected and run together once per 1000/fps ms: a
+# timer waits out the rest of the interval, then one native frame runs them
+# all. Without a cap calls go straight to the browser. Key events are
+# dispatched independently of frames, so presses are not delayed.
+#
+# The pixel ratio override changes what window.devicePixelRatio reports;
+# games size their canvas by it, so a lower ratio means fewer pixels drawn.
+# A resize event makes the game pick the new value up.
+_RENDER_JS = """
+(function(){
+if(window.__ftRender){return;}
+var nativeRaf=window.requestAnimationFrame.bind(window);
+var nativeCancel=window.cancelAnimationFrame.bind(window);
+var ratioProperty=Object.getOwnPropertyDescriptor(window,'devicePixelRatio')
+||Object.getOwnPropertyDescriptor(Window.prototype,'devicePixelRatio');
+var interval=0,pixelRatio=0,last=0,waiting=false,nextId=1e9,queue=new Map();
+function flush(now){
+waiting=false;last=now;
+var callbacks=queue;queue=new Map();
+callbacks.forEach(function(callback){
+try{callback(now);}catch(e){setTimeout(function(){throw e;});}
+});
+}
+function wait(){
+waiting=true;
+setTimeout(function(){nativeRaf(flush);},Math.max(0,interval-(performance.now()-last)));
+}
+window.requestAnimationFrame=function(callback){
+if(!interval){return nativeRaf(callback);}
+var id=++nextId;
+queue.set(id,callback);
+if(!waiting){wait();}
+return id;
+};
+window.cancelAnimationFrame=function(id){
+if(!queue.delete(id)){nativeCancel(id);}
+};
+if(ratioProperty&&ratioProperty.get){
+Object.defineProperty(window,'devicePixelRatio',{configurable:true,
+get:function(){return pixelRatio||ratioProperty.get.call(window);}});
+}
+window.__ftRender={
+set:function(fps,ratio){
+interval=fps>0?1000/fps:0;
+if(!interval&&queue.size){
+// Hand frames still waiting for the cap back to the browser
+var callbacks=queue;queue=new Map();
+callbacks.forEach(function(callback){nativeRaf(callback);});
+}
+if(ratio!==pixelRatio){pixelRatio=ratio;window.dispatchEvent(new Event('resize'));}
+}
+};
+})();
+"""
+
+
+def install_render_throttle(page: QWebEnginePage):
+    """Inject the frame rate and pixel ratio controls into every document the page creates."""
+    scripts = page.scripts()
+    if scripts.findScript(RENDER_SCRIPT_NAME).name():
+        return
+
+    script = QWebEngineScript()
+    script.setName(RENDER_SCRIPT_NAME)
+    script.setSourceCode(_RENDER_JS)
+    script.setInjectionPoint(QWebEngineScript.DocumentCreation)
+    script.setWorldId(QWebEngineScript.MainWorld)
+    script.setRunsOnSubFrames(False)
+    scripts.insert(script)
+
+
+def render_script(fps: float, pixel_ratio: Optional[float]) -> str:
+    """Return a call that caps the page's frame rate (0 lifts the cap) and overrides its
+    pixel ratio (None restores the screen's)."""
+    return f'window.__ftRender&&__ftRender.set({fps:g},{pixel_ratio or 0:g})'
+
+
+class _TabRender:
+    __slots__ = ('view', 'throttled', 'changed_at', 'cpu_s', 'sampled_at', 'cpu_percent')
+
+    def __init__(self):
+        self.view = None
+        self.throttled: Optional[bool] = None
+        self.changed_at = 0.0
+        self.cpu_s: Optional[float] = None
+        self.sampled_at = 0.0
+        self.cpu_percent: Dict[bool, Optional[float]] = {False: None, True: None}
+
+
+class RenderThrottle(QObject):
+    """Gives tabs other than the current one a render budget: a frame rate cap, optionally a
+    lower pixel ratio, and muted audio.
+
+    update() applies the budget to every loaded tab except the current one,
+    and lifts it from the current one; call it when the current tab
+    changes. Pages that load a new document get their budget again once
+    loaded.
+
+    Chromium already stops drawing in-process tabs that are hidden behind
+    the current one, so for those the budget mostly mutes them. Clients in
+    worker processes keep their own windows on screen and draw at full
+    rate, so that is where the cap saves CPU: their budget is sent to the
+    worker, which applies it with its own RenderThrottle and reports back
+    its figures in its status messages.
+
+    Every ``sample_s`` seconds each in-process tab's renderer CPU is
+    sampled; intervals spent wholly throttled or wholly unthrottled give
+    the CPU figures of report(). Chromium may host several tabs in one
+    renderer, in which case they report the same figure.
+    """
+
+    def __init__(self, sessions: Callable[[], Iterable['TabSession']],
+                 current_session: Callable[[], Optional['TabSession']],
+                 fps: float = RENDER_THROTTLE_FPS,
+                 pixel_ratio: Optional[float] = RENDER_THROTTLE_PIXEL_RATIO,
+                 mute: bool = RENDER_THROTTLE_MUTE, sample_s: float = RENDER_CPU_SAMPLE_S,
+                 parent=None):
+        super().__init__(parent)
+        self.sessions = sessions
+        self.current_session = current_session
+        self.fps = fps
+        self.pixel_ratio = pixel_ratio
+        self.mute = mute
+        self._tabs: Dict[int, _TabRender] = {}
+        self._remote: Dict[int, bool] = {}  # Session id -> budget last sent to its worker
+
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self.sample)
+        self._timer.start(int(sample_s * 1000))
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.fps or self.pixel_ratio or self.mute)
+
+    def update(self):
+        """Throttle every loaded tab except the current one."""
+        current = self.current_session()
+        live = set()
+        for session in self.sessions():
+            throttled = self.enabled and session is not current
+            if session.is_remote:
+                live.add(session.id)
+                if throttled != self._remote.get(session.id):
+                    session.set_render_budget(throttled, self.fps, self.pixel_ratio, self.mute)
+                    self._remote[session.id] = throttled
+                continue
+            if session.web_view is None:
+                continue
+            live.add(session.id)
+            tab = self._tab(session)
+            if throttled != tab.throttled:
+                self._apply(session, throttled)
+        for session_id in set(self._tabs) - live:
+            del self._tabs[session_id]
+        for session_id in set(self._remote) - live:
+            del self._remote[session_id]
+
+    def sample(self):
+        """Measure each tab's renderer CPU since the previous sample."""
+        self.update()
+        now = time.monotonic()
+        for session in self.sessions():
+            tab = self._tabs.get(session.id)
+            if tab is None:
+                continue
+            pid = session.web_view.page().renderProcessPid()
+            usage = process_usage(pid) if pid else None
+            if usage is None:
+                tab.cpu_s = None
+                continue
+            if tab.cpu_s is not None and tab.changed_at <= tab.sampled_at < now:
+                percent = 100.0 * (usage['cpu_s'] - tab.cpu_s) / (now - tab.sampled_at)
+                tab.cpu_percent[tab.throttled] = round(percent, 1)
+            tab.cpu_s = usage['cpu_s']
+            tab.sampled_at = now
+
+    def report(self) -> List[dict]:
+        """Budget and renderer CPU of every loaded tab, throttled and not; worker clients
+        give the figures of their last status message."""
+        rows = [{
+            'session_id': session_id,
+            'throttled': bool(tab.throttled),
+            'fps_cap': self.fps if tab.throttled else None,
+            'pixel_ratio': self.pixel_ratio if tab.throttled else None,
+            'muted': bool(tab.throttled and self.mute),
+            'cpu_percent_full': tab.cpu_percent[False],
+            'cpu_percent_throttled': tab.cpu_percent[True],
+        } for session_id, tab in self._tabs.items()]
+        for session in self.sessions():
+            if session.is_remote and session.render_stats:
+                rows.append(dict(session.render_stats, session_id=session.id))
+        return rows
+
+    def _tab(self, session: 'TabSession') -> _TabRender:
+        tab = self._tabs.get(session.id)
+        if tab is None:
+            tab = self._tabs[session.id] = _TabRender()
+        if tab.view is not session.web_view:
+            tab.view = session.web_view
+            tab.throttled = None
+            # A new document starts without a budget
+            tab.view.loadFinished.connect(lambda ok, session=session: self._reapply(session))
+        return tab
+
+    def _reapply(self, session: 'TabSession'):
+        tab = self._tabs.get(session.id)
+        if tab is not None and tab.throttled:
+            self._apply(session, True)
+
+    def _apply(self, session: 'TabSession', throttled: bool):
+        tab = self._tabs[session.id]
+        page = session.web_view.page()
+        if throttled:
+            page.runJavaScript(render_script(self.fps, self.pixel_ratio))
+        else:
+            page.runJavaScript(render_script(0, None))
+        page.setAudioMuted(throttled and self.mute)
+        tab.throttled = throttled
+        tab.changed_at = time.monotonic()
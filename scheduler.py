@@ -0,0 +1,121 @@
+import heapq
+import itertools
+import math
+import time
+from typing import Dict, List, Optional, Tuple
+
+from PyQt5.QtCore import QObject, QTimer, Qt
+
+from flyff_browser.config import PRESS_COALESCE_MS
+
+
+def now_ms() -> float:
+    """Monotonic clock in milliseconds used for all press deadlines."""
+    return time.monotonic() * 1000.0
+
+
+class PressScheduler(QObject):
+    """Fires every active auto-press key, across all tabs, from a single timer.
+
+    Pending presses live in a min-heap keyed by deadline. Each simulator owns
+    at most one live entry: rescheduling or cancelling bumps its sequence
+    number and the superseded heap entry is skipped when it surfaces.
+
+    Entries due within ``coalesce_ms`` of the current tick fire together so
+    the batcher can hand them to each page in a single call.
+    """
+
+    # Rebuild the heap once stale entries outnumber live ones by this much
+    COMPACT_THRESHOLD = 64
+
+    def __init__(self, parent=None, coalesce_ms: float = PRESS_COALESCE_MS):
+        super().__init__(parent)
+        self.coalesce_ms = coalesce_ms
+        self._heap: List[Tuple[float, int, object]] = []
+        self._pending: Dict[object, int] = {}
+        self._seq = itertools.count()
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setTimerType(Qt.PreciseTimer)
+        self._timer.timeout.connect(self._fire_due)
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def is_scheduled(self, simulator) -> bool:
+        return simulator in self._pending
+
+    def schedule(self, simulator, delay_ms: float):
+        """Schedule the simulator's next press, replacing any pending one."""
+        self.schedule_at(simulator, now_ms() + max(0.0, delay_ms))
+
+    def schedule_at(self, simulator, deadline: float):
+        """Schedule the simulator's next press for an absolute now_ms() deadline.
+
+        A deadline in the past fires on the next pass of the event loop.
+        """
+        seq = next(self._seq)
+        self._pending[simulator] = seq
+        heapq.heappush(self._heap, (deadline, seq, simulator))
+        self._compact_if_needed()
+        self._arm()
+
+    def cancel(self, simulator):
+        """Drop the simulator's pending press, if any."""
+        if self._pending.pop(simulator, None) is not None:
+            self._compact_if_needed()
+            self._arm()
+
+    def next_deadline(self) -> Optional[float]:
+        self._drop_stale_head()
+        return self._heap[0][0] if self._heap else None
+
+    def _fire_due(self):
+        horizon = now_ms() + self.coalesce_ms
+        due = []
+        while self._heap and self._heap[0][0] <= horizon:
+            deadline, seq, simulator = heapq.heappop(self._heap)
+            if self._pending.get(simulator) != seq:
+                continue
+            del self._pending[simulator]
+            due.append((simulator, deadline))
+
+        # Fire after draining so a simulator rescheduling itself with a zero
+        # delay cannot keep this loop spinning
+        for simulator, deadline in due:
+            simulator.fire(deadline)
+
+        self._arm()
+
+    def _arm(self):
+        deadline = self.next_deadline()
+        if deadline is None:
+            self._timer.stop()
+            return
+        self._timer.start(max(0, math.ceil(deadline - now_ms())))
+
+    def _drop_stale_head(self):
+        while self._heap:
+            _, seq, simulator = self._heap[0]
+            if self._pending.get(simulator) == seq:
+                return
+            heapq.heappop(self._heap)
+
+    def _compact_if_needed(self):
+        stale = len(self._heap) - len(self._pending)
+        if stale > self.COMPACT_THRESHOLD and stale > len(self._pending):
+            self._heap = [entry for entry in self._heap
+                          if self._pending.get(entry[2]) == entry[1]]
+            heapq.heapify(self._heap)
+
+
+_shared_scheduler: Optional[PressScheduler] = None
+
+
+def shared_scheduler() -> PressScheduler:
+    """Return the process-wide scheduler, creating it on first use."""
+    global _shared_scheduler
+    if _shared_scheduler is None:
+        _shared_scheduler = PressScheduler()
+    return _shared_scheduler
@@ -0,0 +1,340 @@
+import itertools
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from PyQt5.QtCore import QUrl
+from PyQt5.QtWidgets import QVBoxLayout, QWidget
+from PyQt5.QtWebEngineWidgets import QWebEngineView
+
+from flyff_browser.config import DEFAULT_ACCOUNT, GAME_URL, KEY_TABLE, get_key_config
+from flyff_browser.dispatcher import (RECORDED_SCRIPT, SEQUENCE_STATS_SCRIPT, press_at_script,
+                                      record_script, sequence_script, stop_sequence_script)
+from flyff_browser.key_simulator import KeyPressSimulator
+from flyff_browser.macros import Macro, MacroPlayer
+from flyff_browser.stats import PressStats, sequence_summary
+from flyff_browser.watcher import Region, check_watch
+
+# A sequence step: key label and seconds to wait after the previous step
+SequenceStep = Tuple[str, float]
+
+
+def check_sequence_steps(steps: List[SequenceStep]):
+    """Raise ValueError unless steps is a non-empty list of known keys."""
+    if not steps:
+        raise ValueError("A sequence needs at least one step")
+    for key, delay in steps:
+        if key not in KEY_TABLE:
+            raise ValueError(f"Invalid key: {key}")
+        if delay < 0:
+            raise ValueError(f"Negative delay before {key}")
+
+
+class TabSession:
+    """One game client: its web view plus the keys, simulators and stats that drive it.
+
+    Sessions and their keys are addressed by ids that never change, so closing
+    or moving other tabs cannot hand one client's simulators to another.
+
+    Sequences (ordered key combos) are handed to the page as a whole and
+    timed there; the session only starts, replaces and stops them and polls
+    their counters.
+
+    Region watches (press a key when a bar on screen runs low) are only
+    settings here; the window's RegionWatcher samples and acts on them.
+
+    Macros are recorded by the page from real key input and collected by
+    poll_recording(); a page that loads a new document mid-recording loses
+    what was pressed since the last poll. Playback goes through the same
+    scheduler and batcher as the keys.
+
+    A session may start without a web view, given ``create_view`` instead:
+    its tab then shows an empty container until load() creates the view and
+    opens ``url``. Restored tabs use this so only the ones in use pay for a
+    renderer.
+    """
+
+    _ids = itertools.count(1)
+
+    # Clients driven from another process use RemoteTabSession instead
+    is_remote = False
+
+    def __init__(self, web_view: Optional[QWebEngineView] = None, account: str = DEFAULT_ACCOUNT,
+                 url: str = GAME_URL,
+                 create_view: Optional[Callable[[str], QWebEngineView]] = None):
+        self.id = next(TabSession._ids)
+        self.web_view = web_view
+        self.account = account
+        self.url = url
+        self.broadcast_target = True  # Receives broadcast presses
+        self._create_view = create_view
+        if web_view is None:
+            self._container = QWidget()
+            layout = QVBoxLayout(self._container)
+            layout.setContentsMargins(0, 0, 0, 0)
+        else:
+            self._container = web_view
+            web_view.loadFinished.connect(self._restart_sequences)
+        self.key_configs: Dict[int, dict] = {}  # Key id -> key settings, in creation order
+        self.simulators: Dict[int, KeyPressSimulator] = {}
+        self._key_ids = itertools.count(1)
+        self.sequence_configs: Dict[int, dict] = {}  # Sequence id -> steps, repeat, active
+        self.sequence_stats: Dict[int, dict] = {}
+        self._sequence_ids = itertools.count(1)
+        self.watch_configs: Dict[int, dict] = {}  # Watch id -> region, channel, threshold, key, active
+        self.watch_stats: Dict[int, dict] = {}  # Filled in by the RegionWatcher
+        self._watch_ids = itertools.count(1)
+        self.is_recording = False
+        self._recorded: List[float] = []  # Flat press list from the page, see Macro.from_events
+        self.macro_player: Optional[MacroPlayer] = None
+
+    @property
+    def widget(self) -> QWidget:
+        """The widget shown in this session's tab."""
+        return self._container
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.web_view is not None
+
+    def load(self):
+        """Create the web view and open the session's URL, unless already done."""
+        if self.web_view is not None:
+            return
+        self.web_view = self._create_view(self.account)
+        self.web_view.loadFinished.connect(self._restart_sequences)
+        self._container.layout().addWidget(self.web_view)
+        self.web_view.setUrl(QUrl(self.url))
+        for simulator in self.simulators.values():
+            simulator.web_view = self.web_view
+        if self.macro_player:
+            self.macro_player.web_view = self.web_view
+
+    def add_key(self, key: str, min_interval: float, max_interval: float,
+                distribution: str = 'uniform') -> int:
+        """Add an inactive key and return its id."""
+        key_id = next(self._key_ids)
+        self.key_configs[key_id] = {
+            'key': key,
+            'min_interval': min_interval,
+            'max_interval': max_interval,
+            'distribution': distribution,
+            'active': False,
+        }
+        self.simulators[key_id] = KeyPressSimulator(self.web_view)
+        return key_id
+
+    def remove_key(self, key_id: int):
+        simulator = self.simulators.pop(key_id, None)
+        if simulator:
+            simulator.stop()
+        self.key_configs.pop(key_id, None)
+
+    def update_key(self, key_id: int, key: str, min_interval: float, max_interval: float,
+                   distribution: str = 'uniform'):
+        config = self.key_configs[key_id]
+        config['key'] = key
+        config['min_interval'] = min_interval
+        config['max_interval'] = max_interval
+        config['distribution'] = distribution
+
+    def set_key_active(self, key_id: int, active: bool):
+        """Start or stop pressing a key with its current settings."""
+        config = self.key_configs[key_id]
+        config['active'] = active
+        simulator = self.simulators[key_id]
+        if active:
+            self.load()
+            key_config = get_key_config(config['key'])
+            key_config.min_interval = config['min_interval']
+            key_config.max_interval = config['max_interval']
+            key_config.distribution = config['distribution']
+            simulator.start(key_config)
+        else:
+            simulator.stop()
+
+    def active_key_count(self) -> int:
+        return sum(1 for simulator in self.simulators.values() if simulator.is_active)
+
+    def key_summary(self, key_id: int) -> Optional[dict]:
+        """Timing summary of a key, or None before its first press."""
+        simulator = self.simulators.get(key_id)
+        if simulator and simulator.stats.count:
+            return simulator.stats.summary()
+        return None
+
+    def press_count(self, key_id: int) -> int:
+        """Presses of a key so far; cheap, unlike key_summary()."""
+        simulator = self.simulators.get(key_id)
+        return simulator.stats.count if simulator else 0
+
+    def stats_entries(self) -> Iterator[Tuple[int, str, PressStats]]:
+        """Yield (key id, key, stats) for every key of this client."""
+        for key_id, simulator in self.simulators.items():
+            yield key_id, self.key_configs[key_id]['key'], simulator.stats
+
+    def press_once(self, key_index: int, callback: Callable[[Optional[float]], None]):
+        """Press a key outside any simulator; callback gets the epoch ms of the keydown."""
+        self.web_view.page().runJavaScript(press_at_script(key_index), callback)
+
+    def add_sequence(self, steps: List[SequenceStep], repeat_s: float) -> int:
+        """Add an inactive sequence and return its id; repeat_s of 0 runs it once."""
+        check_sequence_steps(steps)
+        sequence_id = next(self._sequence_ids)
+        self.sequence_configs[sequence_id] = {
+            'steps': [list(step) for step in steps],
+            'repeat_s': repeat_s,
+            'active': False,
+        }
+        return sequence_id
+
+    def update_sequence(self, sequence_id: int, steps: List[SequenceStep], repeat_s: float):
+        """Change a sequence; a running one is swapped in the page without stopping."""
+        check_sequence_steps(steps)
+        config = self.sequence_configs[sequence_id]
+        config['steps'] = [list(step) for step in steps]
+        config['repeat_s'] = repeat_s
+        if config['active']:
+            self._start_sequence(sequence_id)
+
+    def remove_sequence(self, sequence_id: int):
+        config = self.sequence_configs.pop(sequence_id, None)
+        self.sequence_stats.pop(sequence_id, None)
+        if config and config['active'] and self.web_view is not None:
+            self.web_view.page().runJavaScript(stop_sequence_script(sequence_id))
+
+    def set_sequence_active(self, sequence_id: int, active: bool):
+        """Start a sequence from its first step, or stop it."""
+        config = self.sequence_configs[sequence_id]
+        config['active'] = active
+        if active:
+            self.load()
+            self._start_sequence(sequence_id)
+        elif self.web_view is not None:
+            self.web_view.page().runJavaScript(stop_sequence_script(sequence_id))
+
+    def active_sequence_count(self) -> int:
+        return sum(1 for config in self.sequence_configs.values() if config['active'])
+
+    def sequence_summary(self, sequence_id: int) -> Optional[dict]:
+        """Counters of a sequence as of the last poll_sequences(), or None before that."""
+        return self.sequence_stats.get(sequence_id)
+
+    def poll_sequences(self):
+        """Fetch the counters of this page's sequences; they arrive asynchronously."""
+        if self.web_view is not None and self.sequence_configs:
+            self.web_view.page().runJavaScript(SEQUENCE_STATS_SCRIPT, self._handle_sequence_stats)
+
+    def add_watch(self, region: Region, channel: str, threshold: float, key: str) -> int:
+        """Add an inactive region watch and return its id; see RegionWatcher."""
+        check_watch(region, channel, threshold, key)
+        watch_id = next(self._watch_ids)
+        self.watch_configs[watch_id] = {
+            'region': list(region),
+            'channel': channel,
+            'threshold': threshold,
+            'key': key,
+            'active': False,
+        }
+        return watch_id
+
+    def update_watch(self, watch_id: int, region: Region, channel: str, threshold: float, key: str):
+        check_watch(region, channel, threshold, key)
+        config = self.watch_configs[watch_id]
+        config['region'] = list(region)
+        config['channel'] = channel
+        config['threshold'] = threshold
+        config['key'] = key
+
+    def remove_watch(self, watch_id: int):
+        self.watch_configs.pop(watch_id, None)
+        self.watch_stats.pop(watch_id, None)
+
+    def set_watch_active(self, watch_id: int, active: bool):
+        """Start or stop checking a watch; its tab's page is loaded first."""
+        if active:
+            self.load()
+        self.watch_configs[watch_id]['active'] = active
+
+    def active_watch_count(self) -> int:
+        return sum(1 for config in self.watch_configs.values() if config['active'])
+
+    def watch_summary(self, watch_id: int) -> Optional[dict]:
+        """Latest level and press count of a watch, or None before its first frame."""
+        return self.watch_stats.get(watch_id)
+
+    def start_recording(self):
+        """Record the keys pressed in this tab from now on."""
+        self.load()
+        self.is_recording = True
+        self._recorded = []
+        self.web_view.page().runJavaScript(record_script(True))
+
+    def poll_recording(self):
+        """Collect the presses recorded so far; they arrive asynchronously."""
+        if self.is_recording:
+            self.web_view.page().runJavaScript(RECORDED_SCRIPT, self._handle_recorded)
+
+    def stop_recording(self, callback: Callable[[Macro], None]):
+        """Stop recording; callback gets everything recorded as a Macro."""
+        if not self.is_recording:
+            callback(Macro())
+            return
+        self.is_recording = False
+        page = self.web_view.page()
+
+        def finish(result):
+            self._handle_recorded(result)
+            recorded, self._recorded = self._recorded, []
+            callback(Macro.from_events(recorded))
+
+        page.runJavaScript(RECORDED_SCRIPT, finish)
+        page.runJavaScript(record_script(False))
+
+    def play_macro(self, macro: Macro, loop: bool = False, start_at: Optional[float] = None):
+        """Play a macro in this tab, starting at start_at (a now_ms() time) if given."""
+        self.load()
+        if self.macro_player is None:
+            self.macro_player = MacroPlayer(self.web_view)
+        self.macro_player.start(macro, loop, start_at)
+
+    def stop_macro(self):
+        if self.macro_player:
+            self.macro_player.stop()
+
+    @property
+    def is_playing(self) -> bool:
+        return bool(self.macro_player and self.macro_player.is_active)
+
+    def macro_summary(self) -> Optional[dict]:
+        """Progress and timing of the last macro played here, or None if there was none."""
+        return self.macro_player.summary() if self.macro_player else None
+
+    def close(self):
+        """Stop every key and macro; the caller disposes of the web view."""
+        for simulator in self.simulators.values():
+            simulator.stop()
+        self.stop_macro()
+
+    def _start_sequence(self, sequence_id: int):
+        config = self.sequence_configs[sequence_id]
+        steps = [(KEY_TABLE[key].index, round(delay * 1000)) for key, delay in config['steps']]
+        self.web_view.page().runJavaScript(
+            sequence_script(sequence_id, steps, round(config['repeat_s'] * 1000)))
+
+    def _restart_sequences(self, ok: bool):
+        # A new document has a fresh dispatcher without our sequences or recorder
+        for sequence_id, config in self.sequence_configs.items():
+            if config['active']:
+                self._start_sequence(sequence_id)
+        if self.is_recording:
+            self.web_view.page().runJavaScript(record_script(True))
+
+    def _handle_recorded(self, result):
+        if isinstance(result, list):
+            self._recorded.extend(result)
+
+    def _handle_sequence_stats(self, result):
+        if not isinstance(result, dict):
+            return
+        for sequence_id, raw in result.items():
+            if int(sequence_id) in self.sequence_configs:
+                self.sequence_stats[int(sequence_id)] = sequence_summary(raw)
@@ -0,0 +1,146 @@
+import json
+import os
+import tempfile
+from typing import Iterable, Optional, Tuple
+
+from PyQt5.QtCore import QStandardPaths
+
+from flyff_browser.config import KEY_TABLE
+from flyff_browser.intervals import DISTRIBUTIONS
+from flyff_browser.session import check_sequence_steps
+from flyff_browser.watcher import check_watch
+
+SESSION_FILE_VERSION = 1
+
+
+def session_state(session) -> dict:
+    """Compact saved form of one tab: account, start URL, whether it receives broadcasts,
+    keys as [key, min, max, active, distribution], sequences as [steps, repeat, active]
+    and region watches as [region, channel, threshold, key, active]."""
+    return {
+        'account': session.account,
+        'url': session.url,
+        'broadcast': session.broadcast_target,
+        'keys': [
+            [config['key'], config['min_interval'], config['max_interval'], config['active'],
+             config['distribution']]
+            for config in session.key_configs.values()
+        ],
+        'sequences': [
+            [config['steps'], config['repeat_s'], config['active']]
+            for config in session.sequence_configs.values()
+        ],
+        'watches': [
+            [config['region'], config['channel'], config['threshold'], config['key'],
+             config['active']]
+            for config in session.watch_configs.values()
+        ],
+    }
+
+
+def parse_session_state(state: dict, strict: bool = False) -> Tuple[list, list, list]:
+    """Check the keys, sequences and watches of a session_state() dict.
+
+    Returns them as (key, min, max, distribution, active), (steps, repeat,
+    active) and (region, channel, threshold, key, active) tuples. Entries
+    this version cannot use, e.g. keys saved by a version with a different
+    key list, are left out; with strict=True the first one raises ValueError.
+    """
+    keys, sequences, watches = [], [], []
+    for entry in state.get('keys', []):
+        try:
+            key, min_interval, max_interval, active, *rest = entry
+            distribution = rest[0] if rest else 'uniform'
+            if key not in KEY_TABLE:
+                raise ValueError(f"Invalid key: {key}")
+            if distribution not in DISTRIBUTIONS:
+                raise ValueError(f"Invalid distribution: {distribution}")
+            keys.append((key, float(min_interval), float(max_interval), distribution, active))
+        except (TypeError, ValueError) as error:
+            if strict:
+                raise ValueError(f"Invalid key entry {entry!r}: {error}") from None
+    for entry in state.get('sequences', []):
+        try:
+            steps, repeat_s, active = entry
+            check_sequence_steps(steps)
+            sequences.append((steps, float(repeat_s), active))
+        except (TypeError, ValueError) as error:
+            if strict:
+                raise ValueError(f"Invalid sequence entry {entry!r}: {error}") from None
+    for entry in state.get('watches', []):
+        try:
+            region, channel, threshold, key, active = entry
+            check_watch(region, channel, threshold, key)
+            watches.append((region, channel, threshold, key, active))
+        except (TypeError, ValueError) as error:
+            if strict:
+                raise ValueError(f"Invalid watch entry {entry!r}: {error}") from None
+    return keys, sequences, watches
+
+
+def apply_session_state(session, state: dict, strict: bool = False):
+    """Add the keys, sequences and watches of a session_state() dict to a session and
+    start the active ones; see parse_session_state() for what is skipped."""
+    keys, sequences, watches = parse_session_state(state, strict)
+    session.broadcast_target = state.get('broadcast', session.broadcast_target)
+    for key, min_interval, max_interval, distribution, active in keys:
+        key_id = session.add_key(key, min_interval, max_interval, distribution)
+        if active:
+            session.set_key_active(key_id, True)
+    for steps, repeat_s, active in sequences:
+        sequence_id = session.add_sequence(steps, repeat_s)
+        if active:
+            session.set_sequence_active(sequence_id, True)
+    for region, channel, threshold, key, active in watches:
+        watch_id = session.add_watch(region, channel, threshold, key)
+        if active:
+            session.set_watch_active(watch_id, True)
+
+
+class SessionStore:
+    """Saves the tab layout to disk and reads it back on the next start.
+
+    Writes go to a temporary file in the same directory which then replaces
+    the old file, so a crash mid-write never leaves a truncated session.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        if path is None:
+            data_root = QStandardPaths.writableLocation(QStandardPaths.AppDataLocation)
+            path = os.path.join(data_root, 'sessions.json')
+        self.path = path
+
+    def load(self) -> Optional[dict]:
+        """Return the saved state, or None if there is none or it cannot be read."""
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(state, dict) or state.get('version') != SESSION_FILE_VERSION:
+            return None
+        return state
+
+    def save(self, sessions: Iterable, current: int):
+        """Atomically write the given sessions, in tab order, and the current tab index."""
+        state = {
+            'version': SESSION_FILE_VERSION,
+            'current': current,
+            'tabs': [session_state(session) for session in sessions],
+        }
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(prefix='.sessions-', suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(state, f, separators=(',', ':'))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
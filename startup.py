@@ -0,0 +1,90 @@
+import json
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from flyff_browser.procinfo import process_start_time
+
+# The steps compared from run to run in the startup history
+HISTORY_STEPS = ('window painted', 'first page paint')
+
+
+class StartupTrace:
+    """Named timestamps of the steps between process start and the first game frame.
+
+    Times are milliseconds since the trace was created, which is the first
+    thing main.py does. The process start (before the Python interpreter and,
+    for a bundled exe, its unpacking) is reported as a negative offset when
+    the OS exposes it.
+    """
+
+    def __init__(self):
+        self._start = time.perf_counter()
+        self._wall_start = time.time()
+        self.marks: List[Tuple[str, float]] = []
+        self.finished = False
+
+    def mark(self, name: str, wall_time: Optional[float] = None):
+        """Record that a step just completed, or completed at the given epoch time.
+
+        Only the first mark of a name is kept: running main.py with -m
+        executes the module twice, and the second pass must not count.
+        """
+        if self.finished or any(existing == name for existing, _ in self.marks):
+            return
+        if wall_time is None:
+            at = (time.perf_counter() - self._start) * 1000
+        else:
+            at = (wall_time - self._wall_start) * 1000
+        self.marks.append((name, at))
+
+    def elapsed_ms(self, name: str) -> Optional[float]:
+        for existing, at in self.marks:
+            if existing == name:
+                return at
+        return None
+
+    def report(self) -> dict:
+        """Every step with its time since trace start and since the step before it."""
+        started = process_start_time()
+        steps = []
+        previous = 0.0
+        for name, at in sorted(self.marks, key=lambda mark: mark[1]):
+            steps.append({'step': name, 'at_ms': round(at, 1), 'delta_ms': round(at - previous, 1)})
+            previous = at
+        return {
+            'started_at': self._wall_start,
+            'process_start_ms': None if started is None else round((started - self._wall_start) * 1000, 1),
+            'steps': steps,
+        }
+
+    def finish(self, report_path: Optional[str] = None, history_path: Optional[str] = None) -> dict:
+        """Stop recording, write the full report and append this run to the history file."""
+        self.finished = True
+        report = self.report()
+        if report_path:
+            with open(report_path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+        if history_path:
+            entry: Dict[str, object] = {
+                'started_at': report['started_at'],
+                'process_start_ms': report['process_start_ms'],
+            }
+            for name in HISTORY_STEPS:
+                at = self.elapsed_ms(name)
+                entry[name] = None if at is None else round(at, 1)
+            os.makedirs(os.path.dirname(history_path) or '.', exist_ok=True)
+            with open(history_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, separators=(',', ':')) + '\n')
+        return report
+
+
+_trace: Optional[StartupTrace] = None
+
+
+def startup_trace() -> StartupTrace:
+    """The trace of this process's startup, created on first use."""
+    global _trace
+    if _trace is None:
+        _trace = StartupTrace()
+    return _trace
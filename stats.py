@@ -0,0 +1,225 @@
+import csv
+import json
+import math
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+HISTOGRAM_BOUNDS_MS: Tuple[float, ...] = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+CSV_FIELDS = ['label', 'seq', 'scheduled_ms', 'fired_ms', 'result_ms', 'lag_ms', 'rtt_ms']
+
+
+class PressStats:
+    """Per-key press timing kept in fixed-size ring buffers.
+
+    For every press three monotonic timestamps are stored: the deadline the
+    scheduler planned, when the timer actually fired, and when the page
+    answered the runJavaScript call. Lag (fired - scheduled) measures the Qt
+    event loop, round trip (result - fired) measures the renderer.
+    """
+
+    __slots__ = ('capacity', 'count', 'dropped', 'scheduled', 'fired', 'result',
+                 'lag_histogram', 'rtt_histogram')
+
+    def __init__(self, capacity: int = 1024):
+        self.capacity = capacity
+        self.count = 0
+        self.dropped = 0  # Presses skipped because their deadline passed during a stall
+        self.scheduled = array('d', [0.0]) * capacity
+        self.fired = array('d', [0.0]) * capacity
+        self.result = array('d', [math.nan]) * capacity
+        self.lag_histogram = array('L', [0]) * (len(HISTOGRAM_BOUNDS_MS) + 1)
+        self.rtt_histogram = array('L', [0]) * (len(HISTOGRAM_BOUNDS_MS) + 1)
+
+    def record_fire(self, scheduled_ms: float, fired_ms: float) -> int:
+        """Record a fired press and return its sequence number."""
+        seq = self.count
+        slot = seq % self.capacity
+        self.scheduled[slot] = scheduled_ms
+        self.fired[slot] = fired_ms
+        self.result[slot] = math.nan
+        self.count += 1
+        self.lag_histogram[bisect_left(HISTOGRAM_BOUNDS_MS, abs(fired_ms - scheduled_ms))] += 1
+        return seq
+
+    def record_result(self, seq: int, result_ms: float):
+        """Record when the page answered the press with the given sequence number."""
+        if self.count - seq > self.capacity:
+            return  # Overwritten by newer presses already
+        slot = seq % self.capacity
+        self.result[slot] = result_ms
+        self.rtt_histogram[bisect_left(HISTOGRAM_BOUNDS_MS, result_ms - self.fired[slot])] += 1
+
+    @classmethod
+    def from_samples(cls, samples: Iterable[Tuple[int, float, float, float]],
+                     capacity: int = 1024) -> 'PressStats':
+        """Rebuild stats from (seq, scheduled, fired, result) tuples, e.g. sent by a worker process."""
+        stats = cls(capacity)
+        for _, scheduled, fired, result in samples:
+            seq = stats.record_fire(scheduled, fired)
+            if not math.isnan(result):
+                stats.record_result(seq, result)
+        return stats
+
+    def clear(self):
+        self.count = 0
+        self.dropped = 0
+        for histogram in (self.lag_histogram, self.rtt_histogram):
+            for i in range(len(histogram)):
+                histogram[i] = 0
+
+    def samples(self) -> Iterator[Tuple[int, float, float, float]]:
+        """Yield (seq, scheduled, fired, result) for the presses still buffered, oldest first."""
+        first = max(0, self.count - self.capacity)
+        for seq in range(first, self.count):
+            slot = seq % self.capacity
+            yield seq, self.scheduled[slot], self.fired[slot], self.result[slot]
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        """Count plus median, p95 and max of lag and round trip over the buffered presses."""
+        lags = []
+        rtts = []
+        for _, scheduled, fired, result in self.samples():
+            lags.append(fired - scheduled)
+            if not math.isnan(result):
+                rtts.append(result - fired)
+
+        summary: Dict[str, Optional[float]] = {'count': self.count, 'dropped': self.dropped}
+        for name, values in (('lag', lags), ('rtt', rtts)):
+            values.sort()
+            summary[f'{name}_p50'] = percentile(values, 0.50)
+            summary[f'{name}_p95'] = percentile(values, 0.95)
+            summary[f'{name}_max'] = values[-1] if values else None
+        return summary
+
+
+def percentile(sorted_values: List[float], fraction: float,
+               digits: Optional[int] = None) -> Optional[float]:
+    """Nearest-rank percentile of already sorted values, rounded to digits if given."""
+    if not sorted_values:
+        return None
+    value = sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+    return value if digits is None else round(value, digits)
+
+
+def format_summary(summary: Dict[str, Optional[float]]) -> str:
+    """Compact rendering of a summary for the controls panel."""
+    def ms(value):
+        return '-' if value is None else f'{value:.0f}'
+    presses = f"Presses: {summary['count']}"
+    if summary.get('dropped'):
+        presses += f" ({summary['dropped']} dropped)"
+    return (f"{presses}\n"
+            f"Lag p50/p95: {ms(summary['lag_p50'])}/{ms(summary['lag_p95'])} ms\n"
+            f"RTT p50/p95: {ms(summary['rtt_p50'])}/{ms(summary['rtt_p95'])} ms")
+
+
+def sequence_summary(raw) -> Dict[str, float]:
+    """Turn the page's [runs, steps, max late, mean late, skipped, running] list into a summary."""
+    runs, steps, late_max, late_mean, skipped, running = raw
+    return {
+        'runs': runs,
+        'steps': steps,
+        'late_max_ms': round(late_max, 1),
+        'late_mean_ms': round(late_mean, 1),
+        'skipped': skipped,
+        'running': bool(running),
+    }
+
+
+def format_sequence_summary(summary: Optional[Dict[str, float]]) -> str:
+    """Compact rendering of a sequence summary for the controls panel."""
+    if not summary:
+        return 'Runs: 0\nLate mean/max: -/- ms'
+    return (f"Runs: {summary['runs']} ({summary['steps']} steps, {summary['skipped']} skipped)\n"
+            f"Late mean/max: {summary['late_mean_ms']:.0f}/{summary['late_max_ms']:.0f} ms")
+
+
+def format_watch_summary(summary: Optional[Dict[str, float]]) -> str:
+    """Compact rendering of a region watch's level and press count for the controls panel."""
+    if not summary:
+        return 'Level: -'
+    if summary.get('paused'):
+        return f"Paused: tab not shown, {summary['presses']} press(es)"
+    return f"Level: {summary['level']:.0%}, {summary['presses']} press(es)"
+
+
+def format_macro_summary(macro: Optional[dict], playing: Optional[dict] = None) -> str:
+    """Compact rendering of the loaded macro and, if given, the current tab's playback."""
+    if not macro:
+        return 'No macro recorded'
+    text = f"{macro['presses']} presses, {macro['keys']} key(s), {macro['duration_s']:.1f} s"
+    if playing:
+        state = 'Playing' if playing['playing'] else 'Stopped'
+        text += f"\n{state}: {playing['runs']} run(s), press {playing['position']}"
+        if playing.get('lag_p95') is not None:
+            text += f", lag p95 {playing['lag_p95']:.0f} ms"
+        if playing['dropped']:
+            text += f", {playing['dropped']} dropped"
+    return text
+
+
+def format_broadcast_result(result: dict) -> str:
+    """One-line rendering of a finished broadcast for the controls panel."""
+    spread = result['receive_spread_ms']
+    spread = '-' if spread is None else f'{spread:.1f}'
+    return (f"{result['received']}/{result['clients']} clients, spread {spread} ms "
+            f"(send {result['send_spread_ms']:.1f} ms)")
+
+
+def format_loop_summary(summary: Dict[str, Optional[float]]) -> str:
+    """One-line rendering of an event loop watchdog summary."""
+    def ms(value):
+        return '-' if value is None else f'{value:.0f}'
+    return (f"Loop lag p95 {ms(summary['lag_p95'])} ms, max {ms(summary['lag_max'])} ms, "
+            f"{summary['stalls']} stall(s)")
+
+
+def format_request_summary(summary: dict) -> str:
+    """One-line rendering of a request filter summary: asset cache use and blocked requests."""
+    text = f"{summary['blocked']} blocked"
+    cache = summary.get('asset_cache')
+    if cache:
+        text = (f"Assets {cache['hits'] + cache['coalesced']} hits / {cache['misses']} misses, "
+                f"{cache['bytes_saved'] / (1024 * 1024):.1f} MB saved, " + text)
+    return text
+
+
+def export_csv(path: str, entries: Iterable[Tuple[str, PressStats]]):
+    """Write one row per buffered press for each (label, stats) entry."""
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_FIELDS)
+        for label, stats in entries:
+            for seq, scheduled, fired, result in stats.samples():
+                has_result = not math.isnan(result)
+                writer.writerow([
+                    label, seq, f'{scheduled:.3f}', f'{fired:.3f}',
+                    f'{result:.3f}' if has_result else '',
+                    f'{fired - scheduled:.3f}',
+                    f'{result - fired:.3f}' if has_result else '',
+                ])
+
+
+def export_json(path: str, entries: Iterable[Tuple[str, PressStats]], extra: Optional[dict] = None):
+    """Write summaries, histograms and raw samples for each (label, stats) entry.
+
+    ``extra`` holds further report sections stored next to the keys.
+    """
+    keys = []
+    for label, stats in entries:
+        keys.append({
+            'label': label,
+            'summary': stats.summary(),
+            'histogram_bounds_ms': list(HISTOGRAM_BOUNDS_MS),
+            'lag_histogram': stats.lag_histogram.tolist(),
+            'rtt_histogram': stats.rtt_histogram.tolist(),
+            'samples': [
+                [seq, scheduled, fired, None if math.isnan(result) else result]
+                for seq, scheduled, fired, result in stats.samples()
+            ],
+        })
+    with open(path, 'w') as f:
+        json.dump(dict(extra or {}, keys=keys), f)
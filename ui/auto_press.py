@@ -1,104 +1,449 @@
 from PyQt5.QtWidgets import (QToolBar, QPushButton, QCheckBox, QLabel, 
                            QSpinBox, QWidget, QVBoxLayout, QComboBox,
-                           QGroupBox, QHBoxLayout, QScrollArea)
+                           QGroupBox, QHBoxLayout, QScrollArea, QFileDialog,
+                           QDoubleSpinBox, QListWidget, QListWidgetItem)
 from PyQt5.QtCore import Qt
 
 from flyff_browser.config import AVAILABLE_KEYS
+from flyff_browser.stats import (format_broadcast_result, format_macro_summary,
+                                 format_sequence_summary, format_watch_summary)
+from flyff_browser.ui.key_table import KeyTableModel, KeyTableView
+from flyff_browser.watcher import CHANNELS
+
+REMOVE_BUTTON_STYLE = """
+    QPushButton {
+        border: none;
+        background-color: transparent;
+        color: #666;
+        font-weight: bold;
+    }
+    QPushButton:hover {
+        color: #ff0000;
+    }
+"""
+
+
+def _remove_button(on_click) -> QPushButton:
+    remove_btn = QPushButton('×')
+    remove_btn.setFixedWidth(20)
+    remove_btn.setFixedHeight(20)
+    remove_btn.setStyleSheet(REMOVE_BUTTON_STYLE)
+    remove_btn.clicked.connect(lambda: on_click())
+    return remove_btn
+
+
+def _key_combo() -> QComboBox:
+    combo = QComboBox()
+    for key_def in AVAILABLE_KEYS:
+        combo.addItem(key_def.label)
+    combo.setMaxVisibleItems(20)
+    return combo
+
+
+def _add_title_bar(control: QGroupBox):
+    """Replace a control's group box title with a label and its remove button."""
+    # Create a widget to hold the title and remove button
+    title_widget = QWidget()
+    title_layout = QHBoxLayout()
+    title_layout.setContentsMargins(0, 0, 0, 0)
+    title_layout.setSpacing(2)
+
+    # Add the title text
+    control.title_label = QLabel(control.title())
+    title_layout.addWidget(control.title_label)
+
+    # Add the remove button
+    title_layout.addWidget(_remove_button(control.on_remove))
+
+    title_widget.setLayout(title_layout)
+    control.setTitle("")  # Clear the default title
+    control.layout().insertWidget(0, title_widget)  # Add at the top of the layout
+
+
+class SequenceStepRow(QWidget):
+    """One step of a sequence: the key and the delay after the previous step."""
+
+    def __init__(self, key: str = '1', delay_s: float = 0.0, on_remove=None, parent=None):
+        super().__init__(parent)
+        layout = QHBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.setSpacing(4)
+
+        self.key_combo = _key_combo()
+        self.key_combo.setCurrentText(key)
+        layout.addWidget(self.key_combo)
+
+        self.delay_spin = QDoubleSpinBox()
+        self.delay_spin.setRange(0, 600)
+        self.delay_spin.setDecimals(2)
+        self.delay_spin.setSingleStep(0.1)
+        self.delay_spin.setSuffix(' s')
+        self.delay_spin.setToolTip('Wait after the previous step')
+        self.delay_spin.setValue(delay_s)
+        layout.addWidget(self.delay_spin)
+
+        if on_remove:
+            layout.addWidget(_remove_button(lambda: on_remove(self)))
+        self.setLayout(layout)
+
+
+class SequenceControl(QGroupBox):
+    """Edits a key sequence that runs inside the page, e.g. buffs 1 → 2 → 3 every 60 s."""
+
+    title_prefix = 'Sequence'
 
-class KeyPressControl(QGroupBox):
     def __init__(self, title: str, parent=None, on_remove=None):
         super().__init__(title, parent)
         self.on_remove = on_remove
-        self.setFixedHeight(180)  # Set fixed height for the control
+        self.sequence_id = None  # Id of the session sequence this control edits
+        self.on_change = None  # Called after any edit to the steps or repeat interval
+        self.title_label = None
+        self.step_rows = []
         self._setup_ui()
 
     def _setup_ui(self):
         layout = QVBoxLayout()
-        layout.setContentsMargins(10, 10, 10, 10)  # Add padding inside the group box
-        
-        # Key selection
+        layout.setContentsMargins(10, 10, 10, 10)
+
+        # Steps, in order
+        layout.addWidget(QLabel('Steps (key, delay):'))
+        self.steps_layout = QVBoxLayout()
+        self.steps_layout.setSpacing(2)
+        layout.addLayout(self.steps_layout)
+
+        add_step_btn = QPushButton('+ Step')
+        add_step_btn.clicked.connect(lambda: self.add_step())
+        layout.addWidget(add_step_btn)
+
+        # Repeat interval
+        repeat_layout = QHBoxLayout()
+        repeat_layout.addWidget(QLabel('Repeat every (s):'))
+        self.repeat_spin = QSpinBox()
+        self.repeat_spin.setRange(0, 9999)
+        self.repeat_spin.setValue(60)
+        self.repeat_spin.setSpecialValueText('Once')
+        self.repeat_spin.valueChanged.connect(lambda _: self._changed())
+        repeat_layout.addWidget(self.repeat_spin)
+        layout.addLayout(repeat_layout)
+
+        # Toggle button
+        self.toggle_btn = QPushButton('Activate')
+        self.toggle_btn.setCheckable(True)
+        self.toggle_btn.setFixedHeight(30)
+        layout.addWidget(self.toggle_btn)
+
+        # Live sequence counters from the page
+        self.stats_label = QLabel(format_sequence_summary(None))
+        self.stats_label.setStyleSheet("color: #666; font-size: 10px;")
+        layout.addWidget(self.stats_label)
+
+        self.setLayout(layout)
+        if self.on_remove:
+            _add_title_bar(self)
+
+    def add_step(self, key: str = '1', delay_s: float = 0.0):
+        row = SequenceStepRow(key, delay_s, on_remove=self.remove_step)
+        row.key_combo.currentTextChanged.connect(lambda _: self._changed())
+        row.delay_spin.valueChanged.connect(lambda _: self._changed())
+        self.step_rows.append(row)
+        self.steps_layout.addWidget(row)
+        self._changed()
+
+    def remove_step(self, row: SequenceStepRow):
+        if len(self.step_rows) > 1:  # A sequence keeps at least one step
+            self.step_rows.remove(row)
+            row.deleteLater()
+            self._changed()
+
+    def steps(self):
+        """The (key, delay in seconds) steps as currently edited."""
+        return [(row.key_combo.currentText(), row.delay_spin.value()) for row in self.step_rows]
+
+    def set_steps(self, steps):
+        for row in self.step_rows:
+            row.deleteLater()
+        self.step_rows.clear()
+        for key, delay_s in steps:
+            self.add_step(key, delay_s)
+
+    def set_title(self, title: str):
+        if self.title_label:
+            self.title_label.setText(title)
+        else:
+            self.setTitle(title)
+
+    def set_stats(self, summary):
+        self.stats_label.setText(format_sequence_summary(summary))
+
+    def _changed(self):
+        if self.on_change:
+            self.on_change()
+
+class WatchControl(QGroupBox):
+    """Edits a region watch: press a key whenever a bar on screen drops below a level."""
+
+    title_prefix = 'Watch'
+
+    def __init__(self, title: str, parent=None, on_remove=None):
+        super().__init__(title, parent)
+        self.on_remove = on_remove
+        self.watch_id = None  # Id of the session watch this control edits
+        self.on_change = None  # Called after any edit to the region, colour, level or key
+        self.title_label = None
+        self._setup_ui()
+
+    def _setup_ui(self):
+        layout = QVBoxLayout()
+        layout.setContentsMargins(10, 10, 10, 10)
+
+        # Region as percentages of the game view
+        layout.addWidget(QLabel('Region (x, y, width, height %):'))
+        region_layout = QHBoxLayout()
+        region_layout.setSpacing(2)
+        self.region_spins = []
+        for value in (1.0, 1.0, 20.0, 2.0):
+            spin = QDoubleSpinBox()
+            spin.setRange(0, 100)
+            spin.setDecimals(1)
+            spin.setValue(value)
+            spin.valueChanged.connect(lambda _: self._changed())
+            region_layout.addWidget(spin)
+            self.region_spins.append(spin)
+        layout.addLayout(region_layout)
+
+        # Bar colour and the level that triggers a press
+        bar_layout = QHBoxLayout()
+        self.channel_combo = QComboBox()
+        self.channel_combo.addItems(CHANNELS)
+        self.channel_combo.setToolTip('Colour of the bar')
+        self.channel_combo.currentTextChanged.connect(lambda _: self._changed())
+        bar_layout.addWidget(self.channel_combo)
+        bar_layout.addWidget(QLabel('below'))
+        self.threshold_spin = QSpinBox()
+        self.threshold_spin.setRange(1, 99)
+        self.threshold_spin.setValue(50)
+        self.threshold_spin.setSuffix(' %')
+        self.threshold_spin.valueChanged.connect(lambda _: self._changed())
+        bar_layout.addWidget(self.threshold_spin)
+        layout.addLayout(bar_layout)
+
+        # Key pressed while the bar is low
         key_layout = QHBoxLayout()
-        key_label = QLabel('Key:')
-        self.key_combo = QComboBox()
-        for key, _, _ in AVAILABLE_KEYS:
-            self.key_combo.addItem(key)
-        key_layout.addWidget(key_label)
+        key_layout.addWidget(QLabel('Press:'))
+        self.key_combo = _key_combo()
+        self.key_combo.currentTextChanged.connect(lambda _: self._changed())
         key_layout.addWidget(self.key_combo)
         layout.addLayout(key_layout)
 
-        # Interval controls
-        interval_layout = QHBoxLayout()
-        
-        # Min interval
-        min_layout = QVBoxLayout()
-        min_label = QLabel('Min Interval (s):')
-        self.min_spin = QSpinBox()
-        self.min_spin.setRange(1, 9999)
-        self.min_spin.setValue(3)
-        min_layout.addWidget(min_label)
-        min_layout.addWidget(self.min_spin)
-        interval_layout.addLayout(min_layout)
-
-        # Max interval
-        max_layout = QVBoxLayout()
-        max_label = QLabel('Max Interval (s):')
-        self.max_spin = QSpinBox()
-        self.max_spin.setRange(1, 9999)
-        self.max_spin.setValue(6)
-        max_layout.addWidget(max_label)
-        max_layout.addWidget(self.max_spin)
-        interval_layout.addLayout(max_layout)
-
-        layout.addLayout(interval_layout)
-
         # Toggle button
         self.toggle_btn = QPushButton('Activate')
         self.toggle_btn.setCheckable(True)
-        self.toggle_btn.setFixedHeight(30)  # Make the button taller
+        self.toggle_btn.setFixedHeight(30)
         layout.addWidget(self.toggle_btn)
 
-        self.setLayout(layout)
+        # Latest level seen by the watcher
+        self.stats_label = QLabel(format_watch_summary(None))
+        self.stats_label.setStyleSheet("color: #666; font-size: 10px;")
+        layout.addWidget(self.stats_label)
 
-        # Add remove button to title
+        self.setLayout(layout)
         if self.on_remove:
-            remove_btn = QPushButton('×')
-            remove_btn.setFixedWidth(20)
-            remove_btn.setFixedHeight(20)
-            remove_btn.setStyleSheet("""
-                QPushButton {
-                    border: none;
-                    background-color: transparent;
-                    color: #666;
-                    font-weight: bold;
-                }
-                QPushButton:hover {
-                    color: #ff0000;
-                }
-            """)
-            remove_btn.clicked.connect(self.on_remove)
-            
-            # Create a widget to hold the title and remove button
-            title_widget = QWidget()
-            title_layout = QHBoxLayout()
-            title_layout.setContentsMargins(0, 0, 0, 0)
-            title_layout.setSpacing(2)
-            
-            # Add the title text
-            title_label = QLabel(self.title())
-            title_layout.addWidget(title_label)
-            
-            # Add the remove button
-            title_layout.addWidget(remove_btn)
-            
-            title_widget.setLayout(title_layout)
-            self.setTitle("")  # Clear the default title
-            self.layout().insertWidget(0, title_widget)  # Add at the top of the layout
+            _add_title_bar(self)
+
+    def region(self):
+        """The region as (x, y, width, height) fractions of the view."""
+        return tuple(spin.value() / 100 for spin in self.region_spins)
+
+    def threshold(self) -> float:
+        return self.threshold_spin.value() / 100
+
+    def set_watch(self, region, channel: str, threshold: float, key: str):
+        """Show saved settings without reporting them as edits."""
+        on_change, self.on_change = self.on_change, None
+        for spin, value in zip(self.region_spins, region):
+            spin.setValue(value * 100)
+        self.channel_combo.setCurrentText(channel)
+        self.threshold_spin.setValue(round(threshold * 100))
+        self.key_combo.setCurrentText(key)
+        self.on_change = on_change
+
+    def set_title(self, title: str):
+        if self.title_label:
+            self.title_label.setText(title)
+        else:
+            self.setTitle(title)
+
+    def set_stats(self, summary):
+        self.stats_label.setText(format_watch_summary(summary))
+
+    def _changed(self):
+        if self.on_change:
+            self.on_change()
+
+
+class BroadcastControl(QGroupBox):
+    """Presses one key on every checked tab at once, e.g. party buffs on all clients."""
+
+    def __init__(self, hotkey: str = '', parent=None, on_broadcast=None, on_target_changed=None):
+        super().__init__('Broadcast', parent)
+        self.on_broadcast = on_broadcast
+        self.on_target_changed = on_target_changed
+        self._setup_ui(hotkey)
+
+    def _setup_ui(self, hotkey: str):
+        layout = QVBoxLayout()
+        layout.setContentsMargins(10, 10, 10, 10)
+
+        key_layout = QHBoxLayout()
+        key_layout.addWidget(QLabel('Key:'))
+        self.key_combo = _key_combo()
+        key_layout.addWidget(self.key_combo)
+        layout.addLayout(key_layout)
+
+        # Tabs that receive the press
+        self.target_list = QListWidget()
+        self.target_list.setMaximumHeight(90)
+        self.target_list.itemChanged.connect(self._target_changed)
+        layout.addWidget(self.target_list)
+
+        broadcast_btn = QPushButton(f'Broadcast ({hotkey})' if hotkey else 'Broadcast')
+        broadcast_btn.setFixedHeight(30)
+        broadcast_btn.clicked.connect(lambda: self.on_broadcast and self.on_broadcast())
+        layout.addWidget(broadcast_btn)
+
+        self.result_label = QLabel('No broadcast yet')
+        self.result_label.setStyleSheet("color: #666; font-size: 10px;")
+        self.result_label.setWordWrap(True)
+        layout.addWidget(self.result_label)
+
+        self.setLayout(layout)
+
+    def set_targets(self, targets):
+        """Show (session id, title, checked) for every tab, in tab order."""
+        self.target_list.blockSignals(True)
+        self.target_list.clear()
+        for session_id, title, checked in targets:
+            item = QListWidgetItem(title)
+            item.setData(Qt.UserRole, session_id)
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Checked if checked else Qt.Unchecked)
+            self.target_list.addItem(item)
+        self.target_list.blockSignals(False)
+
+    def set_result(self, result: dict):
+        self.result_label.setText(format_broadcast_result(result))
+
+    def _target_changed(self, item: QListWidgetItem):
+        if self.on_target_changed:
+            self.on_target_changed(item.data(Qt.UserRole), item.checkState() == Qt.Checked)
+
+
+class MacroControl(QGroupBox):
+    """Records the keys typed in the current tab and plays them back, there or on every
+    broadcast tab."""
+
+    def __init__(self, parent=None, on_record=None, on_play=None, on_save=None, on_load=None):
+        super().__init__('Macro', parent)
+        self.on_record = on_record
+        self.on_play = on_play
+        self.on_save = on_save
+        self.on_load = on_load
+        self._setup_ui()
+
+    def _setup_ui(self):
+        layout = QVBoxLayout()
+        layout.setContentsMargins(10, 10, 10, 10)
+
+        buttons = QHBoxLayout()
+        self.record_btn = QPushButton('Record')
+        self.record_btn.setCheckable(True)
+        self.record_btn.clicked.connect(self._record_clicked)
+        buttons.addWidget(self.record_btn)
+        self.play_btn = QPushButton('Play')
+        self.play_btn.setCheckable(True)
+        self.play_btn.clicked.connect(self._play_clicked)
+        buttons.addWidget(self.play_btn)
+        layout.addLayout(buttons)
+
+        options = QHBoxLayout()
+        self.loop_check = QCheckBox('Loop')
+        options.addWidget(self.loop_check)
+        # Fan out to the tabs checked in the broadcast panel
+        self.broadcast_check = QCheckBox('All broadcast tabs')
+        options.addWidget(self.broadcast_check)
+        layout.addLayout(options)
+
+        files = QHBoxLayout()
+        save_btn = QPushButton('Save...')
+        save_btn.clicked.connect(self._save_clicked)
+        files.addWidget(save_btn)
+        load_btn = QPushButton('Load...')
+        load_btn.clicked.connect(self._load_clicked)
+        files.addWidget(load_btn)
+        layout.addLayout(files)
+
+        self.stats_label = QLabel(format_macro_summary(None))
+        self.stats_label.setStyleSheet("color: #666; font-size: 10px;")
+        self.stats_label.setWordWrap(True)
+        layout.addWidget(self.stats_label)
+
+        self.setLayout(layout)
+
+    def set_recording(self, recording: bool):
+        self.record_btn.setChecked(recording)
+        self.record_btn.setText('Stop Recording' if recording else 'Record')
+
+    def set_playing(self, playing: bool):
+        self.play_btn.setChecked(playing)
+        self.play_btn.setText('Stop' if playing else 'Play')
+
+    def set_stats(self, macro, playing=None):
+        self.stats_label.setText(format_macro_summary(macro, playing))
+
+    def _record_clicked(self):
+        recording = self.record_btn.isChecked()
+        self.set_recording(recording)
+        if self.on_record:
+            self.on_record(recording)
+
+    def _play_clicked(self):
+        playing = self.play_btn.isChecked()
+        self.set_playing(playing)
+        if self.on_play:
+            self.on_play(playing)
+
+    def _save_clicked(self):
+        path, _ = QFileDialog.getSaveFileName(self, 'Save Macro', 'macro.ftm',
+                                              'Macros (*.ftm)')
+        if path and self.on_save:
+            self.on_save(path)
+
+    def _load_clicked(self):
+        path, _ = QFileDialog.getOpenFileName(self, 'Load Macro', '', 'Macros (*.ftm)')
+        if path and self.on_load:
+            self.on_load(path)
+
 
 class AutoPressControls(QToolBar):
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, on_add_key=None, on_export_stats=None, on_add_sequence=None,
+                 on_broadcast=None, on_broadcast_target=None, broadcast_hotkey='',
+                 on_add_watch=None, on_record_macro=None, on_play_macro=None,
+                 on_save_macro=None, on_load_macro=None, on_edit_key=None, on_remove_key=None):
         super().__init__(parent)
-        self.key_controls = []
-        self.setFixedWidth(225)  # Reduced from 300 to 250
+        self.on_add_key = on_add_key
+        self.on_add_sequence = on_add_sequence
+        self.on_add_watch = on_add_watch
+        self.on_export_stats = on_export_stats
+        self.broadcast_control = BroadcastControl(
+            broadcast_hotkey, on_broadcast=on_broadcast, on_target_changed=on_broadcast_target)
+        self.macro_control = MacroControl(on_record=on_record_macro, on_play=on_play_macro,
+                                          on_save=on_save_macro, on_load=on_load_macro)
+        # Every key of the current tab, as rows of one table
+        self.key_model = KeyTableModel(on_edit=on_edit_key, parent=self)
+        self.key_table = KeyTableView(self.key_model, on_remove=on_remove_key)
+        self.sequence_controls = []
+        self.watch_controls = []
+        self.setFixedWidth(300)  # Fits the key table's settings columns
         self._setup_ui()
 
     def _setup_ui(self):
@@ -124,35 +469,77 @@ class AutoPressControls(QToolBar):
         # Add button (outside scroll area)
         add_btn = QPushButton('+ Add Key')
         add_btn.setFixedHeight(30)  # Make the button taller
-        add_btn.clicked.connect(self.add_key_control)
+        add_btn.clicked.connect(self.add_key)
         main_layout.addWidget(add_btn)
+        main_layout.addWidget(self.key_table, 1)
+
+        # Sequences run in the page with their own timing
+        add_sequence_btn = QPushButton('+ Add Sequence')
+        add_sequence_btn.clicked.connect(self.add_sequence)
+        main_layout.addWidget(add_sequence_btn)
+
+        # Watches press a key when a bar on screen runs low
+        add_watch_btn = QPushButton('+ Add Watch')
+        add_watch_btn.clicked.connect(self.add_watch)
+        main_layout.addWidget(add_watch_btn)
+
+        # Export press timing stats for every tab
+        export_btn = QPushButton('Export Stats')
+        export_btn.clicked.connect(self.export_stats)
+        main_layout.addWidget(export_btn)
+
+        # One key to every selected tab; stays put when the current tab changes
+        main_layout.addWidget(self.broadcast_control)
+
+        # Recorded keys, played back on this tab or the broadcast tabs
+        main_layout.addWidget(self.macro_control)
 
         # Add scroll area
         scroll_area.setWidget(scroll_content)
-        main_layout.addWidget(scroll_area)
+        main_layout.addWidget(scroll_area, 1)
         
         # Add the main container to the toolbar
         self.addWidget(main_container)
 
-    def add_key_control(self):
-        control_id = len(self.key_controls) + 1
-        control = KeyPressControl(
-            f'Key {control_id}',
-            on_remove=lambda: self.remove_key_control(control)
-        )
-        self.key_controls.append(control)
-        self.parent().add_key_simulator(control_id)
-        self.parent().connect_key_control(control_id, control)
-        
-        # Add the control to the scroll area's layout
+    def add_key(self):
+        if self.on_add_key:
+            self.on_add_key()
+
+    def add_sequence(self):
+        if self.on_add_sequence:
+            self.on_add_sequence()
+
+    def add_watch(self):
+        if self.on_add_watch:
+            self.on_add_watch()
+
+    def export_stats(self):
+        path, _ = QFileDialog.getSaveFileName(
+            self, 'Export Press Stats', 'press_stats.csv',
+            'CSV files (*.csv);;JSON files (*.json)')
+        if path and self.on_export_stats:
+            self.on_export_stats(path)
+
+    def _controls_like(self, control):
+        if isinstance(control, SequenceControl):
+            return self.sequence_controls
+        return self.watch_controls
+
+    def add_control(self, control):
+        self._controls_like(control).append(control)
         self.layout.addWidget(control)
 
-    def remove_key_control(self, control):
-        control_id = self.key_controls.index(control) + 1
-        self.key_controls.remove(control)
-        self.parent().remove_key_simulator(control_id)
+    def remove_control(self, control):
+        controls = self._controls_like(control)
+        controls.remove(control)
         control.deleteLater()
-        
-        # Renumber remaining controls
-        for i, ctrl in enumerate(self.key_controls, 1):
-            ctrl.setTitle(f'Key {i}') 
\ No newline at end of file
+
+        # Renumber remaining controls of the same kind
+        for i, ctrl in enumerate(controls, 1):
+            ctrl.set_title(f'{ctrl.title_prefix} {i}')
+
+    def clear_controls(self):
+        for control in self.sequence_controls + self.watch_controls:
+            control.deleteLater()
+        self.sequence_controls.clear()
+        self.watch_controls.clear()
@@ -0,0 +1,272 @@
+from typing import Callable, List, Optional
+
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt
+from PyQt5.QtWidgets import (QAbstractItemView, QAction, QComboBox, QDoubleSpinBox, QHeaderView,
+                             QStyledItemDelegate, QTableView)
+
+from flyff_browser.config import AVAILABLE_KEYS
+from flyff_browser.intervals import DISTRIBUTIONS
+from flyff_browser.stats import format_summary
+
+# (header, key setting or summary entry shown, column width in px); settings come first
+COLUMNS = (
+    ('On', 'active', 28),
+    ('Key', 'key', 62),
+    ('Min s', 'min_interval', 48),
+    ('Max s', 'max_interval', 48),
+    ('Dist', 'distribution', 70),
+    ('Presses', 'count', 52),
+    ('Lag p95', 'lag_p95', 52),
+    ('RTT p95', 'rtt_p95', 52),
+)
+ACTIVE, KEY, MIN_INTERVAL, MAX_INTERVAL, DISTRIBUTION = range(5)
+FIRST_STATS_COLUMN = 5
+
+# Called with (key id, setting name, new value) when a cell is edited
+EditCallback = Callable[[int, str, object], None]
+
+
+class _Row:
+    __slots__ = ('key_id', 'count', 'summary', 'values')
+
+    def __init__(self, key_id: int):
+        self.key_id = key_id
+        self.count = -1  # Press count the summary was taken at
+        self.summary: Optional[dict] = None
+        self.values: tuple = ()  # What the cells show, one value per column
+
+
+class KeyTableModel(QAbstractTableModel):
+    """The keys of one tab, their settings and live timing stats, as table rows.
+
+    The model keeps the values its cells show. refresh() compares them
+    with the session and signals only the cells that changed, and a key's
+    summary is only recomputed once it has new presses, so refreshing
+    many idle keys costs a few comparisons each. Keys added or removed
+    elsewhere (e.g. through the control API) come and go as rows.
+
+    Edits are not applied here but handed to ``on_edit``, which updates
+    the session; the row then shows what the session holds.
+    """
+
+    def __init__(self, on_edit: Optional[EditCallback] = None, parent=None):
+        super().__init__(parent)
+        self.on_edit = on_edit
+        self.session = None
+        self._rows: List[_Row] = []
+
+    def set_session(self, session):
+        """Show the keys of another tab (or none)."""
+        self.beginResetModel()
+        self.session = session
+        self._rows = [self._new_row(key_id) for key_id in session.key_configs] if session else []
+        self.endResetModel()
+
+    def key_id(self, row: int) -> int:
+        return self._rows[row].key_id
+
+    def refresh(self):
+        """Pick up added and removed keys, then update the cells whose values changed."""
+        if self.session is None:
+            return
+        self._sync_rows()
+        for row in range(len(self._rows)):
+            self._refresh_row(row)
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return COLUMNS[section][0]
+        return str(section + 1)
+
+    def flags(self, index):
+        column = index.column()
+        if column == ACTIVE:
+            return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsUserCheckable
+        if column < FIRST_STATS_COLUMN:
+            return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsEditable
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self._rows[index.row()]
+        column = index.column()
+        value = row.values[column]
+        if column == ACTIVE:
+            if role == Qt.CheckStateRole:
+                return Qt.Checked if value else Qt.Unchecked
+            return None
+        if role == Qt.EditRole:
+            return value
+        if role == Qt.DisplayRole:
+            if value is None:
+                return '-'
+            if column in (MIN_INTERVAL, MAX_INTERVAL):
+                return f'{value:g}'
+            if column > FIRST_STATS_COLUMN:
+                return f'{value:.0f}'
+            return str(value)
+        if role == Qt.TextAlignmentRole and column not in (KEY, DISTRIBUTION):
+            return Qt.AlignRight | Qt.AlignVCenter
+        if role == Qt.ToolTipRole and column >= FIRST_STATS_COLUMN and row.summary:
+            return format_summary(row.summary)
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid():
+            return False
+        column = index.column()
+        if column == ACTIVE and role == Qt.CheckStateRole:
+            value = value == Qt.Checked
+        elif role != Qt.EditRole or column >= FIRST_STATS_COLUMN:
+            return False
+        if self.on_edit:
+            self.on_edit(self._rows[index.row()].key_id, COLUMNS[column][1], value)
+        self._refresh_row(index.row())
+        return True
+
+    def _new_row(self, key_id: int) -> _Row:
+        row = _Row(key_id)
+        self._update_row(row)
+        return row
+
+    def _update_row(self, row: _Row) -> bool:
+        """Bring a row's values up to date; True if any changed."""
+        session = self.session
+        count = session.press_count(row.key_id)
+        if count != row.count:
+            row.count = count
+            row.summary = session.key_summary(row.key_id)
+        config = session.key_configs[row.key_id]
+        summary = row.summary or {}
+        values = tuple(config[field] if column < FIRST_STATS_COLUMN else summary.get(field)
+                       for column, (_, field, _) in enumerate(COLUMNS))
+        if values == row.values:
+            return False
+        row.values = values
+        return True
+
+    def _refresh_row(self, row: int):
+        old = self._rows[row].values
+        if self._update_row(self._rows[row]):
+            new = self._rows[row].values
+            changed = [column for column in range(len(COLUMNS)) if old[column] != new[column]]
+            self.dataChanged.emit(self.index(row, changed[0]), self.index(row, changed[-1]))
+
+    def _sync_rows(self):
+        key_ids = list(self.session.key_configs)
+        if len(key_ids) == len(self._rows) and all(
+                row.key_id == key_id for row, key_id in zip(self._rows, key_ids)):
+            return
+        present = set(key_ids)
+        for row in reversed(range(len(self._rows))):
+            if self._rows[row].key_id not in present:
+                self.beginRemoveRows(QModelIndex(), row, row)
+                del self._rows[row]
+                self.endRemoveRows()
+        # New keys are appended by the session; anything else is rebuilt
+        if key_ids[:len(self._rows)] != [row.key_id for row in self._rows]:
+            self.set_session(self.session)
+            return
+        if len(key_ids) > len(self._rows):
+            self.beginInsertRows(QModelIndex(), len(self._rows), len(key_ids) - 1)
+            self._rows.extend(self._new_row(key_id) for key_id in key_ids[len(self._rows):])
+            self.endInsertRows()
+
+
+class KeyItemDelegate(QStyledItemDelegate):
+    """Inline editors: lists for the key and distribution, spin boxes for the intervals."""
+
+    def createEditor(self, parent, option, index):
+        column = index.column()
+        if column in (KEY, DISTRIBUTION):
+            editor = QComboBox(parent)
+            if column == KEY:
+                editor.addItems([key_def.label for key_def in AVAILABLE_KEYS])
+                editor.setMaxVisibleItems(20)
+            else:
+                editor.addItems(list(DISTRIBUTIONS))
+            # Apply a pick right away instead of waiting for the editor to lose focus
+            editor.activated.connect(lambda: self._commit(editor))
+            return editor
+        if column in (MIN_INTERVAL, MAX_INTERVAL):
+            # Seconds with millisecond resolution
+            editor = QDoubleSpinBox(parent)
+            editor.setRange(0.001, 9999)
+            editor.setDecimals(3)
+            editor.setSingleStep(0.1)
+            return editor
+        return super().createEditor(parent, option, index)
+
+    def setEditorData(self, editor, index):
+        value = index.data(Qt.EditRole)
+        if isinstance(editor, QComboBox):
+            editor.setCurrentText(value)
+        elif isinstance(editor, QDoubleSpinBox):
+            editor.setValue(value)
+        else:
+            super().setEditorData(editor, index)
+
+    def setModelData(self, editor, model, index):
+        if isinstance(editor, QComboBox):
+            model.setData(index, editor.currentText())
+        elif isinstance(editor, QDoubleSpinBox):
+            editor.interpretText()
+            model.setData(index, editor.value())
+        else:
+            super().setModelData(editor, model, index)
+
+    def _commit(self, editor):
+        self.commitData.emit(editor)
+        self.closeEditor.emit(editor)
+
+
+class KeyTableView(QTableView):
+    """One compact table for all of a tab's keys. Cells are edited in place; Delete or the
+    context menu removes the selected keys."""
+
+    def __init__(self, model: KeyTableModel, on_remove: Optional[Callable[[int], None]] = None,
+                 parent=None):
+        super().__init__(parent)
+        self.on_remove = on_remove
+        self.setModel(model)
+        self.setItemDelegate(KeyItemDelegate(self))
+        self.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.setEditTriggers(QAbstractItemView.DoubleClicked | QAbstractItemView.SelectedClicked
+                             | QAbstractItemView.EditKeyPressed)
+        self.setAlternatingRowColors(True)
+        self.setWordWrap(False)
+
+        # Fixed sizes: sizing to contents would measure every row on each change
+        header = self.horizontalHeader()
+        header.setSectionResizeMode(QHeaderView.Fixed)
+        header.setMinimumSectionSize(20)
+        for column, (_, _, width) in enumerate(COLUMNS):
+            header.resizeSection(column, width)
+        rows = self.verticalHeader()
+        rows.setSectionResizeMode(QHeaderView.Fixed)
+        rows.setDefaultSectionSize(22)
+
+        remove_action = QAction('Remove Key', self)
+        remove_action.setShortcut(Qt.Key_Delete)
+        remove_action.setShortcutContext(Qt.WidgetShortcut)
+        remove_action.triggered.connect(self.remove_selected)
+        self.addAction(remove_action)
+        self.setContextMenuPolicy(Qt.ActionsContextMenu)
+
+    def selected_key_ids(self) -> List[int]:
+        model = self.model()
+        return [model.key_id(index.row()) for index in self.selectionModel().selectedRows()]
+
+    def remove_selected(self):
+        if self.on_remove:
+            for key_id in self.selected_key_ids():
+                self.on_remove(key_id)
@@ -0,0 +1,87 @@
+import time
+from array import array
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from PyQt5.QtCore import QObject, Qt, QTimer, pyqtSignal
+
+from flyff_browser.config import WATCHDOG_INTERVAL_MS, WATCHDOG_STALL_MS
+from flyff_browser.scheduler import now_ms
+from flyff_browser.stats import percentile
+
+# Heartbeats kept for the lag percentiles (10 s at the default interval)
+LAG_WINDOW = 1000
+
+# Stalls kept in the log
+STALL_LOG_SIZE = 500
+
+
+class LoopWatchdog(QObject):
+    """Measures event loop lag with a high-frequency heartbeat timer.
+
+    The heartbeat is re-armed after every beat; how much later than planned
+    it fires is the time the loop spent on other work. Beats later than
+    ``stall_ms`` are logged as stalls, together with the names of the
+    activity() blocks that ran since the previous beat.
+    """
+
+    stalled = pyqtSignal(dict)
+
+    def __init__(self, interval_ms: int = WATCHDOG_INTERVAL_MS,
+                 stall_ms: float = WATCHDOG_STALL_MS, parent=None):
+        super().__init__(parent)
+        self.interval_ms = interval_ms
+        self.stall_ms = stall_ms
+        self.beats = 0
+        self.max_lag_ms = 0.0
+        self.stalls = deque(maxlen=STALL_LOG_SIZE)
+        self._lags = array('d', [0.0]) * LAG_WINDOW
+        self._activities: List[str] = []
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setTimerType(Qt.PreciseTimer)
+        self._timer.timeout.connect(self._beat)
+        self._expected = now_ms() + interval_ms
+        self._timer.start(interval_ms)
+
+    @contextmanager
+    def activity(self, name: str):
+        """Name a block of main-thread work so stalls it causes can be attributed to it."""
+        started = now_ms()
+        try:
+            yield
+        finally:
+            self._activities.append(f'{name} ({now_ms() - started:.0f} ms)')
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        """Lag percentiles over the recent heartbeats, the worst lag seen and the stall count."""
+        lags = sorted(self._lags[:min(self.beats, LAG_WINDOW)])
+        return {
+            'lag_p50': percentile(lags, 0.50, 1),
+            'lag_p95': percentile(lags, 0.95, 1),
+            'lag_max': round(self.max_lag_ms, 1),
+            'stalls': len(self.stalls),
+        }
+
+    def report(self) -> dict:
+        return dict(self.summary(), stall_log=list(self.stalls))
+
+    def _beat(self):
+        now = now_ms()
+        lag = max(0.0, now - self._expected)
+        self._lags[self.beats % LAG_WINDOW] = lag
+        self.beats += 1
+        if lag > self.max_lag_ms:
+            self.max_lag_ms = lag
+
+        if lag >= self.stall_ms:
+            stall = {'at': time.time(), 'duration_ms': round(lag, 1),
+                     'during': list(self._activities)}
+            self.stalls.append(stall)
+            self.stalled.emit(stall)
+        self._activities.clear()
+
+        self._expected = now + self.interval_ms
+        self._timer.start(self.interval_ms)
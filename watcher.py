@@ -0,0 +1,263 @@
+import math
+import time
+from array import array
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from PyQt5.QtCore import (QCoreApplication, QObject, QRect, QThread, QTimer, Qt, pyqtSignal,
+                          pyqtSlot)
+from PyQt5.QtGui import QImage
+
+try:
+    import numpy
+except ImportError:  # numpy is optional; fall back to plain Python over the downscaled pixels
+    numpy = None
+
+from flyff_browser.config import (KEY_TABLE, WATCH_COOLDOWN_MS, WATCH_FPS, WATCH_MAX_FPS,
+                                  WATCH_MIN_DOMINANCE, WATCH_SAMPLE_SIZE)
+from flyff_browser.scheduler import now_ms
+from flyff_browser.stats import percentile
+
+# Bar colours a watch can look for; the position is the byte offset in an RGBA8888 pixel
+CHANNELS = ('red', 'green', 'blue')
+
+# Frames kept for the timing percentiles
+TIMING_WINDOW = 256
+
+# A watched region: x, y, width and height as fractions of the web view
+Region = Tuple[float, float, float, float]
+
+
+def check_watch(region: Region, channel: str, threshold: float, key: str):
+    """Raise ValueError unless the watch settings are usable."""
+    x, y, width, height = region
+    if width <= 0 or height <= 0 or x < 0 or y < 0 or x + width > 1 or y + height > 1:
+        raise ValueError(f"Region outside the view: {region}")
+    if channel not in CHANNELS:
+        raise ValueError(f"Invalid channel: {channel}")
+    if not 0 < threshold < 1:
+        raise ValueError(f"Threshold must be between 0 and 1: {threshold}")
+    if key not in KEY_TABLE:
+        raise ValueError(f"Invalid key: {key}")
+
+
+def fill_level(image: QImage, channel: int, min_dominance: int = WATCH_MIN_DOMINANCE) -> float:
+    """Share of the image's columns that are mostly bar colour, from 0 to 1.
+
+    image must be Format_RGBA8888. Lit columns count wherever they are, so
+    text drawn over a bar does not cut it short. Pixels are read through a
+    view of the image's own buffer, without copying it.
+    """
+    width, height = image.width(), image.height()
+    if not width or not height:
+        return 0.0
+    bits = image.constBits()
+    bits.setsize(image.sizeInBytes())
+    stride = image.bytesPerLine()
+    first, second = [c for c in range(3) if c != channel]
+
+    if numpy is not None:
+        pixels = numpy.frombuffer(bits, numpy.uint8).reshape(height, stride)[:, :width * 4]
+        pixels = pixels.reshape(height, width, 4).astype(numpy.int16)
+        dominance = pixels[..., channel] - numpy.maximum(pixels[..., first], pixels[..., second])
+        lit = numpy.count_nonzero(dominance >= min_dominance, axis=0)
+        return numpy.count_nonzero(lit * 2 >= height) / width
+
+    buffer = memoryview(bits)
+    lit = [0] * width
+    for row in range(height):
+        line = buffer[row * stride:row * stride + width * 4]
+        pixels = zip(line[channel::4], line[first::4], line[second::4])
+        for x, (target, a, b) in enumerate(pixels):
+            if target - max(a, b) >= min_dominance:
+                lit[x] += 1
+    return sum(1 for count in lit if count * 2 >= height) / width
+
+
+class _RegionAnalyzer(QObject):
+    """Lives on the watcher thread: downscales grabbed regions and measures their fill."""
+
+    analyzed = pyqtSignal(object, float)
+
+    def __init__(self, sample_size: Tuple[int, int] = WATCH_SAMPLE_SIZE):
+        super().__init__()
+        self.sample_size = sample_size
+
+    @pyqtSlot(object)
+    def analyze(self, frames):
+        started = now_ms()
+        width, height = self.sample_size
+        levels = []
+        for session_id, image, regions in frames:
+            for watch_id, (x, y, w, h), channel in regions:
+                rect = QRect(int(x * image.width()), int(y * image.height()),
+                             max(1, round(w * image.width())), max(1, round(h * image.height())))
+                sample = image.copy(rect).scaled(width, height, Qt.IgnoreAspectRatio,
+                                                 Qt.FastTransformation)
+                sample = sample.convertToFormat(QImage.Format_RGBA8888)
+                levels.append((session_id, watch_id, fill_level(sample, channel)))
+        self.analyzed.emit(levels, now_ms() - started)
+
+
+class RegionWatcher(QObject):
+    """Presses keys when watched screen regions of a tab, such as HP or MP bars, run low.
+
+    A timer grabs the active watches of every shown in-process tab at
+    ``fps`` (at most WATCH_MAX_FPS), one grab per tab covering all of its
+    regions; that grab is the only work done on the GUI thread. Chromium
+    does not paint pages in hidden tabs or minimized windows, so a grab
+    there would return a stale frame: their watches are paused instead,
+    marked ``paused`` in their stats, until the tab is shown again. A worker
+    thread downscales each region to WATCH_SAMPLE_SIZE and measures how full
+    its bar is, vectorized with numpy when it is installed. While a frame is
+    still being analyzed further ticks are skipped rather than queued, so a
+    slow machine samples less often instead of delaying presses. The thread
+    only starts with the first frame to analyze.
+
+    A watch whose level is below its threshold presses its key through the
+    page dispatcher, at most once per ``cooldown_ms``. Levels and press
+    counts are kept in each session's ``watch_stats``.
+    """
+
+    _frames_ready = pyqtSignal(object)
+
+    def __init__(self, sessions: Callable[[], Iterable['TabSession']], fps: float = WATCH_FPS,
+                 cooldown_ms: float = WATCH_COOLDOWN_MS, parent=None):
+        super().__init__(parent)
+        self.sessions = sessions
+        self.cooldown_ms = cooldown_ms
+        self.frames = 0
+        self.skipped = 0
+        self.paused = 0  # Ticks that passed over a tab with active watches because it was not shown
+        self.presses = 0
+        self._reactions = 0
+        self._grab_ms = array('d', [0.0]) * TIMING_WINDOW
+        self._analyze_ms = array('d', [0.0]) * TIMING_WINDOW
+        self._reaction_ms = array('d', [0.0]) * TIMING_WINDOW
+        self._last_press: Dict[Tuple[int, int], float] = {}
+        self._busy = False
+        self._grabbed_at = 0.0
+
+        self._thread = QThread(self)
+        self._analyzer = _RegionAnalyzer()
+        self._analyzer.moveToThread(self._thread)
+        self._thread.finished.connect(self._analyzer.deleteLater)
+        self._frames_ready.connect(self._analyzer.analyze)
+        self._analyzer.analyzed.connect(self._handle_levels)
+        app = QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.stop)
+
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self._sample)
+        self._timer.start(round(1000 / min(fps, WATCH_MAX_FPS)))
+
+    def stop(self):
+        """Stop sampling and wait for the worker thread to finish."""
+        self._timer.stop()
+        self._thread.quit()
+        self._thread.wait()
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        """Frame counts, grab and analysis cost, and time from grab to keydown."""
+        frames = min(self.frames, TIMING_WINDOW)
+        reactions = sorted(self._reaction_ms[:min(self._reactions, TIMING_WINDOW)])
+        return {
+            'frames': self.frames,
+            'skipped': self.skipped,
+            'paused': self.paused,
+            'presses': self.presses,
+            'grab_ms_p95': percentile(sorted(self._grab_ms[:frames]), 0.95, 1),
+            'analyze_ms_p95': percentile(sorted(self._analyze_ms[:frames]), 0.95, 1),
+            'reaction_ms_p50': percentile(reactions, 0.50, 1),
+            'reaction_ms_p95': percentile(reactions, 0.95, 1),
+            'numpy': numpy is not None,
+        }
+
+    def _sample(self):
+        if self._busy:
+            self.skipped += 1
+            return
+
+        started = now_ms()
+        frames = []
+        for session in self.sessions():
+            if session.is_remote or session.web_view is None:
+                continue
+            watches = [(watch_id, config) for watch_id, config in session.watch_configs.items()
+                       if config['active']]
+            if not watches:
+                continue
+
+            view = session.web_view
+            if not view.isVisible() or view.window().isMinimized():
+                self.paused += 1
+                for watch_id, _ in watches:
+                    session.watch_stats.setdefault(
+                        watch_id, {'level': None, 'presses': 0})['paused'] = True
+                continue
+            rects = [_view_rect(config['region'], view.width(), view.height())
+                     for _, config in watches]
+            bounds = QRect()
+            for rect in rects:
+                bounds = bounds.united(rect)
+            if bounds.isEmpty():
+                continue
+
+            # Regions go to the analyzer relative to the grab, which may be
+            # larger than bounds on high-DPI screens
+            image = view.grab(bounds).toImage()
+            regions = [
+                (watch_id,
+                 ((rect.x() - bounds.x()) / bounds.width(), (rect.y() - bounds.y()) / bounds.height(),
+                  rect.width() / bounds.width(), rect.height() / bounds.height()),
+                 CHANNELS.index(config['channel']))
+                for (watch_id, config), rect in zip(watches, rects)
+            ]
+            frames.append((session.id, image, regions))
+
+        if frames:
+            if not self._thread.isRunning():
+                self._thread.start()
+            self._grab_ms[self.frames % TIMING_WINDOW] = now_ms() - started
+            self._grabbed_at = time.time() * 1000
+            self._busy = True
+            self._frames_ready.emit(frames)
+
+    def _handle_levels(self, levels: List[Tuple[int, int, float]], analyze_ms: float):
+        self._busy = False
+        self._analyze_ms[self.frames % TIMING_WINDOW] = analyze_ms
+        self.frames += 1
+
+        now = now_ms()
+        sessions = {session.id: session for session in self.sessions()}
+        for session_id, watch_id, level in levels:
+            session = sessions.get(session_id)
+            config = session.watch_configs.get(watch_id) if session else None
+            if not config or not config['active']:
+                continue  # Removed or stopped while the frame was analyzed
+
+            stats = session.watch_stats.setdefault(watch_id, {'level': level, 'presses': 0})
+            stats['level'] = round(level, 3)
+            stats['paused'] = False
+            if level >= config['threshold']:
+                continue
+            if now - self._last_press.get((session_id, watch_id), -math.inf) < self.cooldown_ms:
+                continue
+
+            self._last_press[(session_id, watch_id)] = now
+            stats['presses'] += 1
+            self.presses += 1
+            session.press_once(KEY_TABLE[config['key']].index,
+                               lambda at, grabbed_at=self._grabbed_at: self._pressed(at, grabbed_at))
+
+    def _pressed(self, at: Optional[float], grabbed_at: float):
+        if at is None:
+            return  # The page had no dispatcher yet
+        self._reaction_ms[self._reactions % TIMING_WINDOW] = at - grabbed_at
+        self._reactions += 1
+
+
+def _view_rect(region: Region, width: int, height: int) -> QRect:
+    x, y, w, h = region
+    return QRect(round(x * width), round(y * height), max(1, round(w * width)),
+                 max(1, round(h * height)))
@@ -0,0 +1,219 @@
+"""
+Worker process running a single game client: its own window, web view,
+event loop and press scheduler. Started and driven by WorkerPool in the
+control window over a JsonChannel.
+"""
+import base64
+import logging
+import os
+import sys
+from typing import Dict
+
+from PyQt5.QtCore import QObject, QTimer, QUrl
+from PyQt5.QtWidgets import QApplication, QMainWindow
+from PyQt5.QtWebEngineWidgets import QWebEngineView
+
+from flyff_browser.assets import default_request_filter
+from flyff_browser.dispatcher import install_dispatcher
+from flyff_browser.ipc import JsonChannel
+from flyff_browser.macros import Macro
+from flyff_browser.main import CustomWebPage
+from flyff_browser.procinfo import process_usage
+from flyff_browser.profiles import ProfileManager
+from flyff_browser.render import RenderThrottle, install_render_throttle
+from flyff_browser.session import TabSession
+from flyff_browser.watchdog import LoopWatchdog
+from flyff_browser.watcher import RegionWatcher
+
+# How often the worker reports key stats and process usage, in milliseconds
+STATUS_INTERVAL_MS = 1000
+
+log = logging.getLogger(__name__)
+
+
+class ClientWorker(QObject):
+    def __init__(self, channel: JsonChannel, worker_id: int, account: str,
+                 profile_mode: str, url: str, parent=None):
+        super().__init__(parent)
+        self.channel = channel
+        self.worker_id = worker_id
+        self.profiles = ProfileManager(profile_mode, request_filter=default_request_filter())
+        self.watchdog = LoopWatchdog(parent=self)
+
+        web_view = QWebEngineView()
+        web_page = CustomWebPage(web_view, self.profiles.profile_for(account))
+        web_view.setPage(web_page)
+        install_dispatcher(web_page)
+        install_render_throttle(web_page)
+        web_view.setUrl(QUrl(url))
+
+        self.window = QMainWindow()
+        self.window.setWindowTitle(f'FlyFF Universe - {account}')
+        self.window.setCentralWidget(web_view)
+        self.window.resize(1024, 768)
+        self.window.show()
+
+        self.session = TabSession(web_view, account)
+        self._key_ids: Dict[int, int] = {}  # Control plane key id -> local key id
+        self._sequence_ids: Dict[int, int] = {}  # Same for sequences
+        self._watch_ids: Dict[int, int] = {}  # And for region watches
+        self.watcher = RegionWatcher(lambda: [self.session], parent=self)
+        # The control window decides when this client is in the background
+        self.throttled = False
+        self.render = RenderThrottle(lambda: [self.session],
+                                     lambda: None if self.throttled else self.session, parent=self)
+
+        channel.message_received.connect(self.handle_message)
+        channel.disconnected.connect(self.quit)
+
+        self.status_timer = QTimer(self)
+        self.status_timer.timeout.connect(self.send_status)
+        self.status_timer.start(STATUS_INTERVAL_MS)
+
+        channel.send({'type': 'hello', 'worker_id': worker_id, 'pid': os.getpid()})
+
+    def handle_message(self, message: dict):
+        # An exception escaping a slot would abort the worker, so a bad command is only logged
+        try:
+            self._dispatch(message)
+        except Exception:
+            log.exception("Command failed: %s", message.get('cmd'))
+
+    def _dispatch(self, message: dict):
+        command = message.get('cmd')
+        if command == 'configure_key':
+            self.configure_key(message)
+        elif command == 'remove_key':
+            local_id = self._key_ids.pop(message['key_id'], None)
+            if local_id is not None:
+                self.session.remove_key(local_id)
+        elif command == 'configure_sequence':
+            self.configure_sequence(message)
+        elif command == 'remove_sequence':
+            local_id = self._sequence_ids.pop(message['sequence_id'], None)
+            if local_id is not None:
+                self.session.remove_sequence(local_id)
+        elif command == 'configure_watch':
+            self.configure_watch(message)
+        elif command == 'remove_watch':
+            local_id = self._watch_ids.pop(message['watch_id'], None)
+            if local_id is not None:
+                self.session.remove_watch(local_id)
+        elif command == 'press':
+            request_id = message['request_id']
+            self.session.press_once(message['key_index'], lambda at: self.channel.send(
+                {'type': 'pressed', 'request_id': request_id, 'at': at}))
+        elif command == 'record':
+            if message['on']:
+                self.session.start_recording()
+            else:
+                self.session.stop_recording(lambda macro: self.channel.send(
+                    {'type': 'recorded', 'macro': base64.b64encode(macro.to_bytes()).decode()}))
+        elif command == 'play_macro':
+            macro = Macro.from_bytes(base64.b64decode(message['macro']))
+            self.session.play_macro(macro, message['loop'], message.get('start_at'))
+        elif command == 'stop_macro':
+            self.session.stop_macro()
+        elif command == 'render':
+            self.render.fps = message['fps']
+            self.render.pixel_ratio = message['pixel_ratio']
+            self.render.mute = message['mute']
+            self.throttled = message['throttled']
+            self.render.update()
+        elif command == 'show':
+            self.window.showNormal()
+            self.window.raise_()
+            self.window.activateWindow()
+        elif command == 'export':
+            self.channel.send({
+                'type': 'samples',
+                'request_id': message['request_id'],
+                'keys': {
+                    key_id: list(self.session.simulators[local_id].stats.samples())
+                    for key_id, local_id in self._key_ids.items()
+                },
+            })
+        elif command == 'quit':
+            self.quit()
+
+    def configure_key(self, message: dict):
+        """Create or update a key and start or stop it, as the control plane says."""
+        key_id = message['key_id']
+        local_id = self._key_ids.get(key_id)
+        if local_id is None:
+            local_id = self.session.add_key(
+                message['key'], message['min_interval'], message['max_interval'],
+                message.get('distribution', 'uniform'))
+            self._key_ids[key_id] = local_id
+        else:
+            self.session.update_key(
+                local_id, message['key'], message['min_interval'], message['max_interval'],
+                message.get('distribution', 'uniform'))
+        self.session.set_key_active(local_id, message['active'])
+
+    def configure_sequence(self, message: dict):
+        sequence_id = message['sequence_id']
+        local_id = self._sequence_ids.get(sequence_id)
+        if local_id is None:
+            local_id = self.session.add_sequence(message['steps'], message['repeat_s'])
+            self._sequence_ids[sequence_id] = local_id
+        else:
+            self.session.update_sequence(local_id, message['steps'], message['repeat_s'])
+        if message['active'] != self.session.sequence_configs[local_id]['active']:
+            self.session.set_sequence_active(local_id, message['active'])
+
+    def configure_watch(self, message: dict):
+        watch_id = message['watch_id']
+        local_id = self._watch_ids.get(watch_id)
+        settings = (message['region'], message['channel'], message['threshold'], message['key'])
+        if local_id is None:
+            local_id = self.session.add_watch(*settings)
+            self._watch_ids[watch_id] = local_id
+        else:
+            self.session.update_watch(local_id, *settings)
+        self.session.set_watch_active(local_id, message['active'])
+
+    def send_status(self):
+        keys = {}
+        for key_id, local_id in self._key_ids.items():
+            summary = self.session.key_summary(local_id)
+            if summary:
+                keys[key_id] = summary
+        # Counters polled now arrive with the next status message
+        self.session.poll_sequences()
+        self.session.poll_recording()
+        sequences = {}
+        for sequence_id, local_id in self._sequence_ids.items():
+            summary = self.session.sequence_summary(local_id)
+            if summary:
+                sequences[sequence_id] = summary
+        self.channel.send({
+            'type': 'status',
+            'active_keys': self.session.active_key_count(),
+            'keys': keys,
+            'sequences': sequences,
+            'watches': {
+                watch_id: self.session.watch_summary(local_id)
+                for watch_id, local_id in self._watch_ids.items()
+                if self.session.watch_summary(local_id)
+            },
+            'macro': self.session.macro_summary(),
+            'render': self.render.report(),
+            'loop': self.watchdog.summary(),
+            'requests': self.profiles.request_filter.summary(),
+            'usage': process_usage(os.getpid()),
+        })
+
+    def quit(self):
+        self.watcher.stop()
+        self.session.close()
+        QApplication.quit()
+
+
+def run_worker(server_name: str, worker_id: int, account: str, profile_mode: str,
+               url: str, qt_args=()) -> int:
+    app = QApplication(sys.argv[:1] + list(qt_args))
+    app.setApplicationName('FlyFFSimpleFTool')
+    channel = JsonChannel.connect_to(server_name)
+    worker = ClientWorker(channel, worker_id, account, profile_mode, url)
+    return app.exec_()
@@ -0,0 +1,498 @@
+import base64
+import itertools
+import logging
+import os
+import sys
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from PyQt5.QtCore import QEventLoop, QObject, QProcess, QTimer
+from PyQt5.QtNetwork import QLocalServer
+from PyQt5.QtWidgets import QLabel, QPushButton, QVBoxLayout, QWidget
+
+from flyff_browser.ipc import JsonChannel
+from flyff_browser.macros import Macro
+from flyff_browser.session import SequenceStep, TabSession, check_sequence_steps
+from flyff_browser.stats import PressStats, format_loop_summary, format_request_summary
+from flyff_browser.watcher import Region, check_watch
+
+# Directory containing the flyff_browser package, for running workers from source
+_PACKAGE_PARENT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# How long to wait for workers to answer an export request, in milliseconds
+EXPORT_TIMEOUT_MS = 3000
+
+# How long workers get to exit when the control window closes, in milliseconds
+SHUTDOWN_TIMEOUT_MS = 3000
+
+log = logging.getLogger(__name__)
+
+
+class RemoteClientView(QWidget):
+    """Placeholder shown in the tab of a client that runs in its own process."""
+
+    def __init__(self, account: str, on_show=None, parent=None):
+        super().__init__(parent)
+        layout = QVBoxLayout()
+        self.status_label = QLabel(f'{account}: worker starts when this tab is opened')
+        layout.addWidget(self.status_label)
+
+        show_btn = QPushButton('Show Game Window')
+        show_btn.setFixedWidth(200)
+        if on_show:
+            show_btn.clicked.connect(lambda: on_show())
+        layout.addWidget(show_btn)
+        layout.addStretch()
+        self.setLayout(layout)
+
+
+class RemoteTabSession:
+    """Control-plane mirror of a TabSession whose client runs in a worker process.
+
+    Key settings live here and every change is sent to the worker as a
+    command; timing summaries come back in the worker's status messages.
+    The worker process itself is only started by load().
+    """
+
+    is_remote = True
+
+    def __init__(self, account: str, url: str,
+                 start_worker: Callable[['RemoteTabSession'], None]):
+        self.id = next(TabSession._ids)  # Same id space as local sessions
+        self.account = account
+        self.url = url
+        self.broadcast_target = True
+        self.web_view = None
+        self._start_worker = start_worker
+        self.widget = RemoteClientView(account, on_show=lambda: self.send({'cmd': 'show'}))
+        self.key_configs: Dict[int, dict] = {}
+        self.summaries: Dict[int, dict] = {}
+        self.sequence_configs: Dict[int, dict] = {}
+        self.sequence_stats: Dict[int, dict] = {}
+        self._sequence_ids = itertools.count(1)
+        self.watch_configs: Dict[int, dict] = {}
+        self.watch_stats: Dict[int, dict] = {}
+        self._watch_ids = itertools.count(1)
+        self.exported: Dict[int, PressStats] = {}
+        self.pid: Optional[int] = None
+        self.process: Optional[QProcess] = None
+        self.channel: Optional[JsonChannel] = None
+        self._backlog: List[dict] = []
+        self._key_ids = itertools.count(1)
+        self._press_requests = itertools.count(1)
+        self._press_callbacks: Dict[int, Callable[[Optional[float]], None]] = {}
+        self.is_recording = False
+        self._recorded_callbacks: List[Callable[[Macro], None]] = []
+        self.macro_stats: Optional[dict] = None
+        self.render_budget: Optional[dict] = None  # Last budget sent, sent again to a new worker
+        self.render_stats: Optional[dict] = None
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.process is not None
+
+    def load(self):
+        """Start the worker process, unless already done."""
+        if self.process is None:
+            self.widget.status_label.setText(f'{self.account}: starting worker process...')
+            self._start_worker(self)
+
+    def send(self, message: dict):
+        """Send a command now, or once the worker has connected."""
+        if self.channel:
+            self.channel.send(message)
+        else:
+            self._backlog.append(message)
+
+    def attach(self, channel: JsonChannel, pid: int):
+        self.channel = channel
+        self.pid = pid
+        for message in self._backlog:
+            channel.send(message)
+        self._backlog.clear()
+
+    def add_key(self, key: str, min_interval: float, max_interval: float,
+                distribution: str = 'uniform') -> int:
+        key_id = next(self._key_ids)
+        self.key_configs[key_id] = {
+            'key': key,
+            'min_interval': min_interval,
+            'max_interval': max_interval,
+            'distribution': distribution,
+            'active': False,
+        }
+        self._send_key(key_id)
+        return key_id
+
+    def remove_key(self, key_id: int):
+        self.key_configs.pop(key_id, None)
+        self.summaries.pop(key_id, None)
+        self.send({'cmd': 'remove_key', 'key_id': key_id})
+
+    def update_key(self, key_id: int, key: str, min_interval: float, max_interval: float,
+                   distribution: str = 'uniform'):
+        config = self.key_configs[key_id]
+        config['key'] = key
+        config['min_interval'] = min_interval
+        config['max_interval'] = max_interval
+        config['distribution'] = distribution
+        self._send_key(key_id)
+
+    def set_key_active(self, key_id: int, active: bool):
+        if active:
+            self.load()
+        self.key_configs[key_id]['active'] = active
+        self._send_key(key_id)
+
+    def active_key_count(self) -> int:
+        return sum(1 for config in self.key_configs.values() if config['active'])
+
+    def key_summary(self, key_id: int) -> Optional[dict]:
+        return self.summaries.get(key_id)
+
+    def press_count(self, key_id: int) -> int:
+        return (self.summaries.get(key_id) or {}).get('count', 0)
+
+    def stats_entries(self) -> Iterator[Tuple[int, str, PressStats]]:
+        """Yield the stats fetched by the last WorkerPool.fetch_samples()."""
+        for key_id, config in self.key_configs.items():
+            yield key_id, config['key'], self.exported.get(key_id, PressStats())
+
+    def press_once(self, key_index: int, callback: Callable[[Optional[float]], None]):
+        request_id = next(self._press_requests)
+        self._press_callbacks[request_id] = callback
+        self.send({'cmd': 'press', 'key_index': key_index, 'request_id': request_id})
+
+    def handle_pressed(self, message: dict):
+        callback = self._press_callbacks.pop(message['request_id'], None)
+        if callback:
+            callback(message['at'])
+
+    def add_sequence(self, steps: List[SequenceStep], repeat_s: float) -> int:
+        check_sequence_steps(steps)
+        sequence_id = next(self._sequence_ids)
+        self.sequence_configs[sequence_id] = {
+            'steps': [list(step) for step in steps],
+            'repeat_s': repeat_s,
+            'active': False,
+        }
+        self._send_sequence(sequence_id)
+        return sequence_id
+
+    def update_sequence(self, sequence_id: int, steps: List[SequenceStep], repeat_s: float):
+        check_sequence_steps(steps)
+        config = self.sequence_configs[sequence_id]
+        config['steps'] = [list(step) for step in steps]
+        config['repeat_s'] = repeat_s
+        self._send_sequence(sequence_id)
+
+    def remove_sequence(self, sequence_id: int):
+        self.sequence_configs.pop(sequence_id, None)
+        self.sequence_stats.pop(sequence_id, None)
+        self.send({'cmd': 'remove_sequence', 'sequence_id': sequence_id})
+
+    def set_sequence_active(self, sequence_id: int, active: bool):
+        if active:
+            self.load()
+        self.sequence_configs[sequence_id]['active'] = active
+        self._send_sequence(sequence_id)
+
+    def active_sequence_count(self) -> int:
+        return sum(1 for config in self.sequence_configs.values() if config['active'])
+
+    def sequence_summary(self, sequence_id: int) -> Optional[dict]:
+        return self.sequence_stats.get(sequence_id)
+
+    def poll_sequences(self):
+        pass  # Workers include sequence counters in every status message
+
+    def add_watch(self, region: Region, channel: str, threshold: float, key: str) -> int:
+        check_watch(region, channel, threshold, key)
+        watch_id = next(self._watch_ids)
+        self.watch_configs[watch_id] = {
+            'region': list(region),
+            'channel': channel,
+            'threshold': threshold,
+            'key': key,
+            'active': False,
+        }
+        self._send_watch(watch_id)
+        return watch_id
+
+    def update_watch(self, watch_id: int, region: Region, channel: str, threshold: float, key: str):
+        check_watch(region, channel, threshold, key)
+        config = self.watch_configs[watch_id]
+        config['region'] = list(region)
+        config['channel'] = channel
+        config['threshold'] = threshold
+        config['key'] = key
+        self._send_watch(watch_id)
+
+    def remove_watch(self, watch_id: int):
+        self.watch_configs.pop(watch_id, None)
+        self.watch_stats.pop(watch_id, None)
+        self.send({'cmd': 'remove_watch', 'watch_id': watch_id})
+
+    def set_watch_active(self, watch_id: int, active: bool):
+        if active:
+            self.load()
+        self.watch_configs[watch_id]['active'] = active
+        self._send_watch(watch_id)
+
+    def active_watch_count(self) -> int:
+        return sum(1 for config in self.watch_configs.values() if config['active'])
+
+    def watch_summary(self, watch_id: int) -> Optional[dict]:
+        return self.watch_stats.get(watch_id)
+
+    def start_recording(self):
+        self.load()
+        self.is_recording = True
+        self.send({'cmd': 'record', 'on': True})
+
+    def poll_recording(self):
+        pass  # Workers collect their recording themselves
+
+    def stop_recording(self, callback: Callable[[Macro], None]):
+        """Stop recording; callback gets the worker's recording once it arrives."""
+        if not self.is_recording:
+            callback(Macro())
+            return
+        self.is_recording = False
+        self._recorded_callbacks.append(callback)
+        self.send({'cmd': 'record', 'on': False})
+
+    def handle_recorded(self, message: dict):
+        if self._recorded_callbacks:
+            self._recorded_callbacks.pop(0)(Macro.from_bytes(base64.b64decode(message['macro'])))
+
+    def play_macro(self, macro: Macro, loop: bool = False, start_at: Optional[float] = None):
+        # now_ms() is a monotonic clock shared by every process on the machine, so start_at
+        # means the same moment in the worker
+        self.load()
+        self.macro_stats = dict(macro.summary(), playing=True, runs=0, position=0, dropped=0)
+        self.send({'cmd': 'play_macro', 'macro': base64.b64encode(macro.to_bytes()).decode(),
+                   'loop': loop, 'start_at': start_at})
+
+    def stop_macro(self):
+        if self.macro_stats:
+            self.macro_stats['playing'] = False
+        self.send({'cmd': 'stop_macro'})
+
+    @property
+    def is_playing(self) -> bool:
+        return bool(self.macro_stats and self.macro_stats['playing'])
+
+    def macro_summary(self) -> Optional[dict]:
+        return self.macro_stats
+
+    def set_render_budget(self, throttled: bool, fps: float, pixel_ratio: Optional[float],
+                          mute: bool):
+        """Have the worker cap its window's rendering (see RenderThrottle), or lift the cap."""
+        self.render_budget = {'cmd': 'render', 'throttled': throttled, 'fps': fps,
+                              'pixel_ratio': pixel_ratio, 'mute': mute}
+        self.send(self.render_budget)
+
+    def handle_status(self, message: dict):
+        self.summaries = {int(key_id): summary for key_id, summary in message['keys'].items()}
+        self.sequence_stats = {
+            int(sequence_id): summary
+            for sequence_id, summary in message.get('sequences', {}).items()
+        }
+        self.watch_stats = {
+            int(watch_id): summary for watch_id, summary in message.get('watches', {}).items()
+        }
+        if message.get('macro'):
+            self.macro_stats = message['macro']
+        render = message.get('render')
+        self.render_stats = render[0] if render else None
+        usage = message.get('usage') or {}
+        rss = usage.get('rss_bytes', 0) / (1024 * 1024)
+        text = (f"{self.account}: worker pid {self.pid}, {message['active_keys']} active key(s), "
+                f"CPU {usage.get('cpu_s', 0):.1f} s, RSS {rss:.0f} MB")
+        if message.get('loop'):
+            text += '\n' + format_loop_summary(message['loop'])
+        if message.get('requests'):
+            text += '\n' + format_request_summary(message['requests'])
+        self.widget.status_label.setText(text)
+
+    def close(self):
+        if not self.process:
+            return  # Worker never started, or already exited
+        self.send({'cmd': 'quit'})
+        # Give the worker a moment to exit cleanly before killing it
+        process = self.process
+        QTimer.singleShot(3000, lambda: self.process is process and process.kill())
+
+    def detach(self):
+        """Forget a worker process that exited.
+
+        The next load() starts a new one, which gets the keys, sequences and
+        watches this session still holds. Requests the old worker never
+        answered are answered empty.
+        """
+        self.channel = None
+        self.pid = None
+        if self.process is not None:
+            self.process.deleteLater()
+            self.process = None
+        self.is_recording = False
+        if self.macro_stats:
+            self.macro_stats['playing'] = False
+        self._backlog.clear()
+        for key_id in self.key_configs:
+            self._send_key(key_id)
+        for sequence_id in self.sequence_configs:
+            self._send_sequence(sequence_id)
+        for watch_id in self.watch_configs:
+            self._send_watch(watch_id)
+        self.render_stats = None
+        if self.render_budget:
+            self.send(self.render_budget)
+        press_callbacks = list(self._press_callbacks.values())
+        recorded_callbacks = self._recorded_callbacks
+        self._press_callbacks = {}
+        self._recorded_callbacks = []
+        for callback in press_callbacks:
+            callback(None)
+        for callback in recorded_callbacks:
+            callback(Macro())
+
+    def _send_key(self, key_id: int):
+        self.send(dict(self.key_configs[key_id], cmd='configure_key', key_id=key_id))
+
+    def _send_sequence(self, sequence_id: int):
+        self.send(dict(self.sequence_configs[sequence_id],
+                       cmd='configure_sequence', sequence_id=sequence_id))
+
+    def _send_watch(self, watch_id: int):
+        self.send(dict(self.watch_configs[watch_id], cmd='configure_watch', watch_id=watch_id))
+
+
+class WorkerPool(QObject):
+    """Starts one worker process per client and routes their messages.
+
+    The control window talks to every worker over a QLocalServer named
+    after its own pid; workers announce themselves with a hello message
+    carrying the session id they were started for.
+    """
+
+    def __init__(self, profile_mode: str, url: str, parent=None):
+        super().__init__(parent)
+        self.profile_mode = profile_mode
+        self.url = url
+        self.sessions: Dict[int, RemoteTabSession] = {}
+        self._export_requests = itertools.count(1)
+        self._export_replies: Dict[int, int] = {}
+        self._export_loop: Optional[QEventLoop] = None
+
+        self.server_name = f'flyff-ftool-{os.getpid()}'
+        QLocalServer.removeServer(self.server_name)
+        self.server = QLocalServer(self)
+        if not self.server.listen(self.server_name):
+            raise RuntimeError(f"Cannot listen on {self.server_name}: {self.server.errorString()}")
+        self.server.newConnection.connect(self._accept)
+
+    def create_session(self, account: str, url: Optional[str] = None,
+                       start: bool = True) -> RemoteTabSession:
+        """Create a session and, unless ``start`` is false, the worker process that runs it."""
+        session = RemoteTabSession(account, url or self.url, start_worker=self._start_worker)
+        self.sessions[session.id] = session
+        if start:
+            session.load()
+        return session
+
+    def _start_worker(self, session: RemoteTabSession):
+        args = ['--worker-id', str(session.id), '--worker-server', self.server_name,
+                '--account', session.account, '--profile-mode', self.profile_mode,
+                '--url', session.url]
+        if not getattr(sys, 'frozen', False):
+            # A bundled exe runs main() directly; from source, run the package
+            args = ['-m', 'flyff_browser.main'] + args
+
+        session.process = QProcess(self)
+        session.process.setProcessChannelMode(QProcess.ForwardedChannels)
+        session.process.setWorkingDirectory(_PACKAGE_PARENT)
+        session.process.finished.connect(lambda *_: self._on_finished(session))
+        session.process.start(sys.executable, args)
+
+    def remove_session(self, session: RemoteTabSession):
+        session.close()
+        self.sessions.pop(session.id, None)
+
+    def fetch_samples(self, timeout_ms: int = EXPORT_TIMEOUT_MS):
+        """Ask every connected worker for its raw press samples and wait for the answers."""
+        self._export_replies.clear()
+        for session in self.sessions.values():
+            if session.channel:
+                request_id = next(self._export_requests)
+                self._export_replies[request_id] = session.id
+                session.send({'cmd': 'export', 'request_id': request_id})
+
+        loop = QEventLoop()
+        timer = QTimer()
+        timer.setSingleShot(True)
+        timer.timeout.connect(loop.quit)
+        timer.start(timeout_ms)
+        self._export_loop = loop
+        if self._export_replies:
+            loop.exec_()
+        self._export_loop = None
+
+    def shutdown(self, timeout_ms: int = SHUTDOWN_TIMEOUT_MS):
+        """Ask every worker to quit and wait for them, killing any that hang."""
+        sessions = list(self.sessions.values())
+        self.sessions.clear()
+        for session in sessions:
+            session.send({'cmd': 'quit'})
+            if session.channel:
+                session.channel.flush()
+        for session in sessions:
+            if session.process and not session.process.waitForFinished(timeout_ms):
+                session.process.kill()
+                session.process.waitForFinished(1000)
+        self.server.close()
+
+    def _accept(self):
+        while self.server.hasPendingConnections():
+            channel = JsonChannel(self.server.nextPendingConnection(), self)
+            channel.message_received.connect(
+                lambda message, channel=channel: self._on_message(channel, message))
+
+    def _on_message(self, channel: JsonChannel, message: dict):
+        # An exception escaping a slot would abort the app, so a bad message is only logged
+        try:
+            self._route(channel, message)
+        except Exception:
+            log.exception("Worker message failed: %s", message.get('type'))
+
+    def _route(self, channel: JsonChannel, message: dict):
+        kind = message.get('type')
+        if kind == 'hello':
+            session = self.sessions.get(message['worker_id'])
+            if session:
+                session.attach(channel, message['pid'])
+                channel.setProperty('session_id', session.id)
+            return
+
+        session = self.sessions.get(channel.property('session_id'))
+        if not session:
+            return
+        if kind == 'status':
+            session.handle_status(message)
+        elif kind == 'pressed':
+            session.handle_pressed(message)
+        elif kind == 'recorded':
+            session.handle_recorded(message)
+        elif kind == 'samples':
+            session.exported = {
+                int(key_id): PressStats.from_samples(samples)
+                for key_id, samples in message['keys'].items()
+            }
+            self._export_replies.pop(message['request_id'], None)
+            if not self._export_replies and self._export_loop:
+                self._export_loop.quit()
+
+    def _on_finished(self, session: RemoteTabSession):
+        session.detach()
+        if session.id in self.sessions:
+            session.widget.status_label.setText(f'{session.account}: worker process exited')